@@ -1,5 +1,15 @@
 # -*- mode: python ; coding: utf-8 -*-
+#
+#   pyinstaller TermomazPlatform.spec               -> dist/TermomazPlatform(.exe), un solo archivo
+#   pyinstaller TermomazPlatform.spec -- --onedir   -> dist/TermomazPlatform/ (arranque rápido)
+#
+# El ejecutable de un solo archivo descomprime todo a una carpeta temporal en cada arranque;
+# la variante onedir carga directo desde su carpeta. build_exe.py construye y mide ambas.
+import argparse
 
+parser = argparse.ArgumentParser()
+parser.add_argument('--onedir', action='store_true', help='Carpeta en lugar de un solo archivo')
+options = parser.parse_args()
 
 a = Analysis(
     ['app.py'],
@@ -10,29 +20,59 @@ a = Analysis(
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
-    excludes=[],
+    # Módulos que la aplicación no usa (menos que empaquetar y descomprimir)
+    excludes=['tkinter', 'unittest', 'pydoc_data', 'lib2to3', 'setuptools', 'pip', 'test'],
     noarchive=False,
-    optimize=0,
+    # Bytecode precompilado sin asserts; sin -OO porque click usa los docstrings de los comandos
+    optimize=1,
 )
 pyz = PYZ(a.pure)
 
-exe = EXE(
-    pyz,
-    a.scripts,
-    a.binaries,
-    a.datas,
-    [],
-    name='TermomazPlatform',
-    debug=False,
-    bootloader_ignore_signals=False,
-    strip=False,
-    upx=True,
-    upx_exclude=[],
-    runtime_tmpdir=None,
-    console=True,
-    disable_windowed_traceback=False,
-    argv_emulation=False,
-    target_arch=None,
-    codesign_identity=None,
-    entitlements_file=None,
-)
+# Sin UPX: descomprimir el ejecutable en cada arranque cuesta más de lo que ahorra en disco
+if options.onedir:
+    exe = EXE(
+        pyz,
+        a.scripts,
+        [],
+        exclude_binaries=True,
+        name='TermomazPlatform',
+        debug=False,
+        bootloader_ignore_signals=False,
+        strip=False,
+        upx=False,
+        console=True,
+        disable_windowed_traceback=False,
+        argv_emulation=False,
+        target_arch=None,
+        codesign_identity=None,
+        entitlements_file=None,
+    )
+    coll = COLLECT(
+        exe,
+        a.binaries,
+        a.datas,
+        strip=False,
+        upx=False,
+        name='TermomazPlatform',
+    )
+else:
+    exe = EXE(
+        pyz,
+        a.scripts,
+        a.binaries,
+        a.datas,
+        [],
+        name='TermomazPlatform',
+        debug=False,
+        bootloader_ignore_signals=False,
+        strip=False,
+        upx=False,
+        upx_exclude=[],
+        runtime_tmpdir=None,
+        console=True,
+        disable_windowed_traceback=False,
+        argv_emulation=False,
+        target_arch=None,
+        codesign_identity=None,
+        entitlements_file=None,
+    )
@@ -1,7 +1,28 @@
-from flask import Flask, render_template, request, jsonify, redirect, url_for, flash
-from models import db, Client, Product, Order, OrderItem
+import startup  # Primero: marca el inicio del proceso para medir el arranque
+from flask import Flask, render_template, request, jsonify, redirect, url_for, flash, Response, stream_with_context, abort, send_file
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
+from models import db, Client, ClientBalance, Product, Order, OrderItem, DeletedRecord, Job, set_sqlite_pragmas
+from reporting import parse_report_range
+import rollup
+from listings import parse_order_filters, get_orders_page
+from migrations import run_migrations
+from stock import reserve_stock, restore_stock, find_insufficient, record_movements, set_stock, maybe_snapshot, take_snapshot
+from catalog import product_feed, catalog_etag, client_feed, clients_etag, parse_timestamp
+from search import search_clients, search_products, parse_product_filters, product_to_dict
+from dashboard import get_dashboard_stats, track_writes
+import metrics
+import assets
+import replica
+import archive
+from order_items import parse_item_ops, apply_item_ops, order_to_dict
+from notes import NOTE_FORMATS, render_notes, track_order_versions
+from payments import PAYMENT_METHODS, record_payment, get_receivables
+from sales import create_sale, sync_sales, find_by_key as find_sale, MAX_SYNC_SALES
 import os
 import sys
+import time
+import click
 from datetime import datetime, date
 
 # --- Configuración de la Aplicación ---
@@ -11,13 +32,48 @@ if getattr(sys, 'frozen', False):
     app = Flask(__name__, template_folder=template_folder, static_folder=static_folder)
 else:
     app = Flask(__name__)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///termomaz.db'
+
+# Ruta de la base de datos: TERMOMAZ_DB_PATH si está definida.
+# En el ejecutable se guarda junto al .exe (la carpeta temporal de PyInstaller se borra al cerrar).
+# En desarrollo, 'sqlite:///termomaz.db' lo resuelve Flask-SQLAlchemy dentro de instance/.
+db_path = os.environ.get('TERMOMAZ_DB_PATH')
+if not db_path and getattr(sys, 'frozen', False):
+    db_path = os.path.join(os.path.dirname(sys.executable), 'termomaz.db')
+app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.abspath(db_path)}" if db_path else 'sqlite:///termomaz.db'
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+
+# Bytecode de las plantillas compiladas en disco junto a la base (persiste entre arranques)
+startup.enable_template_cache(app, os.path.dirname(os.path.abspath(db_path)) if db_path else app.instance_path)
+# CSS/JS compilados con hash en el nombre (build_assets.py) y gzip de las páginas
+assets.init_app(app)
+
+# Hilos del servidor de producción; el pool de conexiones se dimensiona igual
+worker_threads = int(os.environ.get('TERMOMAZ_THREADS', 8))
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+    'pool_size': worker_threads,
+    'max_overflow': worker_threads,
+    'pool_timeout': 30,
+    'connect_args': {'timeout': 30, 'check_same_thread': False},
+}
 # La clave secreta es necesaria para las sesiones y los mensajes flash
 app.secret_key = os.environ.get('SECRET_KEY', 'super_safe_and_secret_default_key_for_dev') 
 
 db.init_app(app)
 
+# PRAGMAs de SQLite (WAL, busy_timeout, caché, mmap) en cada conexión nueva del pool
+with app.app_context():
+    event.listen(db.engine, 'connect', set_sqlite_pragmas)
+    # Conteo y tiempo de consultas por petición, consultas lentas, N+1 (ver /metrics)
+    metrics.init_app(app, db.engine)
+    # Pedidos cerrados antiguos en termomaz_archive.db, adjunto como esquema `archive`
+    archive.init_app(app, db.engine)
+# Listados y reportes leen con su propio engine de solo lectura (los engines se crean al primer uso)
+replica.init_app(app, on_engine=metrics.instrument)
+# Invalida la caché del dashboard con cada commit que escribe en sus tablas
+track_writes(db.session)
+# Versiona los pedidos en cada cambio para invalidar la caché de notas impresas
+track_order_versions(db.session)
+
 # --- Funciones de Utilidad ---
 
 # Función para obtener el primer día del mes actual (para calcular ventas mensuales)
@@ -28,41 +84,30 @@ def get_start_of_current_month():
 # --- Rutas del Dashboard ---
 
 @app.route('/')
+@replica.read_only
 def index():
-    # 1. Obtener estadísticas básicas
-    total_clients = Client.query.count()
-    total_products = Product.query.count()
-    pending_orders = Order.query.filter_by(status='Pending').count()
-    
-    # 2. Calcular ventas mensuales (CORREGIDO: Solo pedidos completados desde el inicio del mes)
-    start_of_month = get_start_of_current_month()
-    
-    monthly_sales_orders = Order.query.filter(
-        Order.status == 'Completed',
-        Order.date >= start_of_month
-    ).all()
-    
-    # Sumar los totales
-    monthly_sales = sum(order.total for order in monthly_sales_orders)
-    
-    # 3. Pedidos recientes
-    # El `relationship` de Cliente en Orden debería ser accedido vía Order.client.name
-    recent_orders = Order.query.order_by(Order.date.desc()).limit(5).all()
+    # Conteos, ventas del mes (pedidos completados, del acumulado diario) y pedidos recientes.
+    # Se sirven de la caché de dashboard.py mientras no haya escrituras en las tablas involucradas
+    stats = get_dashboard_stats(get_start_of_current_month())
     
     return render_template('index.html', 
-                           total_clients=total_clients, 
-                           total_products=total_products,
-                           pending_orders=pending_orders,
+                           total_clients=stats['total_clients'], 
+                           total_products=stats['total_products'],
+                           pending_orders=stats['pending_orders'],
                            # Formateo básico del valor monetario (se puede mejorar en Jinja)
-                           monthly_sales=f"{monthly_sales:.2f}", 
-                           recent_orders=recent_orders)
+                           monthly_sales=f"{stats['monthly_sales']:.2f}", 
+                           recent_orders=stats['recent_orders'])
 
 # --- Rutas de Clientes ---
 
 @app.route('/clients')
+@replica.read_only
 def clients():
     all_clients = Client.query.all()
-    return render_template('clients.html', clients=all_clients)
+    # Saldo por cobrar de client_balance (mantenido en cada escritura, no se recorren pedidos)
+    balances = dict(db.session.query(ClientBalance.client_id, ClientBalance.outstanding).filter(
+        ClientBalance.outstanding > rollup.PAID_TOLERANCE))
+    return render_template('clients.html', clients=all_clients, balances=balances)
 
 @app.route('/clients/add', methods=['POST'])
 def add_client():
@@ -100,7 +145,10 @@ def edit_client(id):
 def delete_client(id):
     client = Client.query.get_or_404(id)
     try:
+        ClientBalance.query.filter_by(client_id=id).delete()
         db.session.delete(client)
+        # Para que el POS lo quite de su copia de clientes en la siguiente sincronización
+        db.session.add(DeletedRecord(entity='client', record_id=client.id))
         db.session.commit()
         flash(f'Cliente "{client.name}" eliminado correctamente.', 'success')
     except Exception as e:
@@ -112,9 +160,12 @@ def delete_client(id):
 # --- Rutas de Inventario (Productos) ---
 
 @app.route('/inventory')
+@replica.read_only
 def inventory():
-    all_products = Product.query.all()
-    return render_template('inventory.html', products=all_products)
+    # Búsqueda paginada con facetas en lugar de cargar todo el catálogo
+    filters = parse_product_filters(request.args)
+    results = search_products(**filters)
+    return render_template('inventory.html', products=results['products'], results=results, filters=filters)
 
 @app.route('/inventory/add', methods=['POST'])
 def add_product():
@@ -127,6 +178,8 @@ def add_product():
         
         new_product = Product(name=name, category=category, price=price, stock=stock, description=description)
         db.session.add(new_product)
+        db.session.flush()
+        record_movements({new_product.id: stock}, 'initial')
         db.session.commit()
         flash(f'Producto "{name}" agregado correctamente.', 'success')
     except ValueError:
@@ -143,8 +196,10 @@ def edit_product(id):
         product.name = request.form.get('name')
         product.category = request.form.get('category')
         product.price = float(request.form.get('price'))
-        product.stock = int(request.form.get('stock'))
+        stock = int(request.form.get('stock'))
         product.description = request.form.get('description')
+        # El stock se fija en SQL y la diferencia queda en el libro de movimientos como ajuste
+        set_stock({product.id: stock}, 'adjustment')
         db.session.commit()
         flash(f'Producto "{product.name}" actualizado correctamente.', 'success')
     except ValueError:
@@ -159,6 +214,8 @@ def delete_product(id):
     product = Product.query.get_or_404(id)
     try:
         db.session.delete(product)
+        # Para que el POS lo quite de su catálogo en la siguiente sincronización
+        db.session.add(DeletedRecord(entity='product', record_id=product.id))
         db.session.commit()
         flash(f'Producto "{product.name}" eliminado correctamente.', 'success')
     except Exception as e:
@@ -169,10 +226,19 @@ def delete_product(id):
 # --- Rutas de Pedidos (Órdenes) ---
 
 @app.route('/orders')
+@replica.read_only
 def orders():
-    all_orders = Order.query.order_by(Order.date.desc()).all()
-    all_clients = Client.query.all() # Para el modal de creación
-    return render_template('orders.html', orders=all_orders, clients=all_clients)
+    # Paginación por cursor (keyset) sobre (date, id) + filtros del lado del servidor
+    filters = parse_order_filters(request.args)
+    page_orders, next_cursor = get_orders_page(filters,
+                                               cursor=request.args.get('after'),
+                                               per_page=request.args.get('per_page', type=int))
+    # El modal de creación y el filtro buscan clientes con /api/clients/search;
+    # solo se carga el cliente del filtro activo para mostrar su nombre
+    filter_client = db.session.get(Client, filters['client_id']) if filters['client_id'] else None
+    return render_template('orders.html', orders=page_orders, filter_client=filter_client,
+                           filters=filters, next_cursor=next_cursor,
+                           is_first_page=not request.args.get('after'))
 
 @app.route('/orders/create', methods=['POST'])
 def create_order():
@@ -199,8 +265,8 @@ def create_order():
 @app.route('/orders/<int:id>')
 def order_details(id):
     order = Order.query.get_or_404(id)
-    products = Product.query.all()
-    return render_template('order_details.html', order=order, products=products)
+    # El producto a agregar se busca con /api/products/search desde la página
+    return render_template('order_details.html', order=order, payment_methods=PAYMENT_METHODS)
 
 @app.route('/orders/<int:id>/add_item', methods=['POST'])
 def add_order_item(id):
@@ -221,15 +287,19 @@ def add_order_item(id):
             
             item_cost = product.price * quantity
 
-            if existing_item:
-                existing_item.quantity += quantity
-            else:
-                new_item = OrderItem(order_id=order.id, product_id=product.id, quantity=quantity, price_at_time=product.price)
-                db.session.add(new_item)
-            
-            # 2. Actualizar stock y total de la orden
-            product.stock -= quantity
-            order.total += item_cost
+            with rollup.tracking(order):
+                # 2. Descontar stock (UPDATE condicional, queda en el libro como venta)
+                if not reserve_stock({product.id: quantity}, 'sale', order.id):
+                    raise ValueError(f'Stock insuficiente. Solo quedan {find_insufficient({product.id: quantity})[0].stock}')
+
+                if existing_item:
+                    existing_item.quantity += quantity
+                else:
+                    new_item = OrderItem(order_id=order.id, product_id=product.id, quantity=quantity, price_at_time=product.price)
+                    db.session.add(new_item)
+                
+                # 3. Actualizar total de la orden
+                order.total += item_cost
             
             db.session.commit()
             flash(f'{quantity}x de {product.name} añadido a la orden.', 'success')
@@ -242,22 +312,44 @@ def add_order_item(id):
     
     return redirect(url_for('order_details', id=id))
 
+@app.route('/api/orders/<int:id>/items', methods=['POST'])
+def api_edit_order_items(id):
+    """
+    Aplica en una sola transacción un lote de operaciones sobre los ítems del pedido:
+    {"ops": [{"op": "add", "product_id": 1, "quantity": 2}, {"op": "set", "item_id": 5, "quantity": 3},
+             {"op": "remove", "item_id": 6}]}
+    Regresa el pedido actualizado para refrescar la página de detalle.
+    """
+    order = Order.query.get_or_404(id)
+    data = request.get_json(silent=True) or {}
+    try:
+        ops = parse_item_ops(data.get('ops'))
+        apply_item_ops(order, ops)
+        db.session.commit()
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': str(e)})
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': f'Error al actualizar los ítems: {e}'})
+
+    return jsonify({'success': True, 'message': f'{len(ops)} cambios aplicados.', 'order': order_to_dict(order)})
+
 @app.route('/orders/<int:id>/remove_item/<int:item_id>')
 def remove_order_item(id, item_id):
     order = Order.query.get_or_404(id)
     item = OrderItem.query.get_or_404(item_id)
     
     try:
-        # 1. Restaurar stock
-        product = Product.query.get(item.product_id)
-        if product:
-            product.stock += item.quantity
-        
-        # 2. Actualizar total
-        order.total -= item.price_at_time * item.quantity
+        # 1. Restaurar stock (queda en el libro como devolución)
+        restore_stock({item.product_id: item.quantity}, 'return', order.id)
         
-        # 3. Eliminar item
-        db.session.delete(item)
+        with rollup.tracking(order):
+            # 2. Actualizar total
+            order.total -= item.price_at_time * item.quantity
+            
+            # 3. Eliminar item
+            db.session.delete(item)
         db.session.commit()
         flash('Ítem de la orden eliminado y stock restaurado.', 'warning')
     except Exception as e:
@@ -272,12 +364,13 @@ def delete_order(id):
     
     try:
         # Restaurar stock para todos los ítems antes de eliminar la orden
+        quantities = {}
         for item in order.items:
-            product = Product.query.get(item.product_id)
-            if product:
-                product.stock += item.quantity
+            quantities[item.product_id] = quantities.get(item.product_id, 0) + item.quantity
+        restore_stock(quantities, 'order_deleted', order.id)
                 
-        db.session.delete(order)
+        with rollup.tracking(order):
+            db.session.delete(order)
         db.session.commit()
         flash(f'Orden #{id} eliminada y stock restaurado.', 'success')
     except Exception as e:
@@ -292,7 +385,8 @@ def update_order_status(id):
     new_status = request.form.get('status')
     
     try:
-        order.status = new_status
+        with rollup.tracking(order):
+            order.status = new_status
         db.session.commit()
         flash(f'Estado de la Orden #{id} actualizado a {new_status}.', 'success')
     except Exception as e:
@@ -318,143 +412,150 @@ def add_order_payment(id):
     order = Order.query.get_or_404(id)
     try:
         amount = float(request.form.get('amount', 0))
-        
-        if amount <= 0:
-            flash('El monto del pago debe ser mayor a 0.', 'error')
-            return redirect(url_for('order_details', id=id))
+        method = request.form.get('method', 'cash')
+    except ValueError:
+        flash('Monto inválido.', 'error')
+        return redirect(url_for('order_details', id=id))
 
-        # Actualizar monto pagado
-        order.paid_amount = (order.paid_amount or 0) + amount
-        
-        # Calcular restante
-        remaining = order.total - order.paid_amount
+    try:
+        # Se agrega al libro de pagos y se suma en SQL (paid_amount = paid_amount + monto);
+        # al liquidar, la orden se marca como completada en el mismo UPDATE.
+        # Si pagó de más, el excedente queda en paid_amount como "crédito".
+        record_payment(order, amount, method, complete_when_paid=True)
+        db.session.commit()
 
-        # Lógica de auto-completado
-        if remaining <= 0.01: # Usamos un pequeño margen por errores de punto flotante
-            order.status = 'Completed'
-            order.payment_status = 'Paid'
-            # Si pagó de más, podríamos ajustar el paid_amount al total exacto o dejarlo como "crédito"
-            # Por simplicidad, dejamos el paid_amount tal cual se ingresó.
+        remaining = order.total - order.paid_amount
+        if order.payment_status == 'Paid':
             flash(f'Pago registrado. ¡La orden ha sido totalmente liquidada y marcada como COMPLETADA!', 'success')
         else:
-            order.payment_status = 'Partial'
             flash(f'Pago de ${amount} registrado. Restan ${remaining:.2f}', 'success')
 
-        db.session.commit()
-
-    except ValueError:
-        flash('Monto inválido.', 'error')
+    except ValueError as e:
+        db.session.rollback()
+        flash(str(e), 'error')
     except Exception as e:
         db.session.rollback()
         flash(f'Error al registrar pago: {e}', 'error')
 
     return redirect(url_for('order_details', id=id))
 
+def note_response(order_ids, fmt):
+    content, count = render_notes(order_ids, fmt)
+    if not count:
+        abort(404)
+    if fmt == 'pdf':
+        name = f"nota_{order_ids[0]}.pdf" if count == 1 else f"notas_{count}.pdf"
+        return Response(content, mimetype='application/pdf',
+                        headers={'Content-Disposition': f'inline; filename="{name}"'})
+    return content
+
 @app.route('/orders/<int:id>/note')
 def order_note(id):
-    order = Order.query.get_or_404(id)
-    return render_template('order_note.html', order=order)
+    """Nota imprimible del pedido (?format=pdf para PDF), servida desde la caché de notes.py."""
+    fmt = request.args.get('format', 'html')
+    if fmt not in NOTE_FORMATS:
+        abort(400)
+    return note_response([id], fmt)
+
+@app.route('/orders/notes')
+def order_notes():
+    """Impresión en lote: ?ids=1,2,3&format=html|pdf regresa un solo documento."""
+    fmt = request.args.get('format', 'html')
+    try:
+        order_ids = [int(i) for i in request.args.get('ids', '').split(',') if i.strip()]
+    except ValueError:
+        abort(400)
+    if fmt not in NOTE_FORMATS or not order_ids:
+        abort(400)
+    return note_response(order_ids, fmt)
 
 # --- Rutas de POS (Punto de Venta) ---
 
 @app.route('/pos')
 def pos():
-    products = Product.query.all()
-    clients = Client.query.all()
-    return render_template('pos.html', products=products, clients=clients)
+    # Los productos se cargan de /api/products y los clientes se buscan con /api/clients/search
+    return render_template('pos.html')
 
 @app.route('/pos/create_order', methods=['POST'])
 def create_pos_order():
     """
     Crea una orden directamente desde el POS usando una solicitud JSON.
-    CORREGIDO: El cálculo del total debe hacerse antes del commit final
+    Con client_key, repetir la petición regresa el mismo pedido (ver sales.py).
     """
     data = request.get_json()
-    client_id = data.get('client_id')
-    items = data.get('items')
-    
-    if not client_id or not items:
-        return jsonify({'success': False, 'message': 'Faltan datos (cliente o ítems)'})
-    
     try:
-        client = Client.query.get(client_id)
-        if not client:
-            return jsonify({'success': False, 'message': 'Cliente no encontrado.'})
-
-        # 1. Crear Orden base (status 'Completed' ya que es venta directa)
-        new_order = Order(client_id=client_id, status='Completed', shipping_address=client.address, total=0.0)
-        db.session.add(new_order)
-        # Hacemos un flush para que new_order tenga un ID, necesario para OrderItem
-        db.session.flush() 
-        
-        total_order = 0
-        
-        # 2. Procesar ítems y verificar stock
-        for item in items:
-            product = Product.query.get(item['id'])
-            quantity = item['quantity']
-
-            if not product:
-                db.session.rollback()
-                return jsonify({'success': False, 'message': f'Producto ID {item["id"]} no existe.'})
-            
-            if product.stock < quantity:
-                db.session.rollback()
-                return jsonify({'success': False, 'message': f'Stock insuficiente para {product.name}. Solo quedan {product.stock}'})
-                
-            order_item = OrderItem(
-                order_id=new_order.id, # Ahora new_order.id ya existe
-                product_id=product.id,
-                quantity=quantity,
-                price_at_time=product.price
-            )
-            
-            # En lugar de usar append, agregamos el OrderItem a la sesión
-            db.session.add(order_item)
-            
-            # Actualizar stock
-            product.stock -= quantity
-            total_order += product.price * quantity
-            
-        # 3. Asignar el total final a la orden
-        # 3. Asignar el total final a la orden
-        new_order.total = total_order
-
-        # --- Payment Logic ---
-        payment_type = data.get('payment_type', 'full') # 'full' or 'partial'
-        payment_amount = float(data.get('payment_amount', 0))
-        
-        if payment_type == 'full':
-            new_order.paid_amount = total_order
-            new_order.payment_status = 'Paid'
-            # Explicitly keep status as Pending per user request
-            new_order.status = 'Pending'
-        else:
-            new_order.paid_amount = payment_amount
-            if payment_amount >= total_order - 0.01:
-                 new_order.payment_status = 'Paid'
-            elif payment_amount > 0:
-                 new_order.payment_status = 'Partial'
-            else:
-                 new_order.payment_status = 'Pending'
-            
-            # Ensure status is Pending
-            new_order.status = 'Pending'
-        # ---------------------
-        
-        # 4. Commit final
+        order, created = create_sale(data)
         db.session.commit()
-        
-        return jsonify({'success': True, 'order_id': new_order.id, 'message': 'Venta registrada con éxito.'})
-        
+        message = 'Venta registrada con éxito.' if created else 'La venta ya estaba registrada.'
+        return jsonify({'success': True, 'order_id': order.id, 'message': message})
+    except IntegrityError as e:
+        # Otra petición con la misma client_key la registró al mismo tiempo
+        db.session.rollback()
+        order = find_sale(data.get('client_key'))
+        if order is None:
+            # Sin clave o por otra restricción: no hay venta previa que regresar
+            print(f"Error en create_pos_order: {e}")
+            return jsonify({'success': False, 'message': f'Error interno del servidor: {str(e)}'})
+        return jsonify({'success': True, 'order_id': order.id, 'message': 'La venta ya estaba registrada.'})
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': str(e)})
     except Exception as e:
-        # 5. Rollback en caso de cualquier error (CRUCIAL)
+        # Rollback en caso de cualquier error (CRUCIAL)
         db.session.rollback()
         print(f"Error en create_pos_order: {e}")
         return jsonify({'success': False, 'message': f'Error interno del servidor: {str(e)}'})
 
+@app.route('/pos/sync', methods=['POST'])
+def sync_pos_orders():
+    """
+    Cola de ventas del POS: {"sales": [{client_key, client_id, items, payment_type,
+    payment_amount, created_at}, ...]} en una sola transacción. Responde un resultado
+    por venta (created, duplicate, conflict o invalid); reenviar el lote no duplica pedidos.
+    """
+    data = request.get_json(silent=True) or {}
+    sales = data.get('sales')
+    if not isinstance(sales, list):
+        return jsonify({'success': False, 'message': 'Se esperaba la lista de ventas.'}), 400
+    if len(sales) > MAX_SYNC_SALES:
+        return jsonify({'success': False, 'message': f'Máximo {MAX_SYNC_SALES} ventas por envío.'}), 400
+    try:
+        results = sync_sales(sales)
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error en sync_pos_orders: {e}")
+        return jsonify({'success': False, 'message': f'Error interno del servidor: {str(e)}'}), 500
+    return jsonify({'success': True, 'results': results})
+
 # --- API Endpoints para AJAX (Modales) ---
 
+@app.route('/api/receivables')
+@replica.read_only
+def api_receivables():
+    """Cuentas por cobrar: clientes con saldo pendiente (?limit=N), de client_balance."""
+    return jsonify({'clients': get_receivables(request.args.get('limit', type=int))})
+
+@app.route('/api/clients/search')
+@replica.read_only
+def api_search_clients():
+    """Typeahead de clientes: ?q=<texto>&limit=N, ordenados por relevancia (FTS5)."""
+    results = search_clients(request.args.get('q', ''), request.args.get('limit', type=int))
+    return jsonify({'clients': results})
+
+@app.route('/api/clients', methods=['GET'])
+@replica.read_only
+def api_clients_feed():
+    """Clientes para la copia local del POS; ?updated_since= igual que /api/products."""
+    since = parse_timestamp(request.args.get('updated_since'))
+    etag = clients_etag(since)
+    if request.if_none_match.contains_weak(etag):
+        return '', 304, {'ETag': f'"{etag}"', 'Cache-Control': 'no-cache'}
+
+    response = jsonify(client_feed(since))
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
 @app.route('/api/clients', methods=['POST'])
 def api_add_client():
     data = request.get_json()
@@ -484,6 +585,34 @@ def api_add_client():
         db.session.rollback()
         return jsonify({'success': False, 'message': str(e)})
 
+@app.route('/api/products', methods=['GET'])
+@replica.read_only
+def api_products_feed():
+    """
+    Catálogo compacto para el POS. ?updated_since=<server_time de la respuesta anterior>
+    regresa solo los productos modificados y los IDs borrados desde entonces.
+    """
+    since = parse_timestamp(request.args.get('updated_since'))
+    etag = catalog_etag(since)
+    if request.if_none_match.contains_weak(etag):
+        return '', 304, {'ETag': f'"{etag}"', 'Cache-Control': 'no-cache'}
+
+    response = jsonify(product_feed(since))
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@app.route('/api/products/search')
+@replica.read_only
+def api_search_products():
+    """
+    Búsqueda de productos: ?q=&category=&in_stock=1&min_price=&max_price=&page=&per_page=
+    Incluye el total, el número de páginas y las facetas por categoría.
+    """
+    results = search_products(**parse_product_filters(request.args))
+    results['products'] = [product_to_dict(p) for p in results['products']]
+    return jsonify(results)
+
 @app.route('/api/products', methods=['POST'])
 def api_add_product():
     data = request.get_json()
@@ -503,6 +632,8 @@ def api_add_product():
             description=data.get('description')
         )
         db.session.add(new_product)
+        db.session.flush()
+        record_movements({new_product.id: new_product.stock}, 'initial')
         db.session.commit()
         return jsonify({
             'success': True,
@@ -522,108 +653,293 @@ def api_add_product():
         db.session.rollback()
         return jsonify({'success': False, 'message': str(e)})
 
+@app.route('/api/import/<kind>', methods=['POST'])
+def api_import(kind):
+    """
+    Importación masiva desde CSV: kind = products | clients. Acepta el archivo como
+    multipart (campo 'file') o como cuerpo de la petición (text/csv). ?batch_size=N
+    Productos: name, price (requeridos), sku, category, stock, description.
+    Clientes: name (requerido), phone, email, address.
+    """
+    # El importador se carga con la primera importación (no hace falta al arrancar)
+    from importer import import_csv, IMPORTERS, DEFAULT_BATCH_SIZE
+    if kind not in IMPORTERS:
+        return jsonify({'success': False, 'message': f'Tipo de importación desconocido: {kind}'}), 404
+    upload = request.files.get('file')
+    stream = upload.stream if upload else request.stream
+    report = import_csv(kind, stream, request.args.get('batch_size', DEFAULT_BATCH_SIZE, type=int))
+    return jsonify({
+        'success': not report['errors'],
+        'message': f"{report['inserted']} agregados, {report['updated']} actualizados, {len(report['errors'])} errores",
+        **report,
+    })
+
 # --- Rutas de Reportes (Simplificadas) ---
 
 @app.route('/reports')
 def reports():
-    # 1. Obtener filtros de fecha
-    start_date_str = request.args.get('start_date')
-    end_date_str = request.args.get('end_date')
-    
-    # Valores por defecto: Mes actual
-    today = date.today()
-    if not start_date_str:
-        start_date = datetime(today.year, today.month, 1)
-        start_date_str = start_date.strftime('%Y-%m-%d')
-    else:
-        try:
-            start_date = datetime.strptime(start_date_str, '%Y-%m-%d')
-        except ValueError:
-             start_date = datetime(today.year, today.month, 1) # Fallback
-
-    if not end_date_str:
-        # Fin de mes (aproximado, o hoy)
-        end_date = datetime.combine(today, datetime.max.time())
-        end_date_str = today.strftime('%Y-%m-%d')
-    else:
-        try:
-             # Aseguramos que cubra todo el día final
-             end_date_dt = datetime.strptime(end_date_str, '%Y-%m-%d')
-             end_date = datetime.combine(end_date_dt.date(), datetime.max.time())
-        except ValueError:
-             end_date = datetime.combine(today, datetime.max.time())
-
-    # 2. Consultas para Reporte de Pedidos
-    orders_query = Order.query.filter(Order.date >= start_date, Order.date <= end_date)
-    orders = orders_query.all()
-    
-    total_sales = sum(o.total for o in orders)
-    total_orders_count = len(orders)
-    completed_orders = sum(1 for o in orders if o.status == 'Completed')
-    pending_orders = sum(1 for o in orders if o.status == 'Pending')
-    
-    # 3. Consultas para Rotación de Inventario
-    # Queremos: Producto, Unidades Vendidas (en el rango), Stock Actual, Ingresos Generados
-    
-    # Obtenemos todos los items de las órdenes en el rango
-    # Optimización: Podríamos hacer esto con una query de agregación de SQL, pero en Python es más legible para este prototipo.
-    
-    rotation_data = {} # {product_id: {'product': obj, 'sold': 0, 'revenue': 0}}
-    
-    # Precargamos productos para no hacer N queries
-    all_products = {p.id: p for p in Product.query.all()}
-    
-    # Inicializamos con 0 para todos los productos (para ver los que NO se vendieron también, opcional)
-    for p_id, p in all_products.items():
-        rotation_data[p_id] = {'product': p, 'sold': 0, 'revenue': 0}
-
-    for order in orders:
-        # Solo contamos ventas de pedidos no cancelados? O todos?
-        # Generalmente rotación incluye todo lo que salió del inventario.
-        # Si el pedido está 'Cancelled' y repusimos stock, NO debería contar.
-        if order.status == 'Cancelled':
-            continue
-            
-        for item in order.items:
-            if item.product_id in rotation_data:
-                rotation_data[item.product_id]['sold'] += item.quantity
-                rotation_data[item.product_id]['revenue'] += (item.price_at_time * item.quantity)
-    
-    # Convertir a lista y ordenar por unidades vendidas (descendente)
-    rotation_list = sorted(rotation_data.values(), key=lambda x: x['sold'], reverse=True)
+    # 1. Obtener filtros de fecha (por defecto: mes actual)
+    start_date, end_date, start_date_str, end_date_str = parse_report_range(request.args)
+
+    # 2. El resumen y la rotación de inventario se calculan en segundo plano (jobs.report_job);
+    # la página consulta /api/jobs/<id> y pinta el resultado. Un reporte igual reciente se reutiliza.
+    from jobs import submit as submit_job, job_to_dict
+    job = submit_job('report', {'start_date': start_date_str, 'end_date': end_date_str})
 
     return render_template('reports.html', 
                            start_date=start_date_str,
                            end_date=end_date_str,
-                           total_sales=total_sales,
-                           total_orders_count=total_orders_count,
-                           completed_orders=completed_orders,
-                           pending_orders=pending_orders,
-                           rotation_data=rotation_list)
+                           job=job_to_dict(job))
+
+@app.route('/reports/export/<kind>')
+@replica.reporting
+def export_report(kind):
+    """
+    Descarga de orders | order_items | rotation en el rango de fechas del reporte.
+    ?format=csv (por defecto) | xlsx. La respuesta se genera mientras se lee la base.
+    """
+    # Se carga con la primera exportación (no hace falta al arrancar)
+    from exports import EXPORTS, EXPORT_FORMATS, export_filename, stream_csv, stream_xlsx
+    fmt = request.args.get('format', 'csv')
+    if kind not in EXPORTS or fmt not in EXPORT_FORMATS:
+        flash('Exportación no válida.', 'error')
+        return redirect(url_for('reports'))
+    start_date, end_date, start_date_str, end_date_str = parse_report_range(request.args)
+
+    if fmt == 'xlsx':
+        try:
+            chunks = stream_xlsx(kind, start_date, end_date)
+        except ImportError:
+            flash('La exportación a Excel requiere XlsxWriter (pip install XlsxWriter). Use CSV.', 'error')
+            return redirect(url_for('reports', start_date=start_date_str, end_date=end_date_str))
+        mimetype = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    else:
+        chunks = stream_csv(kind, start_date, end_date)
+        mimetype = 'text/csv; charset=utf-8'
+
+    filename = export_filename(kind, start_date_str, end_date_str, fmt)
+    return Response(stream_with_context(chunks), mimetype=mimetype, headers={
+        'Content-Disposition': f'attachment; filename="{filename}"',
+    })
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Métricas de peticiones y consultas en formato de texto de Prometheus."""
+    return metrics.render_metrics(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
+# --- Trabajos en segundo plano ---
+
+@app.route('/api/jobs', methods=['POST'])
+def api_submit_job():
+    """{"kind": "report" | "export", "params": {...}} -> el trabajo (nuevo o uno equivalente reciente)."""
+    from jobs import submit as submit_job, job_to_dict
+    data = request.get_json(silent=True) or {}
+    params = data.get('params') or {}
+    if not isinstance(params, dict):
+        return jsonify({'success': False, 'message': 'Parámetros inválidos'}), 400
+    try:
+        job = submit_job(data.get('kind'), params)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    return jsonify({'success': True, 'job': job_to_dict(job)})
+
+@app.route('/api/jobs/<job_id>')
+def api_job_status(job_id):
+    from jobs import job_to_dict
+    job = db.get_or_404(Job, job_id)
+    return jsonify(job_to_dict(job))
+
+@app.route('/api/jobs/<job_id>/result')
+def api_job_result(job_id):
+    from jobs import job_to_dict
+    job = db.get_or_404(Job, job_id)
+    if job.status != 'done' or not job.result_path or not os.path.exists(job.result_path):
+        return jsonify({'success': False, 'message': 'El resultado no está disponible.', 'job': job_to_dict(job)}), 409
+    return send_file(job.result_path, mimetype=job.result_mimetype, download_name=job.result_name,
+                     as_attachment=job.kind == 'export')
+
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+def api_cancel_job(job_id):
+    from jobs import cancel as cancel_job, job_to_dict
+    job = db.get_or_404(Job, job_id)
+    if not cancel_job(job):
+        return jsonify({'success': False, 'message': 'El trabajo ya terminó.', 'job': job_to_dict(job)})
+    return jsonify({'success': True, 'message': 'Cancelación solicitada.', 'job': job_to_dict(job)})
+
+# --- Replicación entre tiendas (ver replication.py; se carga con la primera sincronización) ---
+
+@app.route('/api/sync/status')
+def api_sync_status():
+    """Marca de agua de esta base para una tienda (?store_id=): el push empieza desde ahí."""
+    store = request.args.get('store_id')
+    if not store:
+        return jsonify({'success': False, 'message': 'Falta store_id'}), 400
+    import replication
+    return jsonify({'success': True, 'store_id': replication.store_id(),
+                    'received': replication.received_watermark(store)})
+
+@app.route('/api/sync/push', methods=['POST'])
+def api_sync_push():
+    """Lote de cambios de una tienda (JSON con gzip); reenviar un lote no duplica nada."""
+    import replication
+    try:
+        batch = replication.unpack(request.get_data())
+        result = replication.apply_batch(batch)
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': str(e)}), 409
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error en api_sync_push: {e}")
+        return jsonify({'success': False, 'message': f'Error interno del servidor: {str(e)}'}), 500
+    return jsonify({'success': True, **result})
+
+@app.route('/api/sync/pull')
+def api_sync_pull():
+    """Cambios de clientes y productos para una tienda (?store_id=&since=), JSON con gzip."""
+    store = request.args.get('store_id')
+    if not store:
+        return jsonify({'success': False, 'message': 'Falta store_id'}), 400
+    import replication
+    batch = replication.export_changes(request.args.get('since', 0, type=int), peer=store,
+                                       entities=replication.PULL_ENTITIES)
+    return Response(replication.pack(batch), mimetype='application/json',
+                    headers={'Content-Encoding': 'gzip', 'Cache-Control': 'no-store'})
+
+# --- Comandos CLI ---
+
+@app.cli.command('rebuild-rollup')
+def rebuild_rollup_command():
+    """Recalcula el acumulado diario de ventas (daily_sales) desde Order/OrderItem."""
+    rollup.rebuild()
+    db.session.commit()
+    print("Daily sales rollup rebuilt.")
+
+@app.cli.command('snapshot-stock')
+def snapshot_stock_command():
+    """Toma una foto del stock actual (base para el stock a una fecha)."""
+    snapshot = take_snapshot()
+    db.session.commit()
+    print(f"Stock snapshot #{snapshot.id} taken ({snapshot.last_movement_id} movements so far).")
+
+@app.cli.command('archive-orders')
+@click.option('--days', default=archive.ARCHIVE_AFTER_DAYS, show_default=True,
+              help='Antigüedad mínima (días) de los pedidos cerrados que se archivan.')
+@click.option('--batch-size', default=archive.ARCHIVE_BATCH_SIZE, show_default=True, help='Pedidos por lote.')
+@click.option('--vacuum', is_flag=True, help='Compactar la base al terminar.')
+def archive_orders_command(days, batch_size, vacuum):
+    """Mueve los pedidos cerrados antiguos (con ítems y pagos) al archivo histórico."""
+    init_db()
+    started = time.perf_counter()
+    total = archive.archive_orders(days, batch_size, on_batch=lambda n: print(f"  {n} orders archived"))
+    print(f"{total} orders archived in {time.perf_counter() - started:.2f}s "
+          f"(archive: {archive.archive_path(db.engine.url.database)})")
+    if vacuum:
+        archive.vacuum()
+        print(f"Database compacted: {os.path.getsize(db.engine.url.database) / 1e6:.1f} MB")
+
+def open_peer_app(path):
+    """Aplicación mínima sobre otra base en disco (la central de `flask sync otra.db`)."""
+    peer = Flask(__name__)
+    peer.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.abspath(path)}"
+    peer.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(peer)
+    with peer.app_context():
+        event.listen(db.engine, 'connect', set_sqlite_pragmas)
+        db.create_all()
+        run_migrations(db.engine)
+    return peer
+
+@app.cli.command('sync')
+@click.argument('target')
+@click.option('--batch-size', type=int, help='Cambios por lote (por defecto SYNC_BATCH_SIZE de replication.py).')
+def sync_command(target, batch_size):
+    """Sincroniza con la base central: URL (http://...) o ruta de otra base .db."""
+    import replication
+    init_db()
+    if target.startswith(('http://', 'https://')):
+        peer = replication.HttpPeer(target)
+    else:
+        peer = replication.LocalPeer(open_peer_app(target))
+    started = time.perf_counter()
+    result = replication.sync(peer, batch_size or replication.SYNC_BATCH_SIZE, on_batch=lambda stage, r: print(
+        f"  {stage}: {r['applied']} applied, {r['skipped']} skipped (watermark {r['watermark']})"))
+    print(f"Store {result['store_id']} synced with {result['central']} in {time.perf_counter() - started:.2f}s: "
+          f"{result['pushed']} changes pushed, {result['pulled']} pulled")
+    for conflict in result['conflicts']:
+        print(f"  Conflict ({conflict['type']}) {conflict['entity']} {conflict['gid']}: {conflict['message']}")
+
+@app.cli.command('migrate')
+def migrate_command():
+    """Crea las tablas que falten y aplica las migraciones pendientes."""
+    init_db()
+
+@app.cli.command('import-csv')
+@click.argument('kind')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--batch-size', type=int, help='Filas por transacción (por defecto DEFAULT_BATCH_SIZE de importer.py).')
+def import_csv_command(kind, path, batch_size):
+    """Importa productos o clientes (KIND = products | clients) desde un archivo CSV."""
+    from importer import import_csv, IMPORTERS, DEFAULT_BATCH_SIZE
+    if kind not in IMPORTERS:
+        raise click.BadParameter(f"debe ser uno de: {', '.join(sorted(IMPORTERS))}", param_hint='KIND')
+    # Migraciones, acumulados y FTS al día antes de escribir (la base puede ser nueva)
+    init_db()
+    started = time.perf_counter()
+    with open(path, 'rb') as f:
+        report = import_csv(kind, f, batch_size or DEFAULT_BATCH_SIZE)
+    elapsed = time.perf_counter() - started
+    print(f"{report['processed']} rows in {elapsed:.2f}s: "
+          f"{report['inserted']} inserted, {report['updated']} updated, {len(report['errors'])} errors")
+    for error in report['errors'][:50]:
+        print(f"  row {error['row']}: {error['message']}")
 
 # --- Inicialización de la Aplicación ---
 
+def init_db():
+    """
+    Prepara la base de datos al arrancar: crea las tablas que falten, aplica las
+    migraciones pendientes (migrations.py) y construye el acumulado diario si hace falta.
+    Debe llamarse dentro de un app_context.
+    """
+    # La ruta real la resuelve Flask-SQLAlchemy (las rutas relativas van a la carpeta instance/)
+    db_path = db.engine.url.database
+    if not os.path.exists(db_path):
+        print(f"Creating database at {db_path}")
+    else:
+        print(f"Using database at {db_path}")
+
+    # create_all solo crea las tablas que falten (con sus índices)
+    db.create_all()
+    for version, name in run_migrations(db.engine):
+        print(f"Applied migration {version:03d} {name}")
+    archive.ensure_schema()
+    rollup.ensure_built()
+    maybe_snapshot()
+    from jobs import recover_jobs
+    recover_jobs()
+
 if __name__ == '__main__':
-    # Crear la base de datos si no existe
     with app.app_context():
-        # Verificamos si ya existe la base de datos antes de crearla para evitar advertencias
-        if not os.path.exists('termomaz.db'):
-            db.create_all()
-            # Opcional: Agregar algunos datos de prueba al inicio si la DB está vacía
-            print("Database initialized and models created.")
-        else:
-            print("Database already exists.")
+        init_db()
             
     # Ejecutar la aplicación
-    # Se recomienda usar gunicorn o waitress para producción, pero para desarrollo está bien.
-    if getattr(sys, 'frozen', False):
-        # Si se ejecuta como ejecutable (PyInstaller), desactivar debug
-        # y abrir el navegador automáticamente (opcional, pero útil)
-        import webbrowser
-        from threading import Timer
-        def open_browser():
-            webbrowser.open_new('http://127.0.0.1:5000/')
-        Timer(1, open_browser).start()
-        app.run(debug=False, port=5000)
+    host = os.environ.get('TERMOMAZ_HOST', '127.0.0.1')
+    port = int(os.environ.get('TERMOMAZ_PORT', 5000))
+    # Modo producción: ejecutable, `python app.py --serve` o TERMOMAZ_ENV=production
+    production = (getattr(sys, 'frozen', False) or '--serve' in sys.argv
+                  or os.environ.get('TERMOMAZ_ENV') == 'production')
+
+    if production:
+        # Servidor WSGI multi-hilo (varias terminales POS a la vez). create_server ya deja
+        # el socket escuchando, así que desde aquí el navegador puede conectarse
+        from waitress import create_server
+        server = create_server(app, host=host, port=port, threads=worker_threads)
+        print(f"Serving on http://{host}:{port} with {worker_threads} threads "
+              f"(ready in {startup.elapsed():.2f}s)", flush=True)
+        if getattr(sys, 'frozen', False) and not os.environ.get('TERMOMAZ_NO_BROWSER'):
+            # Si se ejecuta como ejecutable (PyInstaller), abrir el navegador automáticamente
+            startup.open_browser(f'http://127.0.0.1:{port}/')
+        server.run()
     else:
-        app.run(debug=True, port=5000)
\ No newline at end of file
+        app.run(debug=True, host=host, port=port)
\ No newline at end of file
@@ -0,0 +1,220 @@
+"""
+Archivo histórico de pedidos cerrados en una base SQLite aparte (termomaz_archive.db).
+archive_orders() mueve por lotes los pedidos terminados hace más de ARCHIVE_AFTER_DAYS
+días (Completed y pagados, o Cancelled) con sus ítems y pagos, así las tablas vivas
+solo guardan la historia reciente y caben en la caché de páginas.
+  - Cada conexión (la principal y las de solo lectura de replica.py) tiene el archivo
+    adjunto con ATTACH como esquema `archive`; las rutas frecuentes no lo tocan.
+  - Los acumulados (daily_sales, client_balance) no cambian al archivar: los reportes
+    que leen de ellos ya incluyen lo archivado. Las consultas de pedidos sueltos por
+    rango de fechas (exportaciones, rollup.rebuild) usan order_sources(), que agrega las
+    tablas del archivo con UNION ALL solo si el rango llega a fechas archivadas.
+  - Cada lote se copia al archivo y se borra de la base en dos transacciones: con WAL una
+    transacción no es atómica entre dos archivos, y así una interrupción deja a lo más
+    pedidos repetidos (el siguiente lote los vuelve a copiar y borrar), nunca perdidos.
+    Mientras tanto las consultas ignoran la copia del archivo de un pedido que sigue vivo;
+    los IDs de pedido no se reutilizan (AUTOINCREMENT), así un ID vivo y uno archivado
+    iguales son siempre el mismo pedido.
+Los pedidos, ítems y pagos archivados ya no se editan ni aparecen en /orders.
+"""
+import os
+import pathlib
+from datetime import datetime, timedelta
+from sqlalchemy import Column, Index, MetaData, Table, delete, event, func, insert, or_, select, text, union_all
+from sqlalchemy.orm import aliased
+from models import db, Order, OrderItem, Payment
+
+ARCHIVE_AFTER_DAYS = int(os.environ.get('TERMOMAZ_ARCHIVE_AFTER_DAYS', 365))
+ARCHIVE_BATCH_SIZE = 500
+SCHEMA = 'archive'
+
+archive_metadata = MetaData()
+
+
+def _archive_table(model, *indexes):
+    # Mismas columnas sin clave primaria ni llaves foráneas (los clientes y productos siguen
+    # en la base principal); cada fila se identifica por su rowid
+    table = Table(model.__tablename__, archive_metadata,
+                  *[Column(c.name, c.type) for c in model.__table__.columns], schema=SCHEMA)
+    for name, *columns in indexes:
+        Index(name, *[table.c[column] for column in columns])
+    return table
+
+
+archived_order = _archive_table(Order, ('ix_archive_order_id', 'id'), ('ix_archive_order_date', 'date'))
+archived_item = _archive_table(OrderItem, ('ix_archive_order_item_order_id', 'order_id'))
+archived_payment = _archive_table(Payment, ('ix_archive_payment_order_id', 'order_id'))
+
+# Tabla viva -> tabla del archivo, en el orden en que se copian
+ARCHIVED_TABLES = [(Order.__table__, archived_order), (OrderItem.__table__, archived_item),
+                   (Payment.__table__, archived_payment)]
+
+
+def archive_path(db_path):
+    """termomaz.db -> termomaz_archive.db (junto a la base)."""
+    base, ext = os.path.splitext(db_path)
+    return f'{base}_archive{ext or ".db"}'
+
+
+def _attach_listener(path, read_only):
+    def attach(dbapi_connection, connection_record):
+        if read_only:
+            if not os.path.exists(path):
+                return
+            # Las conexiones de replica.py se abren con uri=True
+            target = f'{pathlib.Path(path).as_uri()}?mode=ro'
+        else:
+            target = path
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f'ATTACH DATABASE ? AS {SCHEMA}', (target,))
+        cursor.close()
+    return attach
+
+
+def init_app(app, engine):
+    """Adjunta el archivo en cada conexión nueva del engine y de los de solo lectura."""
+    import replica
+    db_path = engine.url.database
+    if not db_path or db_path == ':memory:':
+        return
+    path = archive_path(db_path)
+    event.listen(engine, 'connect', _attach_listener(path, read_only=False))
+    replica.init_app(app, on_engine=lambda e: event.listen(e, 'connect', _attach_listener(path, read_only=True)))
+
+
+def ensure_schema():
+    """Crea las tablas del archivo si faltan (init_db; el archivo lo crea el ATTACH)."""
+    if not is_attached():
+        return
+    with db.engine.begin() as conn:
+        conn.exec_driver_sql(f'PRAGMA {SCHEMA}.journal_mode=WAL')
+        archive_metadata.create_all(conn)
+        # "order" es AUTOINCREMENT (migración 013): la secuencia nunca baja del ID archivado
+        # más alto, así un pedido nuevo no repite el ID de uno archivado (las consultas los
+        # distinguen por ID, ver order_sources)
+        highest = conn.execute(select(func.max(archived_order.c.id))).scalar()
+        if highest is not None:
+            conn.execute(text("UPDATE sqlite_sequence SET seq = :seq WHERE name = 'order' AND seq < :seq"),
+                         {'seq': highest})
+            conn.execute(text("INSERT INTO sqlite_sequence (name, seq) SELECT 'order', :seq "
+                              "WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = 'order')"),
+                         {'seq': highest})
+
+
+def is_attached():
+    names = [row[1] for row in db.session.execute(text('PRAGMA database_list'))]
+    return SCHEMA in names
+
+
+# --- Consultas ---
+
+def archived_through():
+    """Fecha del pedido archivado más reciente (None si el archivo está vacío o no existe)."""
+    if not is_attached():
+        return None
+    return db.session.execute(select(func.max(archived_order.c.date))).scalar()
+
+
+def _in_range(order_table, start_date, end_date):
+    ids = select(order_table.c.id)
+    if start_date is not None:
+        ids = ids.where(order_table.c.date >= start_date)
+    if end_date is not None:
+        ids = ids.where(order_table.c.date <= end_date)
+    return ids
+
+
+def _union(model, live_where, archived_table, archived_where):
+    columns = model.__table__.columns
+    union = union_all(
+        select(*columns).where(*live_where),
+        select(*[archived_table.c[c.name] for c in columns]).where(*archived_where),
+    ).subquery(f'{model.__tablename__}_all')
+    return aliased(model, union, adapt_on_names=True)
+
+
+def order_sources(start_date=None, end_date=None):
+    """
+    (Order, OrderItem) para consultar los pedidos del rango (None: sin límite):
+    los modelos tal cual si el rango no llega a lo archivado; si llega, alias sobre
+    UNION ALL de la tabla viva y la del archivo. Se usan igual que los modelos; el rango
+    solo sirve para leer de cada tabla de ítems los de los pedidos de esas fechas.
+    """
+    through = archived_through()
+    if through is None or (start_date is not None and start_date > through):
+        return Order, OrderItem
+    live_order, live_item = Order.__table__, OrderItem.__table__
+    # Un pedido a medio archivar (copiado pero aún no borrado) se lee de la tabla viva
+    live_ids = select(live_order.c.id)
+    ranged = start_date is not None or end_date is not None
+    order = _union(Order, [], archived_order, [archived_order.c.id.not_in(live_ids)])
+    order_item = _union(
+        OrderItem,
+        [live_item.c.order_id.in_(_in_range(live_order, start_date, end_date))] if ranged else [],
+        archived_item,
+        [archived_item.c.order_id.not_in(live_ids)]
+        + ([archived_item.c.order_id.in_(_in_range(archived_order, start_date, end_date))] if ranged else []),
+    )
+    return order, order_item
+
+
+# --- Archivado ---
+
+def archivable_filter(cutoff):
+    closed = or_((Order.status == 'Completed') & (Order.payment_status == 'Paid'), Order.status == 'Cancelled')
+    return (Order.date < cutoff) & closed
+
+
+def _order_key(table):
+    return table.c.id if table.name == Order.__tablename__ else table.c.order_id
+
+
+def _copy_batch(order_ids):
+    """Transacción 1: copia los pedidos con sus ítems y pagos (reemplaza copias previas)."""
+    for live, archived in ARCHIVED_TABLES:
+        db.session.execute(delete(archived).where(_order_key(archived).in_(order_ids)))
+        source = select(*live.columns).where(_order_key(live).in_(order_ids))
+        db.session.execute(insert(archived).from_select([c.name for c in live.columns], source))
+    db.session.commit()
+
+
+def _delete_batch(order_ids):
+    """Transacción 2: borra de la base los pedidos ya copiados (ítems y pagos primero)."""
+    from replication import paused
+    # Archivar no es borrar: la central conserva los pedidos
+    with paused():
+        for live, _ in reversed(ARCHIVED_TABLES):
+            db.session.execute(delete(live).where(_order_key(live).in_(order_ids)))
+    db.session.commit()
+
+
+def archive_orders(older_than_days=ARCHIVE_AFTER_DAYS, batch_size=ARCHIVE_BATCH_SIZE, on_batch=None):
+    """
+    Mueve al archivo los pedidos cerrados con fecha anterior a hoy - older_than_days,
+    de batch_size en batch_size (las ventas del POS pueden escribir entre lotes).
+    on_batch(archivados_hasta_ahora) se llama después de cada lote. Regresa el total.
+    """
+    if not is_attached():
+        raise RuntimeError('La base no tiene archivo adjunto (base en memoria).')
+    ensure_schema()
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    total = 0
+    while True:
+        order_ids = [row[0] for row in db.session.query(Order.id).filter(
+            archivable_filter(cutoff)
+        ).order_by(Order.id).limit(batch_size)]
+        if not order_ids:
+            break
+        _copy_batch(order_ids)
+        _delete_batch(order_ids)
+        total += len(order_ids)
+        if on_batch:
+            on_batch(total)
+    return total
+
+
+def vacuum():
+    """Compacta la base principal después de archivar (el archivo de la base se reduce)."""
+    db.session.remove()
+    with db.engine.connect() as conn:
+        conn.exec_driver_sql('VACUUM')
@@ -0,0 +1,98 @@
+"""
+Archivos estáticos con hash en el nombre y compresión de las respuestas.
+  - asset_url('app.css') en las plantillas da la URL del archivo compilado por
+    build_assets.py (static/dist/app.<hash>.css, según static/dist/manifest.json).
+  - static/dist se sirve con caché inmutable de un año: el navegador no vuelve a pedir
+    un archivo mientras su nombre no cambie. Si el navegador acepta brotli o gzip se
+    envía la versión ya comprimida (.br/.gz) que dejó el build.
+  - Las páginas HTML y las respuestas JSON se comprimen con gzip al vuelo.
+"""
+import gzip
+import json
+import logging
+import mimetypes
+import os
+from flask import current_app, request, send_from_directory, url_for
+from werkzeug.security import safe_join
+
+DIST = 'dist'
+MANIFEST = 'manifest.json'
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+# Orden de preferencia de las versiones precomprimidas
+PRECOMPRESSED = (('br', '.br'), ('gzip', '.gz'))
+
+COMPRESSED_MIMETYPES = ('text/html', 'application/json')
+MIN_COMPRESS_SIZE = 1024  # Bytes; las respuestas chicas no ganan nada
+COMPRESS_LEVEL = 6
+
+logger = logging.getLogger('termomaz.assets')
+
+# Windows no siempre conoce el tipo de woff2
+mimetypes.add_type('font/woff2', '.woff2')
+
+
+def load_manifest(static_folder):
+    path = os.path.join(static_folder, DIST, MANIFEST)
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        logger.warning('No existe %s: ejecute python build_assets.py', path)
+        return {}
+
+
+def dist_asset(filename):
+    """Archivo de static/dist con caché inmutable, en la versión comprimida que acepte el navegador."""
+    directory = os.path.join(current_app.static_folder, DIST)
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    for encoding, suffix in PRECOMPRESSED:
+        if encoding in request.accept_encodings:
+            path = safe_join(directory, filename + suffix)
+            if path and os.path.isfile(path):
+                response = send_from_directory(directory, filename + suffix, mimetype=mimetype,
+                                               max_age=IMMUTABLE_MAX_AGE)
+                response.headers['Content-Encoding'] = encoding
+                break
+    else:
+        response = send_from_directory(directory, filename, mimetype=mimetype, max_age=IMMUTABLE_MAX_AGE)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def compress_response(response):
+    """gzip para HTML y JSON generados (no para archivos enviados ni respuestas en streaming)."""
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSED_MIMETYPES):
+        return response
+    response.vary.add('Accept-Encoding')
+    if 'gzip' not in request.accept_encodings:
+        return response
+    data = response.get_data()
+    if len(data) < MIN_COMPRESS_SIZE:
+        return response
+    response.set_data(gzip.compress(data, compresslevel=COMPRESS_LEVEL))
+    response.headers['Content-Encoding'] = 'gzip'
+    # El cuerpo cambió: un ETag fuerte ya no corresponde byte a byte
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+
+def init_app(app):
+    """Registra asset_url, la ruta de static/dist y la compresión de respuestas."""
+    manifest = load_manifest(app.static_folder)
+
+    def asset_url(name):
+        hashed = manifest.get(name)
+        if hashed is None:
+            return url_for('static', filename=name)
+        return url_for('static', filename=f'{DIST}/{hashed}')
+
+    app.add_template_global(asset_url)
+    # Más específica que /static/<path:filename>, así que tiene prioridad
+    app.add_url_rule(f'{app.static_url_path}/{DIST}/<path:filename>', 'dist_asset', dist_asset)
+    app.after_request(compress_response)
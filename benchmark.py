@@ -0,0 +1,394 @@
+"""
+Benchmark de carga con datos sintéticos.
+
+    python benchmark.py generate --db bench.db --clients 10000 --products 5000 --orders 1000000
+    python benchmark.py run --db bench.db --concurrency 8 --requests 200 --output bench_results.json
+    python benchmark.py run --db bench.db --compare bench_results.json
+
+`generate` crea una base nueva y reproducible (misma --seed, mismos datos) con inserciones
+Core en lote, y al final reconstruye el acumulado diario (rollup.rebuild).
+`run` recorre las rutas reales con varios clientes concurrentes (hilos sobre el test client
+de Flask, o peticiones HTTP contra un servidor con --url) y reporta por ruta: latencia
+p50/p95/p99, peticiones por segundo y consultas SQL por petición (solo en proceso).
+El reporte se mide ejecutando su trabajo de jobs.py en el proceso (se omite con --url).
+Las rutas de escritura (POS, pagos) modifican la base: usar una copia dedicada.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+import urllib.request
+from datetime import datetime, timedelta
+
+STATUSES = ['Pending', 'Completed', 'Completed', 'Completed', 'Cancelled']
+CATEGORIES = ['thermos', 'box', 'other']
+PAYMENT_METHODS = ['cash', 'card', 'transfer']
+INSERT_CHUNK = 20000
+REGRESSION_THRESHOLD = 0.20
+
+
+def load_app(db_path):
+    # app.py lee TERMOMAZ_DB_PATH al importarse
+    os.environ['TERMOMAZ_DB_PATH'] = db_path
+    import app as app_module
+    return app_module
+
+
+# --- Generación de datos ---
+
+def _chunks(rows, size=INSERT_CHUNK):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _insert(db, table, rows):
+    from sqlalchemy import insert
+    count = 0
+    for chunk in _chunks(rows):
+        db.session.execute(insert(table), chunk)
+        db.session.commit()
+        count += len(chunk)
+    return count
+
+
+def generate(args):
+    if os.path.exists(args.db):
+        sys.exit(f"{args.db} already exists; remove it or choose another path.")
+    app_module = load_app(args.db)
+    app, db = app_module.app, app_module.db
+    from models import Client, Product, Order, OrderItem, Payment
+    import rollup
+    from stock import take_snapshot
+
+    rng = random.Random(args.seed)
+    now = datetime.utcnow().replace(microsecond=0)
+    started = time.perf_counter()
+
+    with app.app_context():
+        app_module.init_db()
+
+        _insert(db, Client.__table__, ({
+            'id': i, 'name': f"Cliente {i:06d}", 'phone': f"555-{i:07d}",
+            'email': f"cliente{i}@example.com", 'address': f"Calle {rng.randint(1, 999)} #{i}",
+            'created_at': now,
+        } for i in range(1, args.clients + 1)))
+
+        prices = {i: round(rng.uniform(20, 900), 2) for i in range(1, args.products + 1)}
+        _insert(db, Product.__table__, ({
+            'id': i, 'name': f"Producto {i:05d}", 'sku': f"SKU-{i:05d}",
+            'category': rng.choice(CATEGORIES), 'price': price, 'stock': args.stock,
+            'description': f"Producto de prueba {i}", 'created_at': now, 'updated_at': now,
+        } for i, price in prices.items()))
+
+        # Los ítems (y el pago) se generan junto con su pedido para calcular el total; los IDs son explícitos
+        items = []
+        payments = []
+
+        def order_rows():
+            for order_id in range(1, args.orders + 1):
+                lines = {}
+                for _ in range(rng.randint(1, args.max_items)):
+                    product_id = rng.randint(1, args.products)
+                    lines[product_id] = lines.get(product_id, 0) + rng.randint(1, 5)
+                total = 0.0
+                for product_id, quantity in lines.items():
+                    items.append({'order_id': order_id, 'product_id': product_id,
+                                  'quantity': quantity, 'price_at_time': prices[product_id]})
+                    total += quantity * prices[product_id]
+                paid = rng.choice([0.0, round(total / 2, 2), total])
+                client_id = rng.randint(1, args.clients)
+                order_date = now - timedelta(seconds=rng.randint(0, args.days * 86400))
+                if paid:
+                    payments.append({'order_id': order_id, 'client_id': client_id, 'amount': paid,
+                                     'method': rng.choice(PAYMENT_METHODS), 'created_at': order_date})
+                yield {
+                    'id': order_id, 'client_id': client_id,
+                    'date': order_date,
+                    'status': rng.choice(STATUSES), 'total': total, 'paid_amount': paid,
+                    'payment_status': 'Paid' if paid >= total else ('Partial' if paid else 'Pending'),
+                    'shipping_address': None,
+                }
+
+        item_count = 0
+        for chunk in _chunks(order_rows()):
+            db.session.execute(Order.__table__.insert(), chunk)
+            item_count += _insert(db, OrderItem.__table__, items)
+            _insert(db, Payment.__table__, payments)
+            items.clear()
+            payments.clear()
+            db.session.commit()
+
+        rollup.rebuild()
+        take_snapshot()
+        db.session.commit()
+
+    elapsed = time.perf_counter() - started
+    print(f"Generated {args.clients} clients, {args.products} products, {args.orders} orders, "
+          f"{item_count} items in {elapsed:.1f}s -> {args.db}")
+
+
+# --- Carga ---
+
+class QueryCounter:
+    """Cuenta las sentencias SQL ejecutadas por el hilo actual (listener de todos los engines)."""
+
+    def __init__(self):
+        self.local = threading.local()
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.local.count = getattr(self.local, 'count', 0) + 1
+
+    def reset(self):
+        self.local.count = 0
+
+    @property
+    def count(self):
+        return getattr(self.local, 'count', 0)
+
+
+def build_scenarios(ids, rng):
+    """
+    Rutas a medir: (nombre, método, función que arma (path, datos)). Con el método 'JOB'
+    se arma (tipo, parámetros) y se ejecuta el trabajo de jobs.py en el proceso.
+    """
+    client_ids, product_ids, order_ids = ids['clients'], ids['products'], ids['orders']
+
+    def pos_sale():
+        items = [{'id': rng.choice(product_ids), 'quantity': rng.randint(1, 3)} for _ in range(rng.randint(1, 4))]
+        return '/pos/create_order', {'json': {'client_id': rng.choice(client_ids), 'items': items, 'payment_amount': 0}}
+
+    return [
+        ('dashboard', 'GET', lambda: ('/', None)),
+        ('orders', 'GET', lambda: ('/orders', None)),
+        ('orders_filtered', 'GET', lambda: (f"/orders?status=Pending&client_id={rng.choice(client_ids)}", None)),
+        ('order_details', 'GET', lambda: (f"/orders/{rng.choice(order_ids)}", None)),
+        # /reports solo encola el trabajo (y reutiliza uno igual): se mide el cuerpo del trabajo
+        ('reports', 'JOB', lambda: ('report', {'start_date': '2000-01-01', 'end_date': '2100-01-01'})),
+        ('pos', 'GET', lambda: ('/pos', None)),
+        ('product_feed', 'GET', lambda: ('/api/products', None)),
+        ('pos_create_order', 'POST', pos_sale),
+        ('add_payment', 'POST', lambda: (f"/orders/{rng.choice(order_ids)}/add_payment", {'data': {'amount': '1'}})),
+    ]
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def _sample_ids(db, model, limit=5000):
+    from sqlalchemy import func
+    ids = [row[0] for row in db.session.query(model.id).order_by(func.random()).limit(limit)]
+    if not ids:
+        sys.exit(f"No {model.__tablename__} rows; run 'generate' first.")
+    return ids
+
+
+def run(args):
+    app_module = load_app(args.db)
+    app, db = app_module.app, app_module.db
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+    from models import Client, Product, Order
+
+    with app.app_context():
+        app_module.init_db()
+        ids = {
+            'clients': _sample_ids(db, Client),
+            'products': _sample_ids(db, Product),
+            'orders': _sample_ids(db, Order),
+        }
+        dataset = {name: db.session.query(model).count() for name, model in
+                   (('clients', Client), ('products', Product), ('orders', Order))}
+    # En la clase Engine: las rutas de solo lectura consultan los engines de replica.py
+    counter = QueryCounter()
+    event.listen(Engine, 'before_cursor_execute', counter)
+
+    rng = random.Random(args.seed)
+    scenarios = build_scenarios(ids, rng)
+    if args.routes:
+        scenarios = [s for s in scenarios if s[0] in args.routes]
+    if args.url:
+        scenarios = [s for s in scenarios if s[1] != 'JOB']
+
+    results = {}
+    for name, method, make_request in scenarios:
+        # Las peticiones se arman antes de medir (el generador aleatorio no es seguro entre hilos)
+        requests = [make_request() for _ in range(args.requests)]
+        latencies, queries, errors = [], [], []
+        lock = threading.Lock()
+        pending = iter(requests)
+
+        def worker():
+            client = app.test_client() if not args.url else None
+            while True:
+                with lock:
+                    request = next(pending, None)
+                if request is None:
+                    return
+                path, body = request
+                counter.reset()
+                started = time.perf_counter()
+                try:
+                    if method == 'JOB':
+                        status = _run_job(app, path, body)
+                    else:
+                        status = _send(client, args.url, method, path, body)
+                except Exception as e:
+                    status = repr(e)
+                elapsed = time.perf_counter() - started
+                with lock:
+                    latencies.append(elapsed)
+                    queries.append(counter.count)
+                    if status not in (200, 302, 304):
+                        errors.append(status)
+
+        threads = [threading.Thread(target=worker) for _ in range(args.concurrency)]
+        wall = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        wall = time.perf_counter() - wall
+
+        results[name] = {
+            'requests': len(latencies),
+            'errors': len(errors),
+            'rps': round(len(latencies) / wall, 1) if wall else None,
+            'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+            'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+            'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+            'queries_avg': None if args.url else round(sum(queries) / len(queries), 2),
+            'queries_max': None if args.url else max(queries),
+        }
+        if errors:
+            results[name]['error_sample'] = str(errors[0])
+        print(_format_row(name, results[name]))
+
+    report = {
+        'timestamp': datetime.utcnow().isoformat(),
+        'db': os.path.abspath(args.db),
+        'target': args.url or 'in-process',
+        'dataset': dataset,
+        'concurrency': args.concurrency,
+        'requests_per_route': args.requests,
+        'seed': args.seed,
+        'routes': results,
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"Results saved to {args.output}")
+    if args.compare:
+        return compare(args.compare, report)
+    return 0
+
+
+def _send(client, base_url, method, path, body):
+    body = body or {}
+    if client is not None:
+        response = client.open(path, method=method, **body)
+        response.close()
+        return response.status_code
+
+    data, headers = None, {}
+    if 'json' in body:
+        data, headers = json.dumps(body['json']).encode(), {'Content-Type': 'application/json'}
+    elif 'data' in body:
+        from urllib.parse import urlencode
+        data, headers = urlencode(body['data']).encode(), {'Content-Type': 'application/x-www-form-urlencoded'}
+    request = urllib.request.Request(base_url.rstrip('/') + path, data=data, headers=headers, method=method)
+    with urllib.request.urlopen(request) as response:
+        response.read()
+        return response.status
+
+
+def _run_job(app, kind, params):
+    """Ejecuta el cuerpo de un trabajo de jobs.py sin encolarlo ni crear su fila."""
+    import uuid
+    import jobs
+    from models import db
+    with app.app_context():
+        job_id = f"bench-{uuid.uuid4().hex}"
+        ctx = jobs.JobContext(job_id, os.path.join(jobs.results_dir(), job_id))
+        try:
+            jobs.JOB_TYPES[kind][0](params, ctx)
+        finally:
+            if os.path.exists(ctx.result_path):
+                os.remove(ctx.result_path)
+            db.session.remove()
+    return 200
+
+
+def _format_row(name, r):
+    queries = f"{r['queries_avg']:>7}" if r['queries_avg'] is not None else '      -'
+    return (f"{name:<18} n={r['requests']:<5} err={r['errors']:<3} rps={r['rps']:<8} "
+            f"p50={r['p50_ms']:>8}ms p95={r['p95_ms']:>8}ms p99={r['p99_ms']:>8}ms queries={queries}")
+
+
+def compare(baseline_path, report):
+    """Compara p95 y consultas contra una corrida anterior; regresa 1 si alguna ruta empeoró."""
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = json.load(f)
+    regressions = 0
+    print(f"\nComparison with {baseline_path} ({baseline.get('timestamp')}):")
+    for name, current in report['routes'].items():
+        before = baseline.get('routes', {}).get(name)
+        if not before:
+            continue
+        ratio = current['p95_ms'] / before['p95_ms'] if before['p95_ms'] else 1.0
+        more_queries = (current['queries_avg'] or 0) > (before.get('queries_avg') or 0)
+        flag = ''
+        if ratio > 1 + REGRESSION_THRESHOLD or more_queries:
+            flag = '  REGRESSION'
+            regressions += 1
+        print(f"{name:<18} p95 {before['p95_ms']:>8} -> {current['p95_ms']:>8}ms ({ratio:5.2f}x) "
+              f"queries {before.get('queries_avg')} -> {current['queries_avg']}{flag}")
+    return 1 if regressions else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    gen = commands.add_parser('generate', help='Crea una base sintética reproducible.')
+    gen.add_argument('--db', default='bench.db')
+    gen.add_argument('--clients', type=int, default=10000)
+    gen.add_argument('--products', type=int, default=5000)
+    gen.add_argument('--orders', type=int, default=1000000)
+    gen.add_argument('--max-items', type=int, default=4, help='Ítems máximos por pedido.')
+    gen.add_argument('--days', type=int, default=365, help='Rango de fechas de los pedidos.')
+    gen.add_argument('--stock', type=int, default=1000000)
+    gen.add_argument('--seed', type=int, default=42)
+
+    bench = commands.add_parser('run', help='Mide las rutas con clientes concurrentes.')
+    bench.add_argument('--db', default='bench.db')
+    bench.add_argument('--url', help='Servidor en ejecución (p. ej. http://127.0.0.1:5000); sin él, en proceso.')
+    bench.add_argument('--concurrency', type=int, default=8)
+    bench.add_argument('--requests', type=int, default=200, help='Peticiones por ruta.')
+    bench.add_argument('--routes', nargs='*', help='Solo estas rutas (por nombre).')
+    bench.add_argument('--seed', type=int, default=42)
+    bench.add_argument('--output', help='Guardar los resultados en JSON.')
+    bench.add_argument('--compare', help='JSON de una corrida anterior para detectar regresiones.')
+
+    args = parser.parse_args(argv)
+    if args.command == 'generate':
+        generate(args)
+        return 0
+    return run(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
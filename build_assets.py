@@ -0,0 +1,204 @@
+"""
+Compila los archivos estáticos a static/dist (se ejecuta al cambiar plantillas o estilos).
+
+    pip install tailwindcss-bin fonttools brotli     # solo para compilar
+    python build_assets.py
+
+  - assets/app.css -> una hoja minificada con Tailwind (las clases usadas en templates/ y
+    script.js), static/style.css y Font Awesome. assets/note.css -> la de las notas impresas.
+  - Font Awesome (assets/fontawesome, 6.4.0 sólido) se recorta a los íconos fa-* que
+    aparecen en las plantillas; con fontTools también la fuente queda solo con esos glifos.
+  - Cada archivo lleva el hash de su contenido en el nombre (app.3f2a9c1b.css) y
+    static/dist/manifest.json traduce el nombre lógico al nombre con hash (asset_url en
+    las plantillas). Como el nombre cambia con el contenido, assets.py los sirve con caché
+    inmutable de un año.
+  - CSS y JS se guardan además comprimidos (.gz y, con brotli instalado, .br): el
+    servidor los envía así sin comprimir nada en cada petición.
+
+Sin internet en la tienda: nada se pide a un CDN. La fuente Inter no se incluye; si no está
+instalada en el equipo se usa la fuente del sistema (ver --font-main en style.css).
+"""
+import argparse
+import glob
+import gzip
+import hashlib
+import io
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+ASSETS = os.path.join(ROOT, 'assets')
+FONTAWESOME = os.path.join(ASSETS, 'fontawesome')
+BUILD = os.path.join(ASSETS, 'build')
+STATIC = os.path.join(ROOT, 'static')
+DIST = os.path.join(STATIC, 'dist')
+
+# Archivos donde se buscan clases de Tailwind e íconos (igual que los @source de app.css)
+SOURCES = [os.path.join(ROOT, 'templates', '*.html'), os.path.join(STATIC, 'script.js')]
+# Hojas compiladas con Tailwind (assets/<nombre>)
+STYLESHEETS = ['app.css', 'note.css']
+# Copiados tal cual (solo con hash en el nombre)
+COPIED = ['script.js', 'logo.jpg']
+COMPRESSED_EXTENSIONS = ('.css', '.js', '.svg', '.json')
+
+ICON_RULE = re.compile(r'\.fa-([a-z0-9-]+)::before \{\s*content: "\\([0-9a-f]+)"; \}\n*')
+ICON_CLASS = re.compile(r'\bfa-([a-z0-9-]+)')
+FONT = 'fa-solid-900.woff2'
+
+
+def fingerprint(name, data):
+    """app.css -> app.<hash>.css"""
+    base, ext = os.path.splitext(name)
+    return f'{base}.{hashlib.sha256(data).hexdigest()[:10]}{ext}'
+
+
+def write_asset(manifest, name, data):
+    hashed = fingerprint(name, data)
+    with open(os.path.join(DIST, hashed), 'wb') as f:
+        f.write(data)
+    manifest[name] = hashed
+    return hashed
+
+
+def used_icons():
+    names = set()
+    for pattern in SOURCES:
+        for path in glob.glob(pattern):
+            with open(path, encoding='utf-8') as f:
+                names.update(ICON_CLASS.findall(f.read()))
+    return names
+
+
+def subset_font(data, codepoints):
+    """La fuente solo con los glifos usados; sin fontTools regresa la fuente completa."""
+    try:
+        from fontTools import subset
+        from fontTools.ttLib import TTFont
+    except ImportError:
+        print('fontTools no está instalado: se copia la fuente de íconos completa')
+        return data
+    # Sin actualizar la fecha de la fuente: el mismo subconjunto da el mismo hash
+    font = TTFont(io.BytesIO(data), recalcTimestamp=False)
+    options = subset.Options()
+    options.flavor = 'woff2'
+    options.layout_features = ['*']
+    subsetter = subset.Subsetter(options)
+    subsetter.populate(unicodes=codepoints)
+    subsetter.subset(font)
+    out = io.BytesIO()
+    font.flavor = 'woff2'
+    font.save(out)
+    return out.getvalue()
+
+
+def build_icons(manifest):
+    """Escribe assets/build/icons.css (solo los íconos usados) y la fuente recortada a dist."""
+    with open(os.path.join(FONTAWESOME, 'fontawesome.css'), encoding='utf-8') as f:
+        base_css = f.read()
+    with open(os.path.join(FONTAWESOME, 'solid.css'), encoding='utf-8') as f:
+        solid_css = f.read()
+    with open(os.path.join(FONTAWESOME, 'webfonts', FONT), 'rb') as f:
+        font = f.read()
+
+    names = used_icons()
+    codepoints = set()
+
+    def keep(match):
+        if match.group(1) not in names:
+            return ''
+        codepoints.add(int(match.group(2), 16))
+        return match.group(0)
+
+    icons_css = ICON_RULE.sub(keep, base_css)
+    font_name = write_asset(manifest, FONT, subset_font(font, codepoints))
+    # Solo woff2 (todos los navegadores actuales); la ruta es relativa a la hoja en dist/
+    solid_css = re.sub(r'src: url\([^;]*;', f'src: url("{font_name}") format("woff2");', solid_css)
+
+    os.makedirs(BUILD, exist_ok=True)
+    with open(os.path.join(BUILD, 'icons.css'), 'w', encoding='utf-8') as f:
+        f.write(icons_css + '\n' + solid_css)
+    return len(codepoints)
+
+
+def tailwind_command():
+    """El ejecutable tailwindcss del PATH o el del paquete tailwindcss-bin."""
+    executable = shutil.which('tailwindcss')
+    if executable:
+        return [executable]
+    try:
+        from tailwindcss_bin import find_tailwindcss_bin
+    except ImportError:
+        sys.exit('No se encontró Tailwind: pip install tailwindcss-bin')
+    return [find_tailwindcss_bin()]
+
+
+def build_css(manifest, name):
+    with tempfile.TemporaryDirectory() as directory:
+        output = os.path.join(directory, name)
+        subprocess.run(tailwind_command() + ['--input', os.path.join(ASSETS, name),
+                                             '--output', output, '--minify'],
+                       cwd=ROOT, check=True)
+        with open(output, 'rb') as f:
+            css = f.read()
+    # Tailwind deja el url() de la fuente de íconos tal cual: relativo a la hoja en dist/
+    write_asset(manifest, name, css)
+
+
+def compress_all():
+    """Versiones .gz y .br de los archivos de texto (los navegadores eligen con Accept-Encoding)."""
+    try:
+        import brotli
+    except ImportError:
+        brotli = None
+        print('brotli no está instalado: solo se generan versiones .gz')
+    for name in os.listdir(DIST):
+        if not name.endswith(COMPRESSED_EXTENSIONS) or name == 'manifest.json':
+            continue
+        path = os.path.join(DIST, name)
+        with open(path, 'rb') as f:
+            data = f.read()
+        # mtime=0: el mismo contenido produce siempre el mismo .gz
+        with open(path + '.gz', 'wb') as f:
+            f.write(gzip.compress(data, compresslevel=9, mtime=0))
+        if brotli is not None:
+            with open(path + '.br', 'wb') as f:
+                f.write(brotli.compress(data, quality=11))
+
+
+def build():
+    if os.path.isdir(DIST):
+        shutil.rmtree(DIST)
+    os.makedirs(DIST)
+    manifest = {}
+
+    icon_count = build_icons(manifest)
+    for name in STYLESHEETS:
+        build_css(manifest, name)
+    for name in COPIED:
+        with open(os.path.join(STATIC, name), 'rb') as f:
+            write_asset(manifest, name, f.read())
+    compress_all()
+
+    with open(os.path.join(DIST, 'manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest, icon_count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.parse_args()
+
+    manifest, icon_count = build()
+    for name, hashed in sorted(manifest.items()):
+        size = os.path.getsize(os.path.join(DIST, hashed))
+        print(f'{name:<20} -> dist/{hashed} ({size / 1024:.1f} KB)')
+    print(f'{icon_count} íconos de Font Awesome')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+"""
+Construye el ejecutable con PyInstaller y mide su tiempo de arranque.
+
+    python build_exe.py                      # variante onedir (arranque rápido)
+    python build_exe.py --variant onefile
+    python build_exe.py --variant both --runs 7
+
+Después de cada build el ejecutable se lanza varias veces con una base temporal (sin abrir
+el navegador) y se mide el tiempo hasta que / responde: el primer arranque (crea la base y
+la caché de plantillas) y la mediana de los siguientes. El resultado se imprime y se guarda
+en dist/startup_<variante>.json para comparar entre builds.
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+SPEC = 'TermomazPlatform.spec'
+NAME = 'TermomazPlatform'
+READY_TIMEOUT = 60
+
+
+def build(variant):
+    command = [sys.executable, '-m', 'PyInstaller', '--noconfirm', SPEC]
+    if variant == 'onedir':
+        command += ['--', '--onedir']
+    started = time.perf_counter()
+    subprocess.run(command, check=True)
+    return time.perf_counter() - started
+
+
+def executable_path(variant):
+    suffix = '.exe' if os.name == 'nt' else ''
+    if variant == 'onedir':
+        return os.path.join('dist', NAME, NAME + suffix)
+    return os.path.join('dist', NAME + suffix)
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def measure_start(executable, db_path):
+    """Segundos desde que se lanza el proceso hasta que / responde 200."""
+    port = _free_port()
+    env = dict(os.environ, TERMOMAZ_DB_PATH=db_path, TERMOMAZ_PORT=str(port), TERMOMAZ_NO_BROWSER='1')
+    started = time.perf_counter()
+    process = subprocess.Popen([executable], env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - started < READY_TIMEOUT:
+            if process.poll() is not None:
+                raise RuntimeError(f'{executable} exited with code {process.returncode}')
+            try:
+                with urllib.request.urlopen(f'http://127.0.0.1:{port}/', timeout=2) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - started
+            except (urllib.error.URLError, ConnectionError, socket.timeout):
+                time.sleep(0.01)
+        raise RuntimeError(f'{executable} not ready after {READY_TIMEOUT}s')
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def measure(variant, runs):
+    executable = executable_path(variant)
+    with tempfile.TemporaryDirectory() as directory:
+        db_path = os.path.join(directory, 'termomaz.db')
+        first = measure_start(executable, db_path)
+        warm = [measure_start(executable, db_path) for _ in range(runs)]
+    return {
+        'variant': variant,
+        'first_start_s': round(first, 3),
+        'warm_start_median_s': round(statistics.median(warm), 3),
+        'warm_start_min_s': round(min(warm), 3),
+        'warm_start_max_s': round(max(warm), 3),
+        'runs': runs,
+        'size_mb': round(_size(variant) / 1e6, 1),
+    }
+
+
+def _size(variant):
+    if variant == 'onefile':
+        return os.path.getsize(executable_path(variant))
+    total = 0
+    for root, _, files in os.walk(os.path.join('dist', NAME)):
+        total += sum(os.path.getsize(os.path.join(root, f)) for f in files)
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--variant', choices=['onedir', 'onefile', 'both'], default='onedir')
+    parser.add_argument('--runs', type=int, default=5, help='Arranques medidos después del primero.')
+    parser.add_argument('--skip-build', action='store_true', help='Solo medir el ejecutable existente.')
+    args = parser.parse_args()
+
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    variants = ['onefile', 'onedir'] if args.variant == 'both' else [args.variant]
+    for variant in variants:
+        build_time = None if args.skip_build else build(variant)
+        result = measure(variant, max(1, args.runs))
+        if build_time is not None:
+            result['build_s'] = round(build_time, 1)
+        with open(os.path.join('dist', f'startup_{variant}.json'), 'w') as f:
+            json.dump(result, f, indent=2)
+        print(f"{variant}: first start {result['first_start_s']:.2f}s, "
+              f"warm start {result['warm_start_median_s']:.2f}s median "
+              f"({result['warm_start_min_s']:.2f}-{result['warm_start_max_s']:.2f}s, {result['runs']} runs), "
+              f"{result['size_mb']} MB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""
+Feeds JSON del catálogo de productos y de los clientes para el POS.
+El POS los descarga una vez y luego pide solo los cambios con ?updated_since=<server_time>
+(registros modificados y los IDs borrados desde entonces, con FEED_OVERLAP de margen).
+"""
+from datetime import datetime, timedelta
+from sqlalchemy import func
+from models import db, Client, Product, DeletedRecord
+
+# Orden de las columnas en cada fila del feed (filas como listas para un JSON compacto)
+PRODUCT_FIELDS = ['id', 'name', 'category', 'price', 'stock', 'description']
+CLIENT_FIELDS = ['id', 'name', 'phone', 'email']
+# updated_at y deleted_at se fijan al escribir, antes del commit: un cambio confirmado
+# después de server_time puede tener una fecha anterior (un lote de importación, una venta
+# entre el descuento de stock y el commit). Los cambios se piden desde since - FEED_OVERLAP,
+# más que cualquier transacción de escritura; el POS recibe unas filas repetidas y las
+# vuelve a guardar igual.
+FEED_OVERLAP = timedelta(minutes=5)
+
+
+def parse_timestamp(value):
+    """ISO 8601 -> datetime; None si falta o no es válido."""
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _feed_etag(model, entity, since):
+    """
+    ETag barato del feed: cambia con cualquier alta, edición, movimiento de stock o borrado.
+    Se calcula con dos agregados sobre índices, sin leer las filas.
+    """
+    count, last_update = db.session.query(func.count(model.id), func.max(model.updated_at)).one()
+    last_delete = db.session.query(func.max(DeletedRecord.deleted_at)).filter(
+        DeletedRecord.entity == entity
+    ).scalar()
+    if since is None:
+        return f"{count}-{last_update}-{last_delete}-all"
+    # Fechas de las filas del margen: cambia también si se confirma tarde un cambio con
+    # fecha anterior a last_update (en el índice de updated_at, sin leer las filas)
+    recent = db.session.query(func.count(model.id), func.total(func.julianday(model.updated_at))).filter(
+        model.updated_at >= since - FEED_OVERLAP
+    ).one()
+    return f"{count}-{last_update}-{last_delete}-{recent[0]}-{recent[1]!r}-{since.isoformat()}"
+
+
+def _feed(model, entity, fields, key, since):
+    """
+    {'fields': [...], key: [[...], ...], 'deleted': [ids], 'server_time': iso}
+    Sin `since` regresa todos los registros; con `since`, solo lo cambiado desde entonces.
+    """
+    # Se toma antes de consultar para no perder cambios que ocurran durante la respuesta
+    server_time = datetime.utcnow()
+
+    query = db.session.query(*[getattr(model, f) for f in fields])
+    deleted = []
+    if since:
+        since = since - FEED_OVERLAP
+        query = query.filter(model.updated_at >= since)
+        deleted = [row[0] for row in db.session.query(DeletedRecord.record_id).filter(
+            DeletedRecord.entity == entity,
+            DeletedRecord.deleted_at >= since,
+        )]
+
+    return {
+        'fields': fields,
+        key: [list(row) for row in query.order_by(model.id)],
+        'deleted': deleted,
+        'server_time': server_time.isoformat(),
+    }
+
+
+def catalog_etag(since=None):
+    return _feed_etag(Product, 'product', since)
+
+
+def product_feed(since=None):
+    return _feed(Product, 'product', PRODUCT_FIELDS, 'products', since)
+
+
+def clients_etag(since=None):
+    return _feed_etag(Client, 'client', since)
+
+
+def client_feed(since=None):
+    return _feed(Client, 'client', CLIENT_FIELDS, 'clients', since)
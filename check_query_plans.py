@@ -0,0 +1,98 @@
+import re
+import sys
+from sqlalchemy import event, text
+from sqlalchemy.engine import Engine
+from app import app, db, init_db
+from models import Order
+import jobs
+
+# Rutas frecuentes y las tablas que recorren completas a propósito
+# (p. ej. la rotación de inventario lista todos los productos).
+HOT_ROUTES = [
+    ('/', {'client', 'product'}),  # COUNT(*) de clientes y productos
+    ('/orders', set()),
+    ('/orders?status=Pending', set()),
+    ('/orders?payment_status=Paid', set()),
+    ('/orders?client_id={client_id}', set()),
+    ('/orders?start_date=2024-01-01&end_date=2024-12-31', set()),
+    ('/orders/{order_id}', set()),  # el producto a agregar se busca con /api/products/search
+    ('/orders/{order_id}/note', set()),
+    ('/reports', {'product'}),
+    ('/api/clients/search?q=jua', set()),
+    ('/api/products/search?q=term&in_stock=1', set()),
+    ('/inventory', {'product'}),  # facetas y conteo sobre el catálogo filtrado
+]
+
+SCAN_RE = re.compile(r'^SCAN (\S+)')
+
+
+def capture_queries(client, url):
+    # En la clase Engine: también las lecturas que van a los engines de solo lectura (replica.py)
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT'):
+            statements.append((statement, parameters))
+
+    event.listen(Engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        response = client.get(url)
+        # /reports calcula en segundo plano: también se revisan las consultas del trabajo
+        jobs.wait_all(timeout=30)
+    finally:
+        event.remove(Engine, 'before_cursor_execute', before_cursor_execute)
+    return response.status_code, statements
+
+
+def full_scans(conn, statement, parameters, tables):
+    plan = conn.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters).fetchall()
+    scans = []
+    for row in plan:
+        match = SCAN_RE.match(row[3])
+        # "SCAN t USING INDEX ..." recorre un índice en orden, no la tabla;
+        # "SCAN t VIRTUAL TABLE INDEX ..." es una búsqueda FTS5
+        detail = row[3]
+        if (match and 'USING' not in detail and 'VIRTUAL TABLE' not in detail
+                and match.group(1).strip('"') in tables):
+            scans.append(match.group(1).strip('"'))
+    return scans
+
+
+def check():
+    failures = []
+    with app.app_context():
+        init_db()
+        engine = db.engine
+        first_order = Order.query.first()
+        ids = {
+            'order_id': first_order.id if first_order else 1,
+            'client_id': first_order.client_id if first_order else 1,
+        }
+
+    # Las peticiones van fuera del app_context para que cada una use su propia sesión
+    client = app.test_client()
+    with engine.connect() as conn:
+        tables = {row[0] for row in conn.execute(text("SELECT name FROM sqlite_master WHERE type = 'table'"))}
+
+        for route, allowed in HOT_ROUTES:
+            url = route.format(**ids)
+            status, statements = capture_queries(client, url)
+            if status >= 500:
+                failures.append(f"{url}: HTTP {status}")
+                continue
+            for statement, parameters in statements:
+                for table in full_scans(conn, statement, parameters, tables):
+                    if table not in allowed:
+                        failures.append(f"{url}: full scan of '{table}' in: {' '.join(statement.split())}")
+            print(f"{url}: {len(statements)} queries checked")
+
+    for failure in failures:
+        print(f"FULL TABLE SCAN -> {failure}")
+    return not failures
+
+
+if __name__ == '__main__':
+    if check():
+        print("Query plans OK")
+    else:
+        sys.exit(1)
@@ -0,0 +1,101 @@
+"""
+Revisa la replicación entre tiendas (replication.py) con dos bases temporales: la tienda
+(esta aplicación) y la central (otra base en disco, como `flask sync central.db`).
+
+    python check_replication.py
+
+Casos de regresión: un pedido o un producto sincronizado se borra en la tienda y el
+siguiente que se crea no debe tomar su ID (su gid quedó como borrado en la central y la
+fila nueva se perdería).
+"""
+import os
+import shutil
+import sys
+import tempfile
+
+DIRECTORY = tempfile.mkdtemp(prefix='termomaz-sync-')
+os.environ['TERMOMAZ_DB_PATH'] = os.path.join(DIRECTORY, 'store.db')
+
+from app import app, db, init_db, open_peer_app
+from models import Client, Product, Order
+from stock import set_stock
+import replication
+
+
+def check():
+    failures = []
+    with app.app_context():
+        init_db()
+        client = Client(name='Cliente de prueba', email='prueba@example.com')
+        product = Product(name='Termo de prueba', price=10.0, stock=0)
+        db.session.add_all([client, product])
+        db.session.flush()
+        set_stock({product.id: 100}, 'initial')
+        db.session.commit()
+        client_id, product_id = client.id, product.id
+
+    central = open_peer_app(os.path.join(DIRECTORY, 'central.db'))
+    peer = replication.LocalPeer(central)
+    # Las peticiones van fuera del app_context para que cada una use su propia sesión
+    web = app.test_client()
+
+    def sale(quantity):
+        response = web.post('/pos/create_order', json={
+            'client_id': client_id, 'items': [{'id': product_id, 'quantity': quantity}], 'payment_type': 'full',
+        })
+        return response.get_json()['order_id']
+
+    def new_product(name):
+        response = web.post('/api/products', json={'name': name, 'price': 5.0, 'stock': 3})
+        return response.get_json()['product']['id']
+
+    def sync():
+        with app.app_context():
+            result = replication.sync(peer)
+        for conflict in result['conflicts']:
+            failures.append(f"conflict: {conflict}")
+
+    def state(application):
+        with application.app_context():
+            totals = sorted(order.total for order in Order.query)
+            products = sorted((product.name, product.stock) for product in Product.query)
+            return totals, products
+
+    deleted = sale(2)
+    sync()
+    web.get(f'/orders/delete/{deleted}')
+    sync()
+    created = sale(1)
+    sync()
+
+    if created == deleted:
+        failures.append(f"order id {deleted} was reused after delete")
+
+    deleted = new_product('Caja vieja')
+    sync()
+    web.get(f'/inventory/delete/{deleted}')
+    sync()
+    created = new_product('Caja nueva')
+    sync()
+    if created == deleted:
+        failures.append(f"product id {deleted} was reused after delete")
+    store, central_state = state(app), state(central)
+    print(f"store: orders {store[0]}, products {store[1]}")
+    print(f"central: orders {central_state[0]}, products {central_state[1]}")
+    if store != central_state:
+        failures.append('central does not match the store')
+
+    for failure in failures:
+        print(f"SYNC -> {failure}")
+    return not failures
+
+
+if __name__ == '__main__':
+    try:
+        ok = check()
+    finally:
+        shutil.rmtree(DIRECTORY, ignore_errors=True)
+    if ok:
+        print("Replication OK")
+    else:
+        sys.exit(1)
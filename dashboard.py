@@ -0,0 +1,117 @@
+"""
+Estadísticas del dashboard con caché invalidada por escritura.
+Cada tabla tiene un contador de versión en memoria que se incrementa cuando se confirma
+(commit) una transacción que la modificó, ya sea por el ORM (flush) o por sentencias
+INSERT/UPDATE/DELETE ejecutadas con session.execute (stock en lote, importación, rollup).
+Las estadísticas guardan las versiones con que se calcularon y solo se recalculan
+cuando alguna cambió, así recargar el dashboard no consulta la base.
+Las escrituras de otros procesos (p. ej. `flask import-csv`) no pasan por estos eventos;
+para ellas la caché expira después de STATS_MAX_AGE segundos.
+"""
+import threading
+import time
+from sqlalchemy import event
+from models import db, Client, Product, Order
+from reporting import get_completed_sales_since
+
+STATS_MAX_AGE = 60
+RECENT_ORDERS = 5
+
+# Tablas de las que dependen las estadísticas (daily_sales alimenta las ventas del mes)
+DASHBOARD_TABLES = ('client', 'product', 'order', 'order_item', 'daily_sales')
+
+_versions = {}
+_lock = threading.Lock()
+_cache = {}
+
+_PENDING_KEY = 'dashboard_written_tables'
+
+
+def table_version(*tables):
+    with _lock:
+        return tuple(_versions.get(t, 0) for t in tables)
+
+
+def bump(*tables):
+    with _lock:
+        for table in tables:
+            _versions[table] = _versions.get(table, 0) + 1
+
+
+# --- Eventos de sesión ---
+
+def _written(session):
+    return session.info.setdefault(_PENDING_KEY, set())
+
+
+def _before_flush(session, flush_context, instances):
+    written = _written(session)
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        table = getattr(obj, '__tablename__', None)
+        if table:
+            written.add(table)
+
+
+def _do_orm_execute(state):
+    # INSERT/UPDATE/DELETE de Core u ORM ejecutados con session.execute (no pasan por el flush)
+    if state.is_insert or state.is_update or state.is_delete:
+        table = getattr(state.statement, 'table', None)
+        if table is not None:
+            _written(state.session).add(table.name)
+
+
+def _after_commit(session):
+    written = session.info.pop(_PENDING_KEY, None)
+    if written:
+        bump(*written)
+
+
+def _after_rollback(session):
+    session.info.pop(_PENDING_KEY, None)
+
+
+def track_writes(session_class):
+    """Registra los eventos que incrementan las versiones (se llama una vez al iniciar)."""
+    event.listen(session_class, 'before_flush', _before_flush)
+    event.listen(session_class, 'do_orm_execute', _do_orm_execute)
+    event.listen(session_class, 'after_commit', _after_commit)
+    event.listen(session_class, 'after_soft_rollback', lambda session, previous: _after_rollback(session))
+
+
+# --- Estadísticas ---
+
+def _compute_stats(start_of_month):
+    recent = db.session.query(
+        Order.id, Order.date, Order.status, Order.total, Client.name
+    ).join(Client, Client.id == Order.client_id).order_by(Order.date.desc()).limit(RECENT_ORDERS).all()
+
+    return {
+        'total_clients': db.session.query(Client.id).count(),
+        'total_products': db.session.query(Product.id).count(),
+        'pending_orders': db.session.query(Order.id).filter(Order.status == 'Pending').count(),
+        'monthly_sales': get_completed_sales_since(start_of_month),
+        # Diccionarios (no objetos de la sesión) para poder reutilizarlos entre peticiones
+        'recent_orders': [
+            {'id': r.id, 'date': r.date, 'status': r.status, 'total': r.total, 'client_name': r.name}
+            for r in recent
+        ],
+    }
+
+
+def get_dashboard_stats(start_of_month):
+    """
+    {'total_clients', 'total_products', 'pending_orders', 'monthly_sales', 'recent_orders'}
+    desde la caché si ninguna de DASHBOARD_TABLES cambió desde que se calcularon.
+    """
+    # Las versiones se leen antes de consultar: si otra petición escribe mientras tanto,
+    # el resultado queda guardado con la versión vieja y se recalcula en la siguiente carga
+    versions = table_version(*DASHBOARD_TABLES)
+    key = start_of_month
+    cached = _cache.get(key)
+    if cached and cached['versions'] == versions and time.monotonic() - cached['at'] < STATS_MAX_AGE:
+        return cached['stats']
+
+    stats = _compute_stats(start_of_month)
+    _cache.clear()
+    _cache[key] = {'versions': versions, 'at': time.monotonic(), 'stats': stats}
+    return stats
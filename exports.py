@@ -0,0 +1,141 @@
+"""
+Exportación de pedidos, líneas de pedido y rotación de inventario a CSV o XLSX.
+Las filas se leen con yield_per (cursor del lado del servidor, por bloques) y el CSV se
+envía mientras se lee, así la memoria no crece con el tamaño del rango y el primer byte
+sale de inmediato. El XLSX se arma en modo constant_memory en un archivo temporal
+(el formato zip no se puede enviar antes de terminar) y después se envía por bloques.
+Si el rango llega a fechas archivadas, los pedidos e ítems se leen también del archivo
+(archive.order_sources).
+"""
+import csv
+import io
+import os
+import tempfile
+from models import db, Client, Product
+from archive import order_sources
+from reporting import rotation_query
+from stock import stock_as_of_subquery
+
+EXPORT_BATCH_SIZE = 2000
+EXPORT_FORMATS = ('csv', 'xlsx')
+
+
+def _orders_query(start_date, end_date):
+    order, _ = order_sources(start_date, end_date)
+    return db.session.query(
+        order.id, order.date, Client.name, order.status, order.total,
+        order.paid_amount, order.payment_status, order.shipping_address,
+    ).join(Client, Client.id == order.client_id).filter(
+        order.date >= start_date, order.date <= end_date
+    ).order_by(order.date, order.id)
+
+
+def _order_items_query(start_date, end_date):
+    order, order_item = order_sources(start_date, end_date)
+    return db.session.query(
+        order.id, order.date, Client.name, order.status, order_item.product_id, Product.name,
+        order_item.quantity, order_item.price_at_time, order_item.quantity * order_item.price_at_time,
+    ).join(order_item, order_item.order_id == order.id).join(
+        Client, Client.id == order.client_id
+    ).outerjoin(Product, Product.id == order_item.product_id).filter(
+        order.date >= start_date, order.date <= end_date
+    ).order_by(order.date, order.id, order_item.id)
+
+
+def _rotation_query(start_date, end_date):
+    closing = stock_as_of_subquery(end_date)
+    return rotation_query(
+        start_date, end_date, Product.id, Product.name, Product.category, closing.c.stock, Product.stock
+    ).outerjoin(closing, closing.c.product_id == Product.id)
+
+
+EXPORTS = {
+    # tipo: (encabezados, consulta(start_date, end_date))
+    'orders': (
+        ['Pedido', 'Fecha', 'Cliente', 'Estado', 'Total', 'Pagado', 'Estado de pago', 'Dirección de envío'],
+        _orders_query,
+    ),
+    'order_items': (
+        ['Pedido', 'Fecha', 'Cliente', 'Estado', 'ID producto', 'Producto', 'Cantidad', 'Precio', 'Subtotal'],
+        _order_items_query,
+    ),
+    'rotation': (
+        ['ID producto', 'Producto', 'Categoría', 'Stock al cierre', 'Stock actual', 'Vendidos', 'Ingresos'],
+        _rotation_query,
+    ),
+}
+
+
+def export_filename(kind, start_date_str, end_date_str, fmt):
+    return f"{kind}_{start_date_str}_{end_date_str}.{fmt}"
+
+
+def count_rows(kind, start_date, end_date):
+    """Número de filas del export (para el progreso de los trabajos en segundo plano)."""
+    return EXPORTS[kind][1](start_date, end_date).order_by(None).count()
+
+
+def _rows(kind, start_date, end_date):
+    query = EXPORTS[kind][1](start_date, end_date)
+    # Tuplas de columnas (no entidades): el identity map de la sesión no crece con el export
+    return query.execution_options(yield_per=EXPORT_BATCH_SIZE)
+
+
+def stream_csv(kind, start_date, end_date, on_progress=None):
+    """
+    Generador de bloques de texto CSV (con BOM para que Excel respete los acentos).
+    `on_progress(filas)` se llama cada EXPORT_BATCH_SIZE filas.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write('\ufeff')
+    writer.writerow(EXPORTS[kind][0])
+
+    def take():
+        chunk = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return chunk
+
+    # El encabezado sale antes de la primera consulta
+    yield take()
+    for count, row in enumerate(_rows(kind, start_date, end_date), start=1):
+        writer.writerow(row)
+        if count % EXPORT_BATCH_SIZE == 0:
+            if on_progress:
+                on_progress(count)
+            yield take()
+    if buffer.tell():
+        yield take()
+
+
+def stream_xlsx(kind, start_date, end_date, chunk_size=64 * 1024, on_progress=None):
+    """
+    Generador de bloques binarios XLSX. Requiere XlsxWriter (dependencia opcional);
+    lanza ImportError antes de consultar si no está instalado.
+    """
+    import xlsxwriter
+
+    def generate():
+        fd, path = tempfile.mkstemp(suffix='.xlsx')
+        os.close(fd)
+        try:
+            workbook = xlsxwriter.Workbook(path, {'constant_memory': True, 'default_date_format': 'yyyy-mm-dd hh:mm'})
+            sheet = workbook.add_worksheet(kind)
+            sheet.write_row(0, 0, EXPORTS[kind][0], workbook.add_format({'bold': True}))
+            for index, row in enumerate(_rows(kind, start_date, end_date), start=1):
+                sheet.write_row(index, 0, row)
+                if on_progress and index % EXPORT_BATCH_SIZE == 0:
+                    on_progress(index)
+            workbook.close()
+
+            with open(path, 'rb') as f:
+                while True:
+                    chunk = f.read(chunk_size)
+                    if not chunk:
+                        break
+                    yield chunk
+        finally:
+            os.remove(path)
+
+    return generate()
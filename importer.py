@@ -0,0 +1,202 @@
+"""
+Importación masiva de productos y clientes desde CSV.
+El archivo se lee fila por fila (csv sobre el stream, nunca completo en memoria) y se
+escribe por lotes: por cada lote se buscan los registros existentes con una consulta IN
+y se aplican los UPDATE e INSERT con executemany en una sola transacción.
+Los cambios de stock de los productos quedan en el libro de movimientos (stock.py).
+"""
+import csv
+import io
+from datetime import datetime
+from sqlalchemy import update, insert, bindparam, or_, func
+from models import db, Product, Client
+from stock import record_movements, record_stock_set
+
+DEFAULT_BATCH_SIZE = 1000
+
+product_table = Product.__table__
+client_table = Client.__table__
+
+
+# --- Validación de filas ---
+
+def _clean(value):
+    value = (value or '').strip()
+    return value or None
+
+
+def _product_row(row, columns):
+    name = _clean(row.get('name'))
+    if not name:
+        raise ValueError('name es requerido')
+    values = {'name': name}
+    for column in columns:
+        raw = _clean(row.get(column))
+        if column == 'price':
+            if raw is None:
+                raise ValueError('price es requerido')
+            try:
+                values['price'] = float(raw)
+            except ValueError:
+                raise ValueError(f'price inválido: {raw}')
+            if values['price'] < 0:
+                raise ValueError('price no puede ser negativo')
+        elif column == 'stock':
+            # Celda vacía como columna ausente: no cambia el stock (0 en un producto nuevo)
+            try:
+                values['stock'] = int(raw) if raw is not None else None
+            except ValueError:
+                raise ValueError(f'stock inválido: {raw}')
+        elif column != 'name':
+            values[column] = raw
+    return values
+
+
+def _client_row(row, columns):
+    name = _clean(row.get('name'))
+    if not name:
+        raise ValueError('name es requerido')
+    values = {'name': name}
+    for column in columns:
+        if column != 'name':
+            values[column] = _clean(row.get(column))
+    return values
+
+
+# --- Escritura por lotes ---
+
+def _write_products(batch, columns):
+    """
+    batch: [(número de fila, valores)]. Coincide por sku y, si no hay sku, por nombre.
+    Regresa (actualizados, insertados).
+    """
+    skus = {values['sku'] for _, values in batch if values.get('sku')}
+    names = {values['name'] for _, values in batch}
+    existing = db.session.query(Product.id, Product.sku, Product.name).filter(
+        or_(Product.sku.in_(skus), Product.name.in_(names))
+    ).all()
+    by_sku = {row.sku: row.id for row in existing if row.sku}
+    by_name = {row.name: row.id for row in existing}
+
+    now = datetime.utcnow()
+    updates, inserts = {}, {}
+    for line, values in batch:
+        product_id = by_sku.get(values.get('sku')) or by_name.get(values['name'])
+        if product_id:
+            updates[product_id] = dict(values, b_id=product_id, updated_at=now)
+        else:
+            # Filas repetidas dentro del mismo lote: gana la última
+            key = values.get('sku') or values['name']
+            inserts[key] = dict(values, created_at=now, updated_at=now)
+
+    if updates:
+        set_columns = columns + ['updated_at']
+        set_values = {c: bindparam(c) for c in set_columns}
+        if 'sku' in set_values:
+            # Una fila sin sku (encontrada por nombre) no borra el sku existente
+            set_values['sku'] = func.coalesce(bindparam('sku'), product_table.c.sku)
+        if 'stock' in set_values:
+            set_values['stock'] = func.coalesce(bindparam('stock'), product_table.c.stock)
+            record_stock_set({product_id: row['stock'] for product_id, row in updates.items()
+                              if row['stock'] is not None}, 'import')
+        stmt = update(product_table).where(product_table.c.id == bindparam('b_id')).values(set_values)
+        db.session.execute(stmt, [{k: row.get(k) for k in set_columns + ['b_id']} for row in updates.values()])
+    if inserts:
+        insert_columns = columns + ['created_at', 'updated_at']
+        defaults = {'stock': 0}
+        created = db.session.execute(insert(product_table).returning(product_table.c.id, product_table.c.stock), [
+            {k: row[k] if row.get(k) is not None else defaults.get(k) for k in insert_columns}
+            for row in inserts.values()
+        ])
+        record_movements(dict(created.all()), 'import')
+    return len(updates), len(inserts)
+
+
+def _write_clients(batch, columns):
+    """Coincide por email y, si la fila no trae email, por nombre. Regresa (actualizados, insertados)."""
+    emails = {values['email'] for _, values in batch if values.get('email')}
+    names = {values['name'] for _, values in batch}
+    existing = db.session.query(Client.id, Client.email, Client.name).filter(
+        or_(Client.email.in_(emails), Client.name.in_(names))
+    ).all()
+    by_email = {row.email: row.id for row in existing if row.email}
+    by_name = {row.name: row.id for row in existing}
+
+    updates, inserts = {}, {}
+    for line, values in batch:
+        email = values.get('email')
+        client_id = by_email.get(email) if email else by_name.get(values['name'])
+        if client_id:
+            updates[client_id] = dict(values, b_id=client_id)
+        else:
+            inserts[email or values['name']] = dict(values, created_at=datetime.utcnow())
+
+    if updates:
+        stmt = update(client_table).where(client_table.c.id == bindparam('b_id')).values(
+            {c: bindparam(c) for c in columns}
+        )
+        db.session.execute(stmt, [{k: row.get(k) for k in columns + ['b_id']} for row in updates.values()])
+    if inserts:
+        insert_columns = columns + ['created_at']
+        db.session.execute(insert(client_table), [
+            {k: row.get(k) for k in insert_columns} for row in inserts.values()
+        ])
+    return len(updates), len(inserts)
+
+
+IMPORTERS = {
+    # tipo: (columnas aceptadas, validación, escritura)
+    'products': (['name', 'sku', 'category', 'price', 'stock', 'description'], _product_row, _write_products),
+    'clients': (['name', 'phone', 'email', 'address'], _client_row, _write_clients),
+}
+
+
+def import_csv(kind, stream, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Importa un CSV (stream binario o de texto) con encabezados. Regresa el reporte:
+    {'processed', 'inserted', 'updated', 'errors': [{'row': n, 'message': ...}]}
+    Cada lote se confirma por separado; un error de base de datos descarta solo su lote.
+    """
+    if kind not in IMPORTERS:
+        raise ValueError(f'Tipo de importación desconocido: {kind}')
+    allowed, parse_row, write_batch = IMPORTERS[kind]
+    batch_size = max(1, batch_size or DEFAULT_BATCH_SIZE)
+
+    if not isinstance(stream, io.TextIOBase):
+        stream = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    reader = csv.DictReader(stream)
+    header = [h.strip().lower() for h in (reader.fieldnames or [])]
+    reader.fieldnames = header
+
+    report = {'processed': 0, 'inserted': 0, 'updated': 0, 'errors': []}
+    missing = [c for c in ('name', 'price') if c in allowed and c not in header]
+    if missing:
+        report['errors'].append({'row': 1, 'message': f"Faltan columnas: {', '.join(missing)}"})
+        return report
+    columns = [c for c in allowed if c in header]
+
+    def flush(batch):
+        try:
+            updated, inserted = write_batch(batch, columns)
+            db.session.commit()
+            report['updated'] += updated
+            report['inserted'] += inserted
+        except Exception as e:
+            db.session.rollback()
+            report['errors'].extend({'row': line, 'message': f'Error de base de datos: {e}'} for line, _ in batch)
+
+    batch = []
+    # La fila 1 es el encabezado
+    for line, row in enumerate(reader, start=2):
+        report['processed'] += 1
+        try:
+            batch.append((line, parse_row(row, columns)))
+        except ValueError as e:
+            report['errors'].append({'row': line, 'message': str(e)})
+            continue
+        if len(batch) >= batch_size:
+            flush(batch)
+            batch = []
+    if batch:
+        flush(batch)
+    return report
@@ -0,0 +1,280 @@
+"""
+Trabajos en segundo plano para reportes y exportaciones largas.
+Cada trabajo es una fila de la tabla job (persiste entre reinicios) y se ejecuta en un
+pool de hilos del mismo proceso, con su propio app_context y sesión. El resultado se
+escribe en un archivo junto a la base de datos (carpeta job_results).
+  - submit() reutiliza un trabajo con los mismos parámetros si está en curso o si ya
+    terminó y no ha habido escrituras en las tablas de ventas desde entonces (versiones
+    de dashboard.py), con un máximo de JOB_CACHE_SECONDS por escrituras de otros procesos.
+  - El trabajo informa su progreso con JobContext.progress(), que también es el punto
+    donde se detecta la cancelación (cooperativa).
+  - Los reportes y exportaciones leen con replica.reading() (engine de solo lectura o la
+    copia de reportes), no con las conexiones de la aplicación.
+  - Al iniciar la aplicación, recover_jobs() marca como fallidos los trabajos que
+    quedaron a medias y borra los resultados viejos.
+El pool de hilos y el módulo de exportación se cargan con el primer trabajo que los usa
+(no en el arranque de la aplicación).
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from flask import current_app
+from models import db, Job, Product
+from reporting import parse_report_range, get_sales_summary, rotation_query
+from dashboard import table_version
+from stock import maybe_snapshot, stock_as_of_subquery
+import replica
+
+JOB_WORKERS = int(os.environ.get('TERMOMAZ_JOB_WORKERS', 2))
+JOB_CACHE_SECONDS = int(os.environ.get('TERMOMAZ_JOB_CACHE_SECONDS', 300))
+JOB_RETENTION = timedelta(days=1)
+PROGRESS_INTERVAL = 0.5  # Segundos mínimos entre escrituras de progreso
+
+ACTIVE_STATUSES = ('queued', 'running')
+# Tablas que leen los reportes y exportaciones: un cambio en ellas invalida los resultados
+DATA_TABLES = ('client', 'product', 'order', 'order_item', 'daily_sales', 'stock_movement')
+
+JOB_TYPES = {}  # kind -> (función(params, JobContext), validación(params) o None)
+
+_executor = None
+_executor_lock = threading.Lock()
+_cancelled = set()
+_pending = set()  # Futures de los trabajos encolados en este proceso
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def job_type(kind, validate=None):
+    """
+    Registra la función que ejecuta los trabajos de un tipo. `validate(params)` se llama
+    al encolar y lanza ValueError para rechazar la petición antes de crear el trabajo.
+    """
+    def register(fn):
+        JOB_TYPES[kind] = (fn, validate)
+        return fn
+    return register
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            from concurrent.futures import ThreadPoolExecutor
+            _executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix='job')
+        return _executor
+
+
+def results_dir():
+    path = os.path.join(os.path.dirname(db.engine.url.database or current_app.instance_path), 'job_results')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def params_key(kind, params):
+    raw = json.dumps([kind, params, table_version(*DATA_TABLES)], sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def job_to_dict(job):
+    return {
+        'id': job.id,
+        'kind': job.kind,
+        'params': json.loads(job.params),
+        'status': job.status,
+        'progress': round(job.progress or 0.0, 3),
+        'message': job.message,
+        'created_at': job.created_at.isoformat() if job.created_at else None,
+        'started_at': job.started_at.isoformat() if job.started_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+
+# --- Envío, cancelación y limpieza ---
+
+def submit(kind, params):
+    """Encola un trabajo (o reutiliza uno equivalente). Regresa el Job."""
+    if kind not in JOB_TYPES:
+        raise ValueError(f'Tipo de trabajo desconocido: {kind}')
+    validate = JOB_TYPES[kind][1]
+    if validate:
+        validate(params)
+    key = params_key(kind, params)
+
+    fresh_since = datetime.utcnow() - timedelta(seconds=JOB_CACHE_SECONDS)
+    existing = Job.query.filter(Job.params_key == key).filter(
+        Job.status.in_(ACTIVE_STATUSES) | ((Job.status == 'done') & (Job.finished_at >= fresh_since))
+    ).order_by(Job.created_at.desc()).first()
+    if existing and (existing.status != 'done' or (existing.result_path and os.path.exists(existing.result_path))):
+        return existing
+
+    job = Job(id=uuid.uuid4().hex, kind=kind, params=json.dumps(params, sort_keys=True),
+              params_key=key, status='queued', message='En cola')
+    db.session.add(job)
+    db.session.commit()
+
+    app = current_app._get_current_object()
+    future = _get_executor().submit(_run, app, job.id)
+    _pending.add(future)
+    future.add_done_callback(_pending.discard)
+    return job
+
+
+def wait_all(timeout=None):
+    """Espera a que terminen los trabajos encolados en este proceso (CLI y verificaciones)."""
+    from concurrent.futures import wait
+    wait(list(_pending), timeout=timeout)
+
+
+def cancel(job):
+    """Pide la cancelación: un trabajo en cola no llega a correr; uno en curso se detiene en su siguiente progreso."""
+    if job.status not in ACTIVE_STATUSES:
+        return False
+    _cancelled.add(job.id)
+    if job.status == 'queued':
+        job.status = 'cancelled'
+        job.message = 'Cancelado'
+        job.finished_at = datetime.utcnow()
+    else:
+        job.message = 'Cancelando...'
+    db.session.commit()
+    return True
+
+
+def recover_jobs():
+    """Al arrancar: los trabajos que quedaron en curso ya no tienen hilo; se borran los resultados viejos."""
+    Job.query.filter(Job.status.in_(ACTIVE_STATUSES)).update(
+        {'status': 'failed', 'message': 'Interrumpido por reinicio de la aplicación', 'finished_at': datetime.utcnow()},
+        synchronize_session=False,
+    )
+    old = Job.query.filter(Job.created_at < datetime.utcnow() - JOB_RETENTION).all()
+    for job in old:
+        if job.result_path and os.path.exists(job.result_path):
+            os.remove(job.result_path)
+        db.session.delete(job)
+    db.session.commit()
+
+
+# --- Ejecución ---
+
+class JobContext:
+    """Lo que recibe la función del trabajo: progreso, cancelación y archivo de resultado."""
+
+    def __init__(self, job_id, result_path):
+        self.job_id = job_id
+        self.result_path = result_path
+        self.result_name = None
+        self.result_mimetype = 'application/octet-stream'
+        self._last_write = 0.0
+
+    def progress(self, fraction, message=None, force=False):
+        if self.job_id in _cancelled:
+            raise JobCancelled()
+        now = time.monotonic()
+        if not force and now - self._last_write < PROGRESS_INTERVAL:
+            return
+        self._last_write = now
+        values = {'progress': max(0.0, min(1.0, fraction))}
+        if message:
+            values['message'] = message
+        Job.query.filter_by(id=self.job_id).update(values, synchronize_session=False)
+        db.session.commit()
+
+
+def _finish(job_id, **values):
+    values.setdefault('finished_at', datetime.utcnow())
+    db.session.rollback()
+    Job.query.filter_by(id=job_id).update(values, synchronize_session=False)
+    db.session.commit()
+
+
+def _run(app, job_id):
+    with app.app_context():
+        job = db.session.get(Job, job_id)
+        if job is None or job.status != 'queued' or job_id in _cancelled:
+            _cancelled.discard(job_id)
+            return
+        job.status = 'running'
+        job.started_at = datetime.utcnow()
+        job.message = 'En proceso'
+        db.session.commit()
+
+        ctx = JobContext(job_id, os.path.join(results_dir(), job_id))
+        try:
+            JOB_TYPES[job.kind][0](json.loads(job.params), ctx)
+            _finish(job_id, status='done', progress=1.0, message='Listo', result_path=ctx.result_path,
+                    result_name=ctx.result_name, result_mimetype=ctx.result_mimetype)
+        except JobCancelled:
+            _finish(job_id, status='cancelled', message='Cancelado')
+        except Exception as e:
+            current_app.logger.exception('Job %s (%s) failed', job_id, job.kind)
+            _finish(job_id, status='failed', message=f'Error: {e}'[:200])
+        finally:
+            _cancelled.discard(job_id)
+            job = db.session.get(Job, job_id)
+            if job is not None and job.status != 'done' and os.path.exists(ctx.result_path):
+                os.remove(ctx.result_path)
+            db.session.remove()
+
+
+# --- Tipos de trabajo ---
+
+@job_type('report')
+def report_job(params, ctx):
+    """Resumen y rotación de inventario de /reports como JSON."""
+    start_date, end_date, start_date_str, end_date_str = parse_report_range(params)
+    # De paso se toma la foto periódica de stock si corresponde (el trabajo ya corre aparte);
+    # se escribe en la base principal, antes de pasar las lecturas a la de reportes
+    maybe_snapshot()
+    with replica.reading():
+        ctx.progress(0.1, 'Calculando resumen', force=True)
+        summary = get_sales_summary(start_date, end_date)
+        ctx.progress(0.4, 'Calculando rotación de inventario', force=True)
+        closing = stock_as_of_subquery(end_date)
+        rows = rotation_query(
+            start_date, end_date, Product.id, Product.name, Product.category, Product.stock, closing.c.stock
+        ).outerjoin(closing, closing.c.product_id == Product.id)
+        rotation = [
+            {'id': r[0], 'name': r[1], 'category': r[2], 'stock': r[3], 'stock_end': r[4], 'sold': r[5], 'revenue': r[6]}
+            for r in rows
+        ]
+    ctx.progress(0.9, 'Guardando resultado', force=True)
+    with open(ctx.result_path, 'w', encoding='utf-8') as f:
+        json.dump({'start_date': start_date_str, 'end_date': end_date_str,
+                   'summary': summary, 'rotation': rotation}, f)
+    ctx.result_name = f"reporte_{start_date_str}_{end_date_str}.json"
+    ctx.result_mimetype = 'application/json'
+
+
+def validate_export(params):
+    from exports import EXPORTS, EXPORT_FORMATS
+    if params.get('kind') not in EXPORTS or params.get('format', 'csv') not in EXPORT_FORMATS:
+        raise ValueError('Exportación no válida')
+
+
+@job_type('export', validate=validate_export)
+def export_job(params, ctx):
+    """Exportación CSV/XLSX de exports.py escrita a archivo, con progreso por filas."""
+    from exports import export_filename, count_rows, stream_csv, stream_xlsx
+    kind, fmt = params['kind'], params.get('format', 'csv')
+    start_date, end_date, start_date_str, end_date_str = parse_report_range(params)
+
+    with replica.reading():
+        total = max(1, count_rows(kind, start_date, end_date))
+        ctx.progress(0.0, f'{total} filas por exportar', force=True)
+        on_progress = lambda rows: ctx.progress(0.95 * rows / total, f'{rows} de {total} filas')
+        if fmt == 'xlsx':
+            chunks = stream_xlsx(kind, start_date, end_date, on_progress=on_progress)
+            ctx.result_mimetype = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        else:
+            chunks = (chunk.encode('utf-8') for chunk in stream_csv(kind, start_date, end_date, on_progress=on_progress))
+            ctx.result_mimetype = 'text/csv; charset=utf-8'
+        with open(ctx.result_path, 'wb') as f:
+            for chunk in chunks:
+                f.write(chunk)
+    ctx.result_name = export_filename(kind, start_date_str, end_date_str, fmt)
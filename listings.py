@@ -0,0 +1,78 @@
+"""
+Consultas de listados paginados.
+Se usa paginación por cursor (keyset) sobre (date, id) en lugar de OFFSET: cada página
+cuesta lo mismo sin importar qué tan atrás esté en el historial.
+"""
+from datetime import datetime
+from sqlalchemy import or_, and_
+from sqlalchemy.orm import joinedload
+from models import Order
+
+ORDERS_PER_PAGE = 50
+MAX_PER_PAGE = 200
+
+
+def _parse_day(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d')
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_order_filters(args):
+    """Filtros del listado de pedidos desde la query string (valores vacíos se ignoran)."""
+    client_id = args.get('client_id', type=int)
+    return {
+        'status': args.get('status') or None,
+        'payment_status': args.get('payment_status') or None,
+        'client_id': client_id,
+        'start_date': args.get('start_date') if _parse_day(args.get('start_date')) else None,
+        'end_date': args.get('end_date') if _parse_day(args.get('end_date')) else None,
+    }
+
+
+def encode_cursor(order):
+    return f"{order.date.isoformat()}_{order.id}"
+
+
+def decode_cursor(cursor):
+    """'2024-05-01T10:00:00_123' -> (datetime, 123); None si el cursor no es válido."""
+    try:
+        date_str, id_str = cursor.rsplit('_', 1)
+        return datetime.fromisoformat(date_str), int(id_str)
+    except (AttributeError, ValueError):
+        return None
+
+
+def get_orders_page(filters, cursor=None, per_page=ORDERS_PER_PAGE):
+    """
+    Una página de pedidos (más recientes primero) con el cliente cargado en la misma consulta.
+    Regresa (orders, next_cursor); next_cursor es None en la última página.
+    """
+    per_page = max(1, min(per_page or ORDERS_PER_PAGE, MAX_PER_PAGE))
+    query = Order.query.options(joinedload(Order.client))
+
+    if filters.get('status'):
+        query = query.filter(Order.status == filters['status'])
+    if filters.get('payment_status'):
+        query = query.filter(Order.payment_status == filters['payment_status'])
+    if filters.get('client_id'):
+        query = query.filter(Order.client_id == filters['client_id'])
+    if filters.get('start_date'):
+        query = query.filter(Order.date >= _parse_day(filters['start_date']))
+    if filters.get('end_date'):
+        end = datetime.combine(_parse_day(filters['end_date']).date(), datetime.max.time())
+        query = query.filter(Order.date <= end)
+
+    position = decode_cursor(cursor) if cursor else None
+    if position:
+        last_date, last_id = position
+        query = query.filter(or_(
+            Order.date < last_date,
+            and_(Order.date == last_date, Order.id < last_id),
+        ))
+
+    # Pedimos una fila extra para saber si hay página siguiente
+    rows = query.order_by(Order.date.desc(), Order.id.desc()).limit(per_page + 1).all()
+    next_cursor = encode_cursor(rows[per_page - 1]) if len(rows) > per_page else None
+    return rows[:per_page], next_cursor
@@ -0,0 +1,200 @@
+"""
+Instrumentación por petición: consultas SQL, latencia y endpoint /metrics (formato Prometheus).
+Los eventos before/after_cursor_execute del engine cuentan y miden cada sentencia de la
+petición en curso; al terminar la petición se alimentan los histogramas por ruta.
+Además:
+  - log de consultas lentas (más de TERMOMAZ_SLOW_QUERY_MS, con los parámetros),
+  - aviso de N+1 cuando la misma sentencia se repite más de TERMOMAZ_N_PLUS_ONE veces
+    en una petición (p. ej. order.client cargado en un ciclo de la plantilla),
+  - cabeceras X-Query-Count y Server-Timing en cada respuesta.
+El costo por consulta es un perf_counter y un par de sumas en un objeto del hilo actual,
+así que puede quedar activo en producción.
+"""
+import logging
+import os
+import threading
+import time
+from flask import request
+from sqlalchemy import event
+
+SLOW_QUERY_MS = float(os.environ.get('TERMOMAZ_SLOW_QUERY_MS', 100))
+N_PLUS_ONE_THRESHOLD = int(os.environ.get('TERMOMAZ_N_PLUS_ONE', 10))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 250)
+
+logger = logging.getLogger('termomaz.metrics')
+
+
+class Histogram:
+    """Histograma acumulativo por etiquetas, como los de Prometheus."""
+
+    def __init__(self, name, help_text, buckets, label_names):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self.label_names = label_names
+        self.series = {}  # etiquetas -> [conteos por bucket..., suma, total]
+
+    def observe(self, labels, value):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [0] * (len(self.buckets) + 2)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[i] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for labels, series in sorted(self.series.items()):
+            base = _labels(self.label_names, labels)
+            for bound, count in zip(self.buckets, series):
+                lines.append(f'{self.name}_bucket{{{base}{"," if base else ""}le="{bound}"}} {count}')
+            lines.append(f'{self.name}_bucket{{{base}{"," if base else ""}le="+Inf"}} {series[-1]}')
+            lines.append(f"{self.name}_sum{{{base}}} {series[-2]:.6f}")
+            lines.append(f"{self.name}_count{{{base}}} {series[-1]}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help_text, label_names):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.values = {}
+
+    def inc(self, labels, amount=1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        for labels, value in sorted(self.values.items()):
+            lines.append(f"{self.name}{{{_labels(self.label_names, labels)}}} {value}")
+        return lines
+
+
+def _labels(names, values):
+    return ','.join(f'{n}="{str(v)}"' for n, v in zip(names, values))
+
+
+_lock = threading.Lock()
+request_latency = Histogram('termomaz_request_duration_seconds', 'Latencia de las peticiones por ruta.',
+                            LATENCY_BUCKETS, ('endpoint', 'method'))
+request_queries = Histogram('termomaz_request_queries', 'Consultas SQL por petición.',
+                            QUERY_COUNT_BUCKETS, ('endpoint', 'method'))
+requests_total = Counter('termomaz_requests_total', 'Peticiones atendidas.', ('endpoint', 'method', 'status'))
+query_seconds_total = Counter('termomaz_db_query_seconds_total', 'Tiempo total en consultas SQL por ruta.',
+                              ('endpoint',))
+slow_queries_total = Counter('termomaz_db_slow_queries_total', 'Consultas más lentas que el umbral.', ('endpoint',))
+n_plus_one_total = Counter('termomaz_n_plus_one_total', 'Peticiones con sentencias repetidas (N+1).', ('endpoint',))
+METRICS = (request_latency, request_queries, requests_total, query_seconds_total, slow_queries_total, n_plus_one_total)
+
+# Estado de la petición en curso (una por hilo del servidor)
+_current = threading.local()
+
+
+class RequestStats:
+    __slots__ = ('started', 'queries', 'query_time', 'statements', 'slow', 'status')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.query_time = 0.0
+        self.statements = {}
+        self.slow = 0
+        self.status = 200
+
+
+# --- Eventos del engine ---
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._query_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - context._query_start
+    stats = getattr(_current, 'stats', None)
+    if stats is not None:
+        stats.queries += 1
+        stats.query_time += elapsed
+        stats.statements[statement] = stats.statements.get(statement, 0) + 1
+    if elapsed * 1000 >= SLOW_QUERY_MS:
+        if stats is not None:
+            stats.slow += 1
+        params = repr(parameters)
+        if len(params) > 500:
+            params = params[:500] + '...'
+        logger.warning("Slow query (%.1f ms)%s: %s | params=%s", elapsed * 1000,
+                       f" in {request.method} {request.path}" if stats is not None else '',
+                       ' '.join(statement.split()), params)
+
+
+# --- Eventos de Flask ---
+
+def _before_request():
+    _current.stats = RequestStats()
+
+
+def _after_request(response):
+    stats = getattr(_current, 'stats', None)
+    if stats is not None:
+        response.headers['X-Query-Count'] = str(stats.queries)
+        response.headers['Server-Timing'] = (
+            f'db;dur={stats.query_time * 1000:.1f};desc="{stats.queries} queries", '
+            f'app;dur={(time.perf_counter() - stats.started) * 1000:.1f}'
+        )
+        stats.status = response.status_code
+    return response
+
+
+def _teardown_request(exc):
+    stats = getattr(_current, 'stats', None)
+    _current.stats = None
+    if stats is None:
+        return
+    elapsed = time.perf_counter() - stats.started
+    endpoint = request.endpoint or 'unknown'
+    method = request.method
+    status = 500 if exc is not None else stats.status
+
+    repeated = [(count, statement) for statement, count in stats.statements.items()
+                if count > N_PLUS_ONE_THRESHOLD]
+    for count, statement in repeated:
+        logger.warning("Possible N+1 in %s %s: statement ran %d times: %s",
+                       method, request.path, count, ' '.join(statement.split())[:300])
+
+    with _lock:
+        labels = (endpoint, method)
+        request_latency.observe(labels, elapsed)
+        request_queries.observe(labels, stats.queries)
+        requests_total.inc((endpoint, method, status))
+        query_seconds_total.inc((endpoint,), stats.query_time)
+        if stats.slow:
+            slow_queries_total.inc((endpoint,), stats.slow)
+        if repeated:
+            n_plus_one_total.inc((endpoint,))
+
+
+def instrument(engine):
+    """Cuenta y mide las consultas de un engine (también los de solo lectura de replica.py)."""
+    event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+
+
+def init_app(app, engine):
+    """Registra los eventos del engine y de Flask."""
+    instrument(engine)
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+
+
+def render_metrics():
+    """Todas las métricas en el formato de texto de Prometheus."""
+    with _lock:
+        lines = []
+        for metric in METRICS:
+            lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
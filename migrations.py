@@ -0,0 +1,289 @@
+"""
+Migraciones de esquema versionadas.
+Cada migración es (versión, nombre, función(conn)) y se aplica una sola vez, en orden;
+las versiones aplicadas se guardan en la tabla schema_migrations de la misma base.
+Se ejecutan al iniciar la aplicación (también desde el ejecutable de PyInstaller),
+después de db.create_all(), por lo que cada migración debe ser idempotente:
+en una base nueva las tablas ya se crean con el esquema actual de models.py.
+"""
+from datetime import datetime
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+
+def _column_exists(conn, table, column):
+    rows = conn.execute(text(f'PRAGMA table_info("{table}")')).fetchall()
+    return any(row[1] == column for row in rows)
+
+
+def _create_indexes(conn, statements):
+    for statement in statements:
+        conn.execute(text(statement))
+
+
+def _has_autoincrement(conn, table):
+    sql = conn.execute(text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :t"), {'t': table}).scalar()
+    return sql is not None and 'AUTOINCREMENT' in sql.upper()
+
+
+def _rebuild_with_autoincrement(conn, model):
+    """
+    Reconstruye la tabla con INTEGER PRIMARY KEY AUTOINCREMENT (ALTER TABLE no puede
+    agregarlo): tabla nueva con el esquema de models.py, copia de las filas con sus IDs y
+    los mismos índices y triggers. Sin AUTOINCREMENT SQLite vuelve a dar el ID más alto
+    si esa fila se borró; con él un ID no se reutiliza nunca (sqlite_sequence).
+    """
+    from sqlalchemy.schema import CreateTable
+    table = model.__table__
+    if _has_autoincrement(conn, table.name):
+        return
+    saved = conn.execute(text(
+        "SELECT sql FROM sqlite_master WHERE tbl_name = :t AND type IN ('index', 'trigger') AND sql IS NOT NULL"
+    ), {'t': table.name}).scalars().all()
+    existing = {row[1] for row in conn.execute(text(f'PRAGMA table_info("{table.name}")'))}
+    columns = ', '.join(f'"{c.name}"' for c in table.columns if c.name in existing)
+    quoted = conn.dialect.identifier_preparer.format_table(table)
+    new_name = f'_{table.name}_rebuild'
+    ddl = str(CreateTable(table).compile(dialect=conn.dialect))
+    conn.execute(text(ddl.replace(f'CREATE TABLE {quoted} ', f'CREATE TABLE "{new_name}" ', 1)))
+    conn.execute(text(f'INSERT INTO "{new_name}" ({columns}) SELECT {columns} FROM "{table.name}"'))
+    # Los índices y triggers de la tabla se borran con ella y se vuelven a crear iguales
+    conn.execute(text(f'DROP TABLE "{table.name}"'))
+    conn.execute(text(f'ALTER TABLE "{new_name}" RENAME TO "{table.name}"'))
+    for sql in saved:
+        conn.execute(text(sql))
+
+
+# --- Migraciones ---
+
+def m001_order_payment_columns(conn):
+    # Antes se hacía con el script suelto migrate_db.py
+    if not _column_exists(conn, 'order', 'paid_amount'):
+        conn.execute(text('ALTER TABLE "order" ADD COLUMN paid_amount REAL'))
+    if not _column_exists(conn, 'order', 'payment_status'):
+        conn.execute(text("ALTER TABLE \"order\" ADD COLUMN payment_status VARCHAR(20) DEFAULT 'Pending'"))
+
+
+def m002_order_indexes(conn):
+    # Listado de pedidos (ORDER BY date, id), dashboard (status) y filtros por cliente/pago
+    _create_indexes(conn, [
+        'CREATE INDEX IF NOT EXISTS ix_order_date ON "order" (date)',
+        'CREATE INDEX IF NOT EXISTS ix_order_status_date ON "order" (status, date)',
+        'CREATE INDEX IF NOT EXISTS ix_order_payment_status_date ON "order" (payment_status, date)',
+        'CREATE INDEX IF NOT EXISTS ix_order_client_id_date ON "order" (client_id, date)',
+    ])
+
+
+def m003_order_item_indexes(conn):
+    # Ítems de un pedido (detalle, nota, borrado/restauración de stock) y ventas por producto
+    _create_indexes(conn, [
+        'CREATE INDEX IF NOT EXISTS ix_order_item_order_id_product_id ON order_item (order_id, product_id)',
+        'CREATE INDEX IF NOT EXISTS ix_order_item_product_id ON order_item (product_id)',
+    ])
+
+
+def m004_product_updated_at(conn):
+    # Marca de tiempo para el feed /api/products?updated_since=... (deleted_record lo crea create_all)
+    if not _column_exists(conn, 'product', 'updated_at'):
+        conn.execute(text('ALTER TABLE product ADD COLUMN updated_at DATETIME'))
+        conn.execute(text('UPDATE product SET updated_at = COALESCE(created_at, CURRENT_TIMESTAMP)'))
+    _create_indexes(conn, [
+        'CREATE INDEX IF NOT EXISTS ix_product_updated_at ON product (updated_at)',
+    ])
+
+
+def _fts5_available(conn):
+    try:
+        conn.execute(text('CREATE VIRTUAL TABLE temp._fts5_probe USING fts5(x)'))
+        conn.execute(text('DROP TABLE temp._fts5_probe'))
+        return True
+    except OperationalError:
+        return False
+
+
+def m005_client_fts(conn):
+    # Índice de texto completo para /api/clients/search, sincronizado por triggers.
+    # Si el SQLite no trae FTS5, search.py usa LIKE como respaldo.
+    if not _fts5_available(conn):
+        return
+    conn.execute(text(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS client_fts USING fts5("
+        "name, phone, email, content='client', content_rowid='id', "
+        "tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+    ))
+    conn.execute(text(
+        "CREATE TRIGGER IF NOT EXISTS client_fts_ai AFTER INSERT ON client BEGIN "
+        "INSERT INTO client_fts(rowid, name, phone, email) VALUES (new.id, new.name, new.phone, new.email); END"
+    ))
+    conn.execute(text(
+        "CREATE TRIGGER IF NOT EXISTS client_fts_ad AFTER DELETE ON client BEGIN "
+        "INSERT INTO client_fts(client_fts, rowid, name, phone, email) "
+        "VALUES ('delete', old.id, old.name, old.phone, old.email); END"
+    ))
+    conn.execute(text(
+        "CREATE TRIGGER IF NOT EXISTS client_fts_au AFTER UPDATE ON client BEGIN "
+        "INSERT INTO client_fts(client_fts, rowid, name, phone, email) "
+        "VALUES ('delete', old.id, old.name, old.phone, old.email); "
+        "INSERT INTO client_fts(rowid, name, phone, email) VALUES (new.id, new.name, new.phone, new.email); END"
+    ))
+    conn.execute(text("INSERT INTO client_fts(client_fts) VALUES ('rebuild')"))
+
+
+def m006_product_fts(conn):
+    # Búsqueda de productos (/api/products/search, inventario, agregar ítems a un pedido).
+    # El trigger de UPDATE solo se dispara si cambia el texto, no en cada movimiento de stock.
+    _create_indexes(conn, [
+        'CREATE INDEX IF NOT EXISTS ix_product_category ON product (category)',
+    ])
+    if not _fts5_available(conn):
+        return
+    conn.execute(text(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS product_fts USING fts5("
+        "name, description, category, content='product', content_rowid='id', "
+        "tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+    ))
+    conn.execute(text(
+        "CREATE TRIGGER IF NOT EXISTS product_fts_ai AFTER INSERT ON product BEGIN "
+        "INSERT INTO product_fts(rowid, name, description, category) "
+        "VALUES (new.id, new.name, new.description, new.category); END"
+    ))
+    conn.execute(text(
+        "CREATE TRIGGER IF NOT EXISTS product_fts_ad AFTER DELETE ON product BEGIN "
+        "INSERT INTO product_fts(product_fts, rowid, name, description, category) "
+        "VALUES ('delete', old.id, old.name, old.description, old.category); END"
+    ))
+    conn.execute(text(
+        "CREATE TRIGGER IF NOT EXISTS product_fts_au AFTER UPDATE OF name, description, category ON product BEGIN "
+        "INSERT INTO product_fts(product_fts, rowid, name, description, category) "
+        "VALUES ('delete', old.id, old.name, old.description, old.category); "
+        "INSERT INTO product_fts(rowid, name, description, category) "
+        "VALUES (new.id, new.name, new.description, new.category); END"
+    ))
+    conn.execute(text("INSERT INTO product_fts(product_fts) VALUES ('rebuild')"))
+
+
+def m007_product_sku(conn):
+    # Código de producto para la importación CSV (coincidencia por sku o por nombre)
+    if not _column_exists(conn, 'product', 'sku'):
+        conn.execute(text('ALTER TABLE product ADD COLUMN sku VARCHAR(50)'))
+    _create_indexes(conn, [
+        'CREATE UNIQUE INDEX IF NOT EXISTS ix_product_sku ON product (sku)',
+        'CREATE INDEX IF NOT EXISTS ix_product_name ON product (name)',
+        'CREATE INDEX IF NOT EXISTS ix_client_email ON client (email)',
+        'CREATE INDEX IF NOT EXISTS ix_client_name ON client (name)',
+    ])
+
+
+def m008_order_version(conn):
+    # Versión del pedido para la caché de notas impresas (notes.py)
+    if not _column_exists(conn, 'order', 'version'):
+        conn.execute(text('ALTER TABLE "order" ADD COLUMN version INTEGER NOT NULL DEFAULT 1'))
+
+
+def m009_payment_ledger(conn):
+    # Libro de pagos (payment y client_balance los crea create_all): lo ya cobrado en cada
+    # pedido queda como un pago inicial con la fecha del pedido. El saldo por cliente
+    # lo construye rollup.ensure_built() al iniciar.
+    conn.execute(text(
+        'INSERT INTO payment (order_id, client_id, amount, method, created_at) '
+        'SELECT o.id, o.client_id, o.paid_amount, \'other\', COALESCE(o.date, CURRENT_TIMESTAMP) FROM "order" o '
+        'WHERE o.paid_amount > 0 AND NOT EXISTS (SELECT 1 FROM payment p WHERE p.order_id = o.id)'
+    ))
+
+
+
+def m010_stock_ledger(conn):
+    # Libro de movimientos y fotos de stock (las tablas las crea create_all): el stock actual
+    # queda como la foto inicial, base para consultar el stock a una fecha (stock.py)
+    if conn.execute(text('SELECT 1 FROM stock_snapshot LIMIT 1')).first() is None:
+        conn.execute(text(
+            'INSERT INTO stock_snapshot (taken_at, last_movement_id) '
+            'SELECT CURRENT_TIMESTAMP, COALESCE(MAX(id), 0) FROM stock_movement'
+        ))
+        conn.execute(text(
+            'INSERT INTO stock_snapshot_item (snapshot_id, product_id, stock) '
+            'SELECT (SELECT MAX(id) FROM stock_snapshot), id, COALESCE(stock, 0) FROM product'
+        ))
+
+
+def m011_pos_sync(conn):
+    # Clave de idempotencia de las ventas del POS y fecha de cambio de los clientes (copia local)
+    if not _column_exists(conn, 'order', 'client_key'):
+        conn.execute(text('ALTER TABLE "order" ADD COLUMN client_key VARCHAR(64)'))
+    if not _column_exists(conn, 'client', 'updated_at'):
+        conn.execute(text('ALTER TABLE client ADD COLUMN updated_at DATETIME'))
+        conn.execute(text('UPDATE client SET updated_at = COALESCE(created_at, CURRENT_TIMESTAMP)'))
+    _create_indexes(conn, [
+        'CREATE UNIQUE INDEX IF NOT EXISTS ix_order_client_key ON "order" (client_key)',
+        'CREATE INDEX IF NOT EXISTS ix_client_updated_at ON client (updated_at)',
+    ])
+
+
+def m012_change_log(conn):
+    # Replicación entre tiendas (las tablas change_log, sync_key y sync_state las crea
+    # create_all): triggers que registran los cambios y registro inicial de las filas existentes
+    from replication import create_triggers, log_existing_rows
+    create_triggers(conn)
+    log_existing_rows(conn)
+
+
+def m013_order_autoincrement(conn):
+    # IDs de pedido que no se reutilizan: un pedido nuevo no debe tomar el ID de uno
+    # archivado (archive.py) aunque se borre el pedido vivo más reciente
+    from models import Order
+    _rebuild_with_autoincrement(conn, Order)
+
+
+def m014_replicated_autoincrement(conn):
+    # Las filas replicadas se identifican entre bases por "<tienda>:<id>" (replication.py):
+    # un ID borrado que se reutilizara nombraría a una fila nueva con el gid de una borrada
+    from models import Client, Product, OrderItem, StockMovement
+    for model in (Client, Product, OrderItem, StockMovement):
+        _rebuild_with_autoincrement(conn, model)
+
+
+MIGRATIONS = [
+    (1, 'order_payment_columns', m001_order_payment_columns),
+    (2, 'order_indexes', m002_order_indexes),
+    (3, 'order_item_indexes', m003_order_item_indexes),
+    (4, 'product_updated_at', m004_product_updated_at),
+    (5, 'client_fts', m005_client_fts),
+    (6, 'product_fts', m006_product_fts),
+    (7, 'product_sku', m007_product_sku),
+    (8, 'order_version', m008_order_version),
+    (9, 'payment_ledger', m009_payment_ledger),
+    (10, 'stock_ledger', m010_stock_ledger),
+    (11, 'pos_sync', m011_pos_sync),
+    (12, 'change_log', m012_change_log),
+    (13, 'order_autoincrement', m013_order_autoincrement),
+    (14, 'replicated_autoincrement', m014_replicated_autoincrement),
+]
+
+
+# --- Ejecución ---
+
+def get_applied_versions(engine):
+    with engine.begin() as conn:
+        conn.execute(text(
+            'CREATE TABLE IF NOT EXISTS schema_migrations ('
+            'version INTEGER PRIMARY KEY, name VARCHAR(100) NOT NULL, applied_at DATETIME NOT NULL)'
+        ))
+        return {row[0] for row in conn.execute(text('SELECT version FROM schema_migrations'))}
+
+
+def run_migrations(engine):
+    """Aplica en orden las migraciones pendientes. Regresa la lista de (versión, nombre) aplicadas."""
+    applied = get_applied_versions(engine)
+    newly_applied = []
+    for version, name, migrate in sorted(MIGRATIONS, key=lambda m: m[0]):
+        if version in applied:
+            continue
+        # Una transacción por migración: si falla, no se registra y se reintenta en el siguiente arranque
+        with engine.begin() as conn:
+            migrate(conn)
+            conn.execute(
+                text('INSERT INTO schema_migrations (version, name, applied_at) VALUES (:v, :n, :t)'),
+                {'v': version, 'n': name, 't': datetime.utcnow()},
+            )
+        newly_applied.append((version, name))
+    return newly_applied
@@ -1,7 +1,25 @@
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
+from replica import RoutingSession
 
-db = SQLAlchemy()
+# RoutingSession envía las lecturas de listados y reportes al engine de solo lectura (replica.py)
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+# PRAGMAs aplicados a cada conexión SQLite nueva (ver set_sqlite_pragmas)
+SQLITE_PRAGMAS = [
+    'PRAGMA journal_mode=WAL',  # lectores y un escritor en paralelo
+    'PRAGMA busy_timeout=5000',  # esperar el bloqueo en lugar de "database is locked"
+    'PRAGMA synchronous=NORMAL',  # seguro con WAL y mucho más rápido que FULL
+    'PRAGMA cache_size=-32000',  # ~32 MB de caché de páginas por conexión
+    'PRAGMA mmap_size=268435456',  # 256 MB de lectura por mmap
+    'PRAGMA temp_store=MEMORY',
+]
+
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for pragma in SQLITE_PRAGMAS:
+        cursor.execute(pragma)
+    cursor.close()
 
 class Client(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -10,15 +28,35 @@ class Client(db.Model):
     email = db.Column(db.String(100))
     address = db.Column(db.String(200))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Para la copia de clientes del POS (/api/clients?updated_since=...)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # La importación CSV busca por email o por nombre (ver migrations.py, deben llamarse igual)
+    __table_args__ = (
+        db.Index('ix_client_email', 'email'),
+        db.Index('ix_client_name', 'name'),
+        db.Index('ix_client_updated_at', 'updated_at'),
+        {'sqlite_autoincrement': True},  # Un ID borrado no se reutiliza (gid de replication.py)
+    )
 
 class Product(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
+    sku = db.Column(db.String(50)) # Código del proveedor (opcional), usado por la importación CSV
     description = db.Column(db.Text)
     price = db.Column(db.Float, nullable=False)
     stock = db.Column(db.Integer, default=0)
-    category = db.Column(db.String(50)) # 'thermos', 'box', 'other'
+    category = db.Column(db.String(50), index=True) # 'thermos', 'box', 'other'
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Se actualiza en cada UPDATE (también los de stock en lote) para la sincronización del POS
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
+
+    # La importación CSV busca por sku o por nombre (ver migrations.py, deben llamarse igual)
+    __table_args__ = (
+        db.Index('ix_product_sku', 'sku', unique=True),
+        db.Index('ix_product_name', 'name'),
+        {'sqlite_autoincrement': True},
+    )
 
 class Order(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -30,7 +68,24 @@ class Order(db.Model):
     paid_amount = db.Column(db.Float, default=0.0)
     payment_status = db.Column(db.String(20), default='Pending') # Pending, Partial, Paid
     shipping_address = db.Column(db.String(200))
+    # Se incrementa con cada cambio de ítems, pagos, estado o dirección (caché de notas, ver notes.py)
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    # Clave generada por el POS para cada venta: reenviarla no crea otro pedido (ver sales.py)
+    client_key = db.Column(db.String(64))
     items = db.relationship('OrderItem', backref='order', lazy=True, cascade="all, delete-orphan")
+    # Historial de pagos (solo se agregan filas); se conserva aunque se borre el pedido
+    payments = db.relationship('Payment', backref='order', lazy=True, order_by='Payment.id', passive_deletes=True)
+
+    # Índices de las consultas frecuentes (ver migrations.py, deben llamarse igual)
+    __table_args__ = (
+        db.Index('ix_order_date', 'date'),
+        db.Index('ix_order_status_date', 'status', 'date'),
+        db.Index('ix_order_payment_status_date', 'payment_status', 'date'),
+        db.Index('ix_order_client_id_date', 'client_id', 'date'),
+        db.Index('ix_order_client_key', 'client_key', unique=True),
+        # Un ID borrado (o archivado) no se vuelve a asignar
+        {'sqlite_autoincrement': True},
+    )
 
 class OrderItem(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -39,3 +94,145 @@ class OrderItem(db.Model):
     product = db.relationship('Product')
     quantity = db.Column(db.Integer, nullable=False)
     price_at_time = db.Column(db.Float, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_order_item_order_id_product_id', 'order_id', 'product_id'),
+        db.Index('ix_order_item_product_id', 'product_id'),
+        {'sqlite_autoincrement': True},
+    )
+
+class Payment(db.Model):
+    # Libro de pagos: cada pago es una fila nueva, nunca se modifica ni se borra (ver payments.py)
+    id = db.Column(db.Integer, primary_key=True)
+    order_id = db.Column(db.Integer, db.ForeignKey('order.id'), nullable=False)
+    client_id = db.Column(db.Integer, db.ForeignKey('client.id'), nullable=False)
+    amount = db.Column(db.Float, nullable=False)
+    method = db.Column(db.String(20), nullable=False, default='cash') # cash, card, transfer, other
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_payment_order_id', 'order_id'),
+        db.Index('ix_payment_client_id_created_at', 'client_id', 'created_at'),
+    )
+
+class ClientBalance(db.Model):
+    # Saldo por cobrar de cada cliente, mantenido por rollup.py junto con daily_sales:
+    # suma de (total - pagado) de sus pedidos no cancelados con saldo pendiente
+    __tablename__ = 'client_balance'
+    client_id = db.Column(db.Integer, db.ForeignKey('client.id'), primary_key=True)
+    outstanding = db.Column(db.Float, nullable=False, default=0.0)
+    open_orders = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        db.Index('ix_client_balance_outstanding', 'outstanding'),
+    )
+
+class StockMovement(db.Model):
+    # Libro de movimientos de stock (solo inserción), escrito por stock.py en cada cambio
+    __tablename__ = 'stock_movement'
+    id = db.Column(db.Integer, primary_key=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
+    change = db.Column(db.Integer, nullable=False) # Con signo: negativo = salida
+    reason = db.Column(db.String(20), nullable=False) # sale, return, order_deleted, adjustment, initial, import
+    order_id = db.Column(db.Integer) # Pedido que lo originó (sin FK: el pedido puede borrarse)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_stock_movement_product_id_id', 'product_id', 'id'),
+        db.Index('ix_stock_movement_created_at', 'created_at'),
+        {'sqlite_autoincrement': True},
+    )
+
+class StockSnapshot(db.Model):
+    # Foto periódica del stock de todos los productos; last_movement_id es el último
+    # movimiento incluido, así "stock al día X" = foto + movimientos posteriores (stock.py)
+    __tablename__ = 'stock_snapshot'
+    id = db.Column(db.Integer, primary_key=True)
+    taken_at = db.Column(db.DateTime, nullable=False, index=True)
+    last_movement_id = db.Column(db.Integer, nullable=False, default=0)
+
+class StockSnapshotItem(db.Model):
+    __tablename__ = 'stock_snapshot_item'
+    snapshot_id = db.Column(db.Integer, db.ForeignKey('stock_snapshot.id'), primary_key=True)
+    product_id = db.Column(db.Integer, primary_key=True)
+    stock = db.Column(db.Integer, nullable=False, default=0)
+
+class DailySales(db.Model):
+    # Acumulado diario de ventas, mantenido por rollup.py en la misma transacción que cada escritura.
+    # product_id = 0 guarda los totales a nivel pedido (total y monto pagado de la orden).
+    __tablename__ = 'daily_sales'
+    day = db.Column(db.Date, primary_key=True)
+    status = db.Column(db.String(20), primary_key=True)
+    product_id = db.Column(db.Integer, primary_key=True)
+    order_count = db.Column(db.Integer, nullable=False, default=0)
+    units = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0.0)
+    paid_amount = db.Column(db.Float, nullable=False, default=0.0)
+
+class DeletedRecord(db.Model):
+    # Registro de borrados para que los clientes que sincronizan por delta (p. ej. el POS) los detecten
+    __tablename__ = 'deleted_record'
+    id = db.Column(db.Integer, primary_key=True)
+    entity = db.Column(db.String(30), nullable=False) # 'product', ...
+    record_id = db.Column(db.Integer, nullable=False)
+    deleted_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_deleted_record_entity_deleted_at', 'entity', 'deleted_at'),
+    )
+
+class ChangeLog(db.Model):
+    # Registro de cambios para replicar entre tiendas (solo inserción), lo escriben triggers
+    # de SQLite sobre client, product, order, order_item y stock_movement (ver replication.py)
+    __tablename__ = 'change_log'
+    seq = db.Column(db.Integer, primary_key=True) # AUTOINCREMENT: siempre crece, nunca se reutiliza
+    entity = db.Column(db.String(20), nullable=False) # 'client', 'product', 'order', 'order_item', 'stock_movement'
+    row_id = db.Column(db.Integer, nullable=False) # ID local de la fila
+    op = db.Column(db.String(6), nullable=False) # insert, update, delete
+    data = db.Column(db.Text) # JSON de la fila después del cambio (NULL en delete)
+    origin = db.Column(db.String(32)) # Tienda donde se hizo el cambio (NULL: esta base)
+    via = db.Column(db.String(32)) # Base de la que se recibió (NULL: esta base)
+    changed_at = db.Column(db.String(26), nullable=False) # UTC 'YYYY-MM-DD HH:MM:SS.SSS' del origen
+
+    __table_args__ = (
+        db.Index('ix_change_log_entity_row_id_seq', 'entity', 'row_id', 'seq'),
+        {'sqlite_autoincrement': True},
+    )
+
+class SyncKey(db.Model):
+    # Filas recibidas de otra base: gid "<tienda>:<id>" -> ID local (NULL si se borró aquí)
+    __tablename__ = 'sync_key'
+    entity = db.Column(db.String(20), primary_key=True)
+    gid = db.Column(db.String(64), primary_key=True)
+    local_id = db.Column(db.Integer)
+
+    __table_args__ = (
+        db.Index('ix_sync_key_entity_local_id', 'entity', 'local_id'),
+    )
+
+class SyncState(db.Model):
+    # Clave/valor de la replicación: 'store_id' y 'received:<tienda>' (marca de agua por base)
+    __tablename__ = 'sync_state'
+    name = db.Column(db.String(64), primary_key=True)
+    value = db.Column(db.String(64), nullable=False)
+
+class Job(db.Model):
+    # Trabajos en segundo plano (reportes y exportaciones largas), ver jobs.py
+    id = db.Column(db.String(32), primary_key=True)
+    kind = db.Column(db.String(30), nullable=False) # 'report', 'export'
+    params = db.Column(db.Text, nullable=False) # JSON
+    params_key = db.Column(db.String(64), nullable=False) # Hash de kind + params para reutilizar resultados
+    status = db.Column(db.String(20), nullable=False, default='queued') # queued, running, done, failed, cancelled
+    progress = db.Column(db.Float, nullable=False, default=0.0)
+    message = db.Column(db.String(200))
+    result_path = db.Column(db.String(300))
+    result_name = db.Column(db.String(200))
+    result_mimetype = db.Column(db.String(100))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index('ix_job_params_key_status', 'params_key', 'status'),
+        db.Index('ix_job_created_at', 'created_at'),
+    )
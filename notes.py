@@ -0,0 +1,259 @@
+"""
+Notas de pedido impresas (HTML y PDF) con caché en disco.
+La clave de cada nota incluye Order.version, que se incrementa en cualquier cambio de ítems,
+pagos, estado o dirección (evento before_flush registrado con track_order_versions), los
+datos del cliente que aparecen en la nota y una huella de la plantilla. Con la clave
+vigente la nota se lee del disco sin cargar ítems ni productos.
+La impresión en lote prepara las notas en un pool de hilos y regresa un solo documento.
+El generador de PDF (pdf.py) y el pool se cargan con la primera nota que los usa.
+"""
+import hashlib
+import os
+import struct
+import tempfile
+import zlib
+from flask import current_app, render_template
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import joinedload
+from models import db, Order, OrderItem
+
+NOTE_WORKERS = int(os.environ.get('TERMOMAZ_NOTE_WORKERS', 4))
+MAX_BATCH_NOTES = 500
+NOTE_FORMATS = ('html', 'pdf')
+
+# Posiciones verticales del PDF (puntos desde arriba, página carta)
+PAGE_BOTTOM = 700
+PAGE_MIDDLE = 306
+PAGE_FOOTER = 750
+
+_template_hash = None
+
+
+# --- Versión del pedido ---
+
+def touch_order(order):
+    """Incrementa la versión en SQL (seguro con escrituras concurrentes)."""
+    order.version = Order.version + 1
+
+
+def _before_flush(session, flush_context, instances):
+    orders = set()
+    for obj in session.dirty:
+        if isinstance(obj, Order) and session.is_modified(obj, include_collections=False):
+            orders.add(obj)
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, OrderItem):
+            order = obj.order if obj.order is not None else session.get(Order, obj.order_id)
+            if order is not None:
+                orders.add(order)
+    for order in orders:
+        state = inspect(order)
+        if state.pending or state.deleted or order in session.deleted:
+            continue
+        if not state.attrs.version.history.has_changes():
+            touch_order(order)
+
+
+def track_order_versions(session_class):
+    """Registra el evento que versiona los pedidos (se llama una vez al iniciar)."""
+    event.listen(session_class, 'before_flush', _before_flush)
+
+
+# --- Caché en disco ---
+
+def _cache_dir():
+    # Junto a la base de datos (en el ejecutable la carpeta de Flask es temporal);
+    # cada pedido tiene su subcarpeta note_cache/<id>/
+    path = os.path.join(os.path.dirname(db.engine.url.database or current_app.instance_path), 'note_cache')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _template_fingerprint():
+    global _template_hash
+    if _template_hash is None:
+        source = current_app.jinja_env.loader.get_source(current_app.jinja_env, '_order_note_body.html')[0]
+        _template_hash = hashlib.sha1(source.encode('utf-8')).hexdigest()[:8]
+    return _template_hash
+
+
+def note_key(order):
+    client = order.client
+    client_hash = zlib.crc32(f"{client.name}|{client.phone}".encode('utf-8')) if client else 0
+    return f"{order.id}-v{order.version}-{client_hash:08x}-{_template_fingerprint()}"
+
+
+def _read(path):
+    try:
+        with open(path, 'rb') as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def _write(directory, filename, data):
+    # Escritura atómica (un temporal único por escritura: varios hilos pueden escribir la
+    # misma nota) y limpieza de versiones anteriores; el directorio es solo de este pedido
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, os.path.join(directory, filename))
+    except BaseException:
+        os.remove(tmp)
+        raise
+    suffix = os.path.splitext(filename)[1]
+    for name in os.listdir(directory):
+        if name.endswith(suffix) and name != filename:
+            try:
+                os.remove(os.path.join(directory, name))
+            except OSError:
+                pass
+
+
+def _pack(streams):
+    return b''.join(struct.pack('>I', len(s)) + s for s in streams)
+
+
+def _unpack(data):
+    streams, offset = [], 0
+    while offset < len(data):
+        (length,) = struct.unpack_from('>I', data, offset)
+        streams.append(data[offset + 4:offset + 4 + length])
+        offset += 4 + length
+    return streams
+
+
+# --- Render ---
+
+def _load_items(order):
+    return OrderItem.query.options(joinedload(OrderItem.product)).filter_by(
+        order_id=order.id
+    ).order_by(OrderItem.id).all()
+
+
+def _draw_pdf(order, items):
+    """Páginas (content streams comprimidos) de una nota; el diseño sigue a order_note.html."""
+    # pdf.py se carga con la primera nota en PDF (no hace falta al arrancar)
+    from pdf import Page
+    margin, right = 50, 562
+    pages = []
+
+    def new_page(first):
+        page = Page()
+        page.text(margin, 60, 'TERMOMAZ', size=22, bold=True)
+        page.text(margin, 76, 'Nota de Pedido' if first else 'Nota de Pedido (continuación)', size=10, gray=0.45)
+        page.text(right, 58, f"#{order.id}", size=16, bold=True, align='right')
+        page.text(right, 74, order.date.strftime('%d/%m/%Y'), size=10, align='right', gray=0.45)
+        page.line(margin, 92, right, 92)
+        pages.append(page)
+        return page
+
+    page = new_page(True)
+    y = 118
+    page.text(margin, y, 'CLIENTE', size=8, bold=True, gray=0.6)
+    client = order.client
+    page.text(margin, y + 18, client.name if client else '', size=13, bold=True)
+    page.text(margin, y + 34, (client.phone or '') if client else '', size=10)
+    page.text(margin, y + 50, order.shipping_address or 'Sin dirección de envío', size=10, gray=0.4)
+
+    def table_header(page, y):
+        page.text(margin, y, 'PRODUCTO', size=9, bold=True, gray=0.4)
+        page.text(340, y, 'CANT.', size=9, bold=True, gray=0.4, align='center')
+        page.text(460, y, 'PRECIO', size=9, bold=True, gray=0.4, align='right')
+        page.text(right, y, 'TOTAL', size=9, bold=True, gray=0.4, align='right')
+        page.line(margin, y + 6, right, y + 6, width=1)
+        return y + 22
+
+    y = table_header(page, 200)
+    for item in items:
+        if y > PAGE_BOTTOM:
+            page = new_page(False)
+            y = table_header(page, 118)
+        name = item.product.name if item.product else f"Producto {item.product_id}"
+        page.text(margin, y, name[:48], size=10)
+        page.text(340, y, str(item.quantity), size=10, align='center')
+        page.text(460, y, f"${item.price_at_time:.2f}", size=10, align='right')
+        page.text(right, y, f"${item.price_at_time * item.quantity:.2f}", size=10, bold=True, align='right')
+        page.line(margin, y + 7, right, y + 7, gray=0.92)
+        y += 22
+
+    if y > PAGE_BOTTOM - 80:
+        page = new_page(False)
+        y = 118
+    y += 12
+    page.text(360, y, 'Total', size=11, gray=0.4)
+    page.text(right, y, f"${order.total:.2f}", size=16, bold=True, align='right')
+    paid = order.paid_amount or 0
+    if paid > 0:
+        page.text(360, y + 20, 'Pagado', size=9, gray=0.5)
+        page.text(right, y + 20, f"-${paid:.2f}", size=10, align='right')
+        page.line(360, y + 28, right, y + 28, gray=0.9)
+        page.text(360, y + 44, 'Restante', size=11, bold=True, gray=0.4)
+        page.text(right, y + 44, f"${order.total - paid:.2f}", size=14, bold=True, align='right')
+    page.text(PAGE_MIDDLE, PAGE_FOOTER, 'Gracias por su compra', size=9, gray=0.6, align='center')
+    return [p.compressed() for p in pages]
+
+
+def get_note(order, fmt):
+    """
+    Nota de un pedido (con order.client cargado): fragmento HTML (str) o
+    lista de páginas PDF comprimidas. Se lee del disco si la clave sigue vigente.
+    """
+    directory = os.path.join(_cache_dir(), str(order.id))
+    filename = f"{note_key(order)}.{'html' if fmt == 'html' else 'pdfpages'}"
+    cached = _read(os.path.join(directory, filename))
+    if cached is not None:
+        return cached.decode('utf-8') if fmt == 'html' else _unpack(cached)
+
+    items = _load_items(order)
+    if fmt == 'html':
+        note = render_template('_order_note_body.html', order=order, items=items)
+        data = note.encode('utf-8')
+    else:
+        note = _draw_pdf(order, items)
+        data = _pack(note)
+    _write(directory, filename, data)
+    return note
+
+
+def _load_orders(order_ids):
+    orders = Order.query.options(joinedload(Order.client)).filter(Order.id.in_(order_ids)).all()
+    by_id = {order.id: order for order in orders}
+    return [by_id[i] for i in order_ids if i in by_id]
+
+
+def _note_worker(app, order_ids, fmt):
+    # Cada hilo usa su propio contexto (y su propia sesión/conexión)
+    with app.app_context():
+        return [(order.id, get_note(order, fmt)) for order in _load_orders(order_ids)]
+
+
+def render_notes(order_ids, fmt):
+    """
+    Notas de varios pedidos como un solo documento, en el orden pedido.
+    Regresa (contenido, número de notas): HTML (str) o PDF (bytes).
+    """
+    order_ids = list(dict.fromkeys(order_ids))[:MAX_BATCH_NOTES]
+    if len(order_ids) <= 1 or NOTE_WORKERS <= 1:
+        notes = [(order.id, get_note(order, fmt)) for order in _load_orders(order_ids)]
+    else:
+        from concurrent.futures import ThreadPoolExecutor
+        app = current_app._get_current_object()
+        workers = min(NOTE_WORKERS, len(order_ids))
+        chunks = [order_ids[i::workers] for i in range(workers)]
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = dict(note for chunk in pool.map(lambda ids: _note_worker(app, ids, fmt), chunks)
+                           for note in chunk)
+        notes = [(i, results[i]) for i in order_ids if i in results]
+
+    if fmt == 'html':
+        title = f"Nota de Pedido #{notes[0][0]}" if len(notes) == 1 else f"Notas de Pedido ({len(notes)})"
+        content = render_template('order_note.html', notes=[n for _, n in notes], title=title,
+                                  order_ids=[i for i, _ in notes])
+    else:
+        from pdf import build_pdf
+        title = 'Notas de Pedido ' + ', '.join(f"#{i}" for i, _ in notes[:20])
+        content = build_pdf([stream for _, pages in notes for stream in pages], title=title)
+    return content, len(notes)
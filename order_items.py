@@ -0,0 +1,139 @@
+"""
+Edición de los ítems de un pedido en lote (/api/orders/<id>/items).
+Las operaciones se aplican sobre una copia en memoria de los ítems; al final se calcula
+la diferencia de unidades por producto, el stock se reserva (UPDATE condicional) o se
+devuelve en un solo executemany cada uno (con sus movimientos en el libro de stock), y el
+total del pedido se recalcula una vez.
+Todo ocurre en la transacción del llamador: si algo falla, nada se aplica.
+"""
+from sqlalchemy import insert
+from models import db, Product, OrderItem
+from stock import reserve_stock, restore_stock, find_insufficient
+import rollup
+from notes import touch_order
+from payments import payment_status
+
+MAX_OPS = 500
+
+
+def parse_item_ops(ops):
+    """
+    Valida la lista de operaciones:
+      {'op': 'add', 'product_id': int, 'quantity': int > 0}
+      {'op': 'remove', 'item_id': int}
+      {'op': 'set', 'item_id': int, 'quantity': int >= 0}   (0 elimina el ítem)
+    Regresa [(op, id, quantity)]; lanza ValueError con un mensaje para el usuario.
+    """
+    if not isinstance(ops, list) or not ops:
+        raise ValueError('No hay operaciones.')
+    if len(ops) > MAX_OPS:
+        raise ValueError(f'Máximo {MAX_OPS} operaciones por petición.')
+
+    parsed = []
+    for index, op in enumerate(ops, start=1):
+        try:
+            kind = op['op']
+            if kind == 'add':
+                target, quantity = int(op['product_id']), int(op['quantity'])
+                if quantity <= 0:
+                    raise ValueError
+            elif kind == 'remove':
+                target, quantity = int(op['item_id']), 0
+            elif kind == 'set':
+                target, quantity = int(op['item_id']), int(op['quantity'])
+                if quantity < 0:
+                    raise ValueError
+            else:
+                raise ValueError
+        except (KeyError, TypeError, ValueError):
+            raise ValueError(f'Operación {index} inválida.')
+        parsed.append((kind, target, quantity))
+    return parsed
+
+
+def apply_item_ops(order, ops):
+    """
+    Aplica las operaciones ya validadas al pedido (ítems, stock, total, estado de pago y
+    acumulados).
+    Lanza ValueError si un ítem o producto no existe o no alcanza el stock.
+    """
+    items = {item.id: item for item in order.items}
+    # Estado final por línea: item_id (o clave ('new', product_id)) -> [product_id, quantity, price]
+    lines = {item_id: [item.product_id, item.quantity, item.price_at_time] for item_id, item in items.items()}
+
+    add_ids = {target for kind, target, _ in ops if kind == 'add'}
+    products = {p.id: p for p in Product.query.filter(Product.id.in_(add_ids))} if add_ids else {}
+
+    for kind, target, quantity in ops:
+        if kind == 'add':
+            product = products.get(target)
+            if not product:
+                raise ValueError(f'Producto ID {target} no existe.')
+            # Igual que add_order_item: si el producto ya está en el pedido se suma a esa línea
+            key = next((k for k, line in lines.items() if line[0] == target and line[1] > 0), ('new', target))
+            line = lines.setdefault(key, [target, 0, product.price])
+            line[1] += quantity
+        else:
+            if target not in lines:
+                raise ValueError(f'El ítem {target} no pertenece al pedido.')
+            lines[target][1] = quantity
+
+    # Diferencia de unidades por producto contra el estado original
+    delta = {}
+    for item in items.values():
+        delta[item.product_id] = delta.get(item.product_id, 0) - item.quantity
+    for product_id, quantity, _ in lines.values():
+        delta[product_id] = delta.get(product_id, 0) + quantity
+    to_reserve = {pid: qty for pid, qty in delta.items() if qty > 0}
+    to_restore = {pid: -qty for pid, qty in delta.items() if qty < 0}
+
+    with rollup.tracking(order):
+        if not reserve_stock(to_reserve, 'sale', order.id):
+            _, name, stock = find_insufficient(to_reserve)[0]
+            raise ValueError(f'Stock insuficiente para {name}. Solo quedan {stock}')
+        restore_stock(to_restore, 'return', order.id)
+
+        new_rows = []
+        for key, (product_id, quantity, price) in lines.items():
+            item = items.get(key)
+            if item is None:
+                if quantity > 0:
+                    new_rows.append({'order_id': order.id, 'product_id': product_id,
+                                     'quantity': quantity, 'price_at_time': price})
+            elif quantity == 0:
+                db.session.delete(item)
+            elif item.quantity != quantity:
+                item.quantity = quantity
+        if new_rows:
+            db.session.flush()
+            db.session.execute(insert(OrderItem), new_rows)
+
+        order.total = sum(quantity * price for _, quantity, price in lines.values())
+        # Con el total nuevo un pedido pagado puede quedar con saldo (o uno parcial, liquidado)
+        order.payment_status = payment_status(order.total, order.paid_amount or 0.0)
+        # Los ítems nuevos se insertan por Core (no pasan por el evento de versión)
+        touch_order(order)
+
+
+def order_to_dict(order):
+    """Pedido con sus ítems para actualizar la página de detalle sin recargar."""
+    items = db.session.query(
+        OrderItem.id, OrderItem.product_id, Product.name, OrderItem.quantity, OrderItem.price_at_time
+    ).outerjoin(Product, Product.id == OrderItem.product_id).filter(
+        OrderItem.order_id == order.id
+    ).order_by(OrderItem.id).all()
+    return {
+        'id': order.id,
+        'status': order.status,
+        'total': order.total,
+        'paid_amount': order.paid_amount or 0.0,
+        'payment_status': order.payment_status,
+        'items': [{
+            'id': row.id,
+            'product_id': row.product_id,
+            'product_name': row.name,
+            'quantity': row.quantity,
+            'price': row.price_at_time,
+            'subtotal': row.quantity * row.price_at_time,
+        } for row in items],
+    }
@@ -0,0 +1,84 @@
+"""
+Pagos de pedidos con libro de solo inserción (tabla payment).
+Cada pago agrega una fila y suma su monto al pedido con un UPDATE atómico
+(paid_amount = paid_amount + :monto), así dos pagos simultáneos al mismo pedido no se
+pisan. payment_status (y el estado, al liquidar) se calculan en el mismo UPDATE, y el
+saldo por cobrar del cliente (client_balance) se ajusta con rollup.tracking en la misma
+transacción.
+"""
+from sqlalchemy import case, func
+from models import db, Client, ClientBalance, Order, Payment
+import rollup
+from rollup import PAID_TOLERANCE
+
+PAYMENT_METHODS = {
+    'cash': 'Efectivo',
+    'card': 'Tarjeta',
+    'transfer': 'Transferencia',
+    'other': 'Otro',
+}
+
+
+def payment_status(total, paid):
+    if paid >= (total or 0.0) - PAID_TOLERANCE:
+        return 'Paid'
+    return 'Partial' if paid > 0 else 'Pending'
+
+
+def _payment_status_expr(paid):
+    # Igual que payment_status(), evaluado por SQLite con el monto ya sumado
+    return case((paid >= Order.total - PAID_TOLERANCE, 'Paid'), (paid > 0, 'Partial'), else_='Pending')
+
+
+def record_payment(order, amount, method='cash', complete_when_paid=False):
+    """
+    Registra un pago del pedido en la transacción del llamador (no hace commit).
+    Con complete_when_paid el pedido pasa a 'Completed' si queda liquidado.
+    Lanza ValueError con un mensaje para el usuario; regresa el Payment.
+    """
+    if amount <= 0:
+        raise ValueError('El monto del pago debe ser mayor a 0.')
+    if method not in PAYMENT_METHODS:
+        raise ValueError('Método de pago inválido.')
+
+    payment = Payment(order_id=order.id, client_id=order.client_id, amount=amount, method=method)
+    db.session.add(payment)
+    # El INSERT toma el bloqueo de escritura: desde aquí nadie más modifica el pedido,
+    # así que se relee para que el saldo "antes" de rollup.tracking sea el vigente
+    db.session.flush()
+    db.session.refresh(order)
+
+    with rollup.tracking(order):
+        paid = func.coalesce(Order.paid_amount, 0.0) + amount
+        order.paid_amount = paid
+        order.payment_status = _payment_status_expr(paid)
+        if complete_when_paid:
+            order.status = case((paid >= Order.total - PAID_TOLERANCE, 'Completed'), else_=Order.status)
+    return payment
+
+
+def add_opening_payment(order, method='cash'):
+    """Pago registrado al crear el pedido (POS): order.paid_amount ya trae el monto."""
+    if method not in PAYMENT_METHODS:
+        raise ValueError('Método de pago inválido.')
+    if (order.paid_amount or 0) > 0:
+        db.session.add(Payment(order_id=order.id, client_id=order.client_id,
+                               amount=order.paid_amount, method=method))
+
+
+def get_receivables(limit=None):
+    """Clientes con saldo pendiente, de mayor a menor (lee client_balance, no recorre pedidos)."""
+    query = db.session.query(
+        Client.id, Client.name, Client.phone, ClientBalance.outstanding, ClientBalance.open_orders
+    ).join(ClientBalance, ClientBalance.client_id == Client.id).filter(
+        ClientBalance.outstanding > PAID_TOLERANCE
+    ).order_by(ClientBalance.outstanding.desc())
+    if limit:
+        query = query.limit(limit)
+    return [{
+        'id': row.id,
+        'name': row.name,
+        'phone': row.phone,
+        'outstanding': round(row.outstanding, 2),
+        'open_orders': row.open_orders,
+    } for row in query]
@@ -0,0 +1,83 @@
+"""
+Escritor de PDF mínimo para las notas de pedido (sin dependencias externas).
+Solo lo necesario para texto y líneas con las fuentes estándar Helvetica / Helvetica-Bold
+(WinAnsiEncoding, cubre acentos y ñ). Cada página es un content stream ya comprimido;
+así las páginas de varias notas en caché se pueden juntar en un solo documento sin
+volver a dibujarlas (build_pdf).
+"""
+import zlib
+
+PAGE_WIDTH = 612   # Carta, en puntos
+PAGE_HEIGHT = 792
+
+# Anchos de Helvetica (1/1000 em) de los caracteres usados en columnas alineadas a la derecha
+_WIDTHS = {' ': 278, '.': 278, ',': 278, '-': 333, '$': 556, '#': 556, '/': 278, ':': 278}
+_DEFAULT_WIDTH = 556
+_BOLD_DEFAULT_WIDTH = 611
+
+
+def text_width(text, size, bold=False):
+    default = _BOLD_DEFAULT_WIDTH if bold else _DEFAULT_WIDTH
+    return sum(_WIDTHS.get(c, default) for c in text) * size / 1000
+
+
+def _escape(text):
+    data = str(text).encode('cp1252', errors='replace')
+    return data.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)')
+
+
+class Page:
+    """Construye el content stream de una página (coordenadas desde arriba a la izquierda)."""
+
+    def __init__(self):
+        self.ops = []
+
+    def text(self, x, y, text, size=10, bold=False, align='left', gray=0.0):
+        if align == 'right':
+            x -= text_width(text, size, bold)
+        elif align == 'center':
+            x -= text_width(text, size, bold) / 2
+        font = b'F2' if bold else b'F1'
+        self.ops.append(b'%.3f g BT /%s %.1f Tf %.2f %.2f Td (%s) Tj ET' % (
+            gray, font, size, x, PAGE_HEIGHT - y, _escape(text)))
+
+    def line(self, x1, y1, x2, y2, width=0.5, gray=0.8):
+        self.ops.append(b'%.3f G %.2f w %.2f %.2f m %.2f %.2f l S' % (
+            gray, width, x1, PAGE_HEIGHT - y1, x2, PAGE_HEIGHT - y2))
+
+    def compressed(self):
+        return zlib.compress(b'\n'.join(self.ops), 6)
+
+
+def build_pdf(streams, title=''):
+    """Arma el documento a partir de content streams comprimidos (uno por página)."""
+    objects = [
+        b'<< /Type /Catalog /Pages 2 0 R >>',
+        None,  # Pages, se completa al final
+        b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>',
+        b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>',
+        b'<< /Title (%s) /Producer (Termomaz) >>' % _escape(title),
+    ]
+    page_refs = []
+    for stream in streams:
+        objects.append(b'<< /Length %d /Filter /FlateDecode >>\nstream\n%s\nendstream' % (len(stream), stream))
+        content_ref = len(objects)
+        objects.append(
+            b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] /Contents %d 0 R '
+            b'/Resources << /Font << /F1 3 0 R /F2 4 0 R >> >> >>' % (PAGE_WIDTH, PAGE_HEIGHT, content_ref)
+        )
+        page_refs.append(len(objects))
+    objects[1] = b'<< /Type /Pages /Kids [%s] /Count %d >>' % (
+        b' '.join(b'%d 0 R' % ref for ref in page_refs), len(page_refs))
+
+    out = bytearray(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b'%d 0 obj\n%s\nendobj\n' % (number, body)
+    xref = len(out)
+    out += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+    for offset in offsets:
+        out += b'%010d 00000 n \n' % offset
+    out += b'trailer\n<< /Size %d /Root 1 0 R /Info 5 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref)
+    return bytes(out)
@@ -0,0 +1,192 @@
+"""
+Conexiones de solo lectura para listados y reportes, separadas de las del POS.
+Las rutas de consulta (@read_only, @reporting) y los trabajos de reportes (reading())
+leen con su propio engine y su propio pool, así un reporte largo no ocupa las conexiones
+de las ventas y los pagos, y con WAL los lectores no bloquean al escritor:
+  - live: la misma base abierta con mode=ro (URI de SQLite) y PRAGMA query_only.
+    Sin retraso; lo usan los listados, donde se espera ver lo que se acaba de guardar.
+  - snapshot: una copia de la base hecha con la API de backup de sqlite3 y abierta como
+    inmutable (sin bloqueos). Se renueva cuando tiene más de REPORT_MAX_STALENESS
+    segundos (TERMOMAZ_REPORT_MAX_STALENESS); la usan los reportes y exportaciones, así
+    sus lecturas largas tampoco detienen el checkpoint del WAL de la base principal.
+    Con 0 (valor por defecto) los reportes también leen con el engine live.
+RoutingSession (la sesión de db.session) elige el engine: las escrituras (flush e
+INSERT/UPDATE/DELETE) siempre van a la base principal.
+"""
+import functools
+import glob
+import logging
+import os
+import pathlib
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from flask import current_app, g, has_app_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine, event
+from sqlalchemy.pool import QueuePool
+
+REPORT_MAX_STALENESS = float(os.environ.get('TERMOMAZ_REPORT_MAX_STALENESS', 0))
+REPORT_POOL_SIZE = int(os.environ.get('TERMOMAZ_REPORT_POOL', 4))
+SNAPSHOT_DIR = 'report_snapshot'
+
+# Como SQLITE_PRAGMAS de models.py, sin journal_mode ni synchronous (no se escribe)
+READ_PRAGMAS = [
+    'PRAGMA query_only=ON',
+    'PRAGMA busy_timeout=5000',
+    'PRAGMA cache_size=-32000',
+    'PRAGMA mmap_size=268435456',
+    'PRAGMA temp_store=MEMORY',
+]
+
+_G_KEY = '_read_max_staleness'
+
+logger = logging.getLogger('termomaz.replica')
+
+_lock = threading.Lock()
+_snapshot_lock = threading.Lock()  # Aparte: copiar la base no detiene a los listados
+_live = {}  # ruta de la base -> engine mode=ro
+_snapshots = {}  # ruta de la base -> (engine, ruta de la copia, time.monotonic() al copiarla)
+_engine_hooks = []
+
+
+def _set_read_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for pragma in READ_PRAGMAS:
+        cursor.execute(pragma)
+    cursor.close()
+
+
+def _create_engine(path, params):
+    # URI file:///... (as_uri escapa espacios y caracteres especiales, también en Windows)
+    uri = f'{pathlib.Path(path).as_uri()}?{params}'
+    engine = create_engine(
+        'sqlite://', poolclass=QueuePool, pool_size=REPORT_POOL_SIZE, max_overflow=REPORT_POOL_SIZE,
+        pool_timeout=30, creator=lambda: sqlite3.connect(uri, uri=True, timeout=30, check_same_thread=False),
+    )
+    event.listen(engine, 'connect', _set_read_pragmas)
+    for hook in _engine_hooks:
+        hook(engine)
+    return engine
+
+
+def live_engine(db_path):
+    with _lock:
+        engine = _live.get(db_path)
+        if engine is None:
+            engine = _live[db_path] = _create_engine(db_path, 'mode=ro')
+        return engine
+
+
+def _take_snapshot(db_path):
+    """Copia consistente de la base (backup en un solo paso) en report_snapshot/."""
+    directory = os.path.join(os.path.dirname(db_path), SNAPSHOT_DIR)
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f'snapshot-{time.time_ns()}.db')
+    source = sqlite3.connect(db_path)
+    target = sqlite3.connect(path)
+    try:
+        source.backup(target)
+        # La copia hereda el modo WAL; sin él se puede abrir como inmutable
+        target.execute('PRAGMA journal_mode=DELETE')
+    finally:
+        target.close()
+        source.close()
+    return path
+
+
+def _remove_old_snapshots(db_path, keep):
+    for path in glob.glob(os.path.join(os.path.dirname(db_path), SNAPSHOT_DIR, 'snapshot-*.db')):
+        if path != keep:
+            try:
+                os.remove(path)
+            except OSError:
+                pass  # Windows: todavía abierta por un reporte; se borra en la próxima renovación
+
+
+def snapshot_engine(db_path, max_staleness):
+    """Engine de la copia de reportes; la renueva si tiene más de max_staleness segundos."""
+    with _snapshot_lock:
+        current = _snapshots.get(db_path)
+        if current is not None and time.monotonic() - current[2] <= max_staleness:
+            return current[0]
+        started = time.monotonic()
+        path = _take_snapshot(db_path)
+        engine = _create_engine(path, 'mode=ro&immutable=1')
+        _snapshots[db_path] = (engine, path, started)
+        if current is not None:
+            # Las conexiones en uso siguen con la copia anterior hasta que se devuelvan
+            current[0].dispose()
+        _remove_old_snapshots(db_path, path)
+        logger.info('Report snapshot refreshed in %.3fs', time.monotonic() - started)
+        return engine
+
+
+def engine_for(db_path, max_staleness):
+    if max_staleness > 0:
+        return snapshot_engine(db_path, max_staleness)
+    return live_engine(db_path)
+
+
+# --- Enrutamiento ---
+
+def current_max_staleness():
+    """Segundos de retraso aceptados por la petición o el trabajo en curso (None: base principal)."""
+    if not has_app_context():
+        return None
+    return g.get(_G_KEY)
+
+
+def use(max_staleness):
+    """Envía las lecturas de este contexto (petición o trabajo) al engine de solo lectura."""
+    setattr(g, _G_KEY, max_staleness)
+
+
+def read_only(view):
+    """Rutas de listados: leen con el engine live (sin retraso)."""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        use(0)
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def reporting(view):
+    """Rutas de reportes: leen de la copia con el retraso máximo configurado."""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        use(current_app.config['REPORT_MAX_STALENESS'])
+        return view(*args, **kwargs)
+    return wrapper
+
+
+@contextmanager
+def reading(max_staleness=None):
+    """Como @reporting para un bloque de código (los trabajos en segundo plano)."""
+    previous = g.get(_G_KEY)
+    use(current_app.config['REPORT_MAX_STALENESS'] if max_staleness is None else max_staleness)
+    try:
+        yield
+    finally:
+        use(previous)
+
+
+class RoutingSession(Session):
+    """db.session: las lecturas de @read_only/@reporting/reading() van al engine de solo lectura."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and not getattr(clause, 'is_dml', False):
+            max_staleness = current_max_staleness()
+            if max_staleness is not None:
+                db_path = self._db.engine.url.database
+                if db_path and db_path != ':memory:':
+                    return engine_for(db_path, max_staleness)
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def init_app(app, on_engine=None):
+    """Configura el retraso de los reportes; on_engine(engine) se llama con cada engine nuevo."""
+    app.config.setdefault('REPORT_MAX_STALENESS', REPORT_MAX_STALENESS)
+    if on_engine is not None:
+        _engine_hooks.append(on_engine)
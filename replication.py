@@ -0,0 +1,573 @@
+"""
+Replicación entre tiendas con un registro de cambios (change data capture).
+Cada tienda trabaja con su propia base y una base central junta las de todas:
+  - Triggers de SQLite (create_triggers, migración 012) agregan a change_log cada
+    INSERT/UPDATE/DELETE de client, product, "order", order_item y stock_movement, también
+    los de las sentencias en lote (stock, importación) que no pasan por el ORM. seq es
+    AUTOINCREMENT: crece siempre y no se reutiliza, así sirve de marca de agua.
+  - Entre bases una fila se identifica con un gid "<tienda>:<id local>"; las filas recibidas
+    guardan su gid en sync_key. Las referencias (client_id, product_id, order_id) viajan
+    también como gid. Las tablas replicadas son AUTOINCREMENT (migraciones 013 y 014): un
+    ID borrado no se reutiliza, así un gid nunca nombra a dos filas.
+  - Protocolo: la tienda envía (push) sus cambios desde la marca de agua que la central
+    guarda para ella (sync_state 'received:<tienda>') y recibe (pull) los cambios de
+    clientes y productos que no salieron de ella. Cada lote es JSON comprimido con gzip;
+    el receptor ignora los cambios con seq menor o igual a su marca de agua, así reenviar
+    un lote (una respuesta que no llegó) no duplica nada.
+  - Conflictos:
+      stock: el valor absoluto nunca se copia (los UPDATE de product que solo cambian el
+        stock no se registran); viajan los movimientos, que se suman y conmutan: las ventas
+        de varias tiendas dan el mismo stock en cualquier orden. Si el stock del receptor
+        queda negativo se reporta como conflicto, pero la venta ya ocurrió y se aplica.
+      clientes y productos: gana el cambio más reciente (changed_at del origen) frente al
+        último cambio registrado de esa fila aquí; un borrado es definitivo. Se emparejan
+        por sku y email con los que ya existían en el receptor.
+      pedidos e ítems: solo se editan en la tienda que los creó; se aplican en orden.
+  - Transporte: HTTP (/api/sync/*) o, para probar sin servidor, otra base en disco
+    (flask sync otra.db).
+Lo archivado (archive.py) no se replica como borrado: _delete_batch usa paused().
+"""
+import gzip
+import json
+import logging
+import os
+import urllib.parse
+import urllib.request
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+from sqlalchemy import func, insert, select, text, update
+from models import db, Client, Product, Order, OrderItem, StockMovement, DeletedRecord, ChangeLog, SyncKey, SyncState
+import rollup
+
+# Nombre de esta tienda al crear su base (si no, uno aleatorio); queda guardado en sync_state
+STORE_ID = os.environ.get('TERMOMAZ_STORE_ID')
+SYNC_BATCH_SIZE = 500
+FORMAT = 1
+
+# Entidad -> modelo, en el orden en que se registran las filas existentes
+CAPTURED = {
+    'client': Client,
+    'product': Product,
+    'order': Order,
+    'order_item': OrderItem,
+    'stock_movement': StockMovement,
+}
+# Columnas que guardan el ID de otra entidad (viajan como gid)
+REFERENCES = {
+    'order': {'client_id': 'client'},
+    'order_item': {'order_id': 'order', 'product_id': 'product'},
+    'stock_movement': {'product_id': 'product', 'order_id': 'order'},
+}
+# Lo que la central envía a las tiendas (datos maestros)
+PULL_ENTITIES = ('client', 'product')
+# Entidades editables en cualquier base: gana el cambio más reciente
+LWW_ENTITIES = ('client', 'product')
+# Columna con la que se reconoce una fila que ya existía en el receptor
+NATURAL_KEYS = {'client': 'email', 'product': 'sku'}
+# Columnas de product que no cuentan como cambio: el stock viaja como movimientos
+PRODUCT_UNTRACKED = ('stock', 'updated_at')
+
+NOW_SQL = "strftime('%Y-%m-%d %H:%M:%f', 'now')"
+
+logger = logging.getLogger('termomaz.replication')
+
+_store_ids = {}  # ruta de la base -> store_id
+
+
+# --- Registro de cambios (triggers) ---
+
+def _json_object(row, columns):
+    return 'json_object(' + ', '.join(f"'{c}', {row}.\"{c}\"" for c in columns) + ')'
+
+
+def create_triggers(conn):
+    """Triggers AFTER INSERT/UPDATE/DELETE que escriben change_log (idempotente)."""
+    # Datos de la escritura en curso: origen y fecha de un cambio recibido, o paused.
+    # Sus filas solo existen dentro de la transacción que las usa
+    conn.exec_driver_sql(
+        'CREATE TABLE IF NOT EXISTS change_context ('
+        'origin VARCHAR(32), via VARCHAR(32), changed_at VARCHAR(26), paused INTEGER NOT NULL DEFAULT 0)'
+    )
+    context = ('(SELECT origin FROM change_context), (SELECT via FROM change_context), '
+               f'COALESCE((SELECT changed_at FROM change_context), {NOW_SQL})')
+    active = 'NOT EXISTS (SELECT 1 FROM change_context WHERE paused = 1)'
+    for entity, model in CAPTURED.items():
+        table = model.__tablename__
+        columns = [c.name for c in model.__table__.columns]
+        update_when = active
+        if model is Product:
+            changed = ' OR '.join(f'OLD."{c}" IS NOT NEW."{c}"' for c in columns if c not in PRODUCT_UNTRACKED)
+            update_when = f'{active} AND ({changed})'
+        for op, event, row, when in (('insert', 'INSERT', 'NEW', active),
+                                     ('update', 'UPDATE', 'NEW', update_when),
+                                     ('delete', 'DELETE', 'OLD', active)):
+            data = 'NULL' if op == 'delete' else _json_object(row, columns)
+            conn.exec_driver_sql(
+                f'CREATE TRIGGER IF NOT EXISTS change_log_{table}_{op} AFTER {event} ON "{table}" '
+                f'WHEN {when} BEGIN '
+                f'INSERT INTO change_log (entity, row_id, op, data, origin, via, changed_at) '
+                f"VALUES ('{entity}', {row}.id, '{op}', {data}, {context}); END"
+            )
+
+
+def log_existing_rows(conn):
+    """
+    Registra como 'insert' las filas que ya había antes del registro de cambios. El stock
+    actual de cada producto entra como un movimiento 'baseline' (row_id = -id del producto)
+    para que la central reciba el stock inicial como delta, igual que el resto.
+    """
+    if conn.exec_driver_sql('SELECT 1 FROM change_log LIMIT 1').first() is not None:
+        return
+    for entity, model in CAPTURED.items():
+        table = model.__tablename__
+        columns = [c.name for c in model.__table__.columns]
+        data = _json_object(f'"{table}"', columns)
+        conn.exec_driver_sql(
+            f'INSERT INTO change_log (entity, row_id, op, data, changed_at) '
+            f"SELECT '{entity}', id, 'insert', {data}, {NOW_SQL} "
+            f'FROM "{table}" ORDER BY id'
+        )
+    conn.exec_driver_sql(
+        'INSERT INTO change_log (entity, row_id, op, data, changed_at) '
+        "SELECT 'stock_movement', -id, 'insert', json_object("
+        "'product_id', id, 'change', COALESCE(stock, 0), 'reason', 'baseline', 'order_id', NULL, "
+        f"'created_at', strftime('%Y-%m-%d %H:%M:%f', 'now')), {NOW_SQL} "
+        'FROM product WHERE COALESCE(stock, 0) != 0 ORDER BY id'
+    )
+
+
+@contextmanager
+def paused():
+    """Las escrituras del bloque no se registran (dentro de la transacción del llamador)."""
+    db.session.execute(text('INSERT INTO change_context (paused) VALUES (1)'))
+    yield
+    db.session.execute(text('DELETE FROM change_context'))
+
+
+# --- Identidad ---
+
+def _get_state(name):
+    row = db.session.get(SyncState, name)
+    return row.value if row is not None else None
+
+
+def _set_state(name, value):
+    row = db.session.get(SyncState, name)
+    if row is None:
+        db.session.add(SyncState(name=name, value=str(value)))
+    else:
+        row.value = str(value)
+
+
+def store_id():
+    """Nombre de esta base para las demás; se genera (y se guarda) la primera vez."""
+    db_path = db.engine.url.database
+    if db_path not in _store_ids:
+        value = _get_state('store_id')
+        if value is None:
+            value = STORE_ID or uuid.uuid4().hex[:12]
+            _set_state('store_id', value)
+            db.session.commit()
+        _store_ids[db_path] = value
+    return _store_ids[db_path]
+
+
+def received_watermark(peer):
+    """Último seq de la base `peer` aplicado aquí (0: nada todavía)."""
+    return int(_get_state(f'received:{peer}') or 0)
+
+
+def _gids(entity, local_ids, own):
+    keys = dict(db.session.query(SyncKey.local_id, SyncKey.gid).filter(
+        SyncKey.entity == entity, SyncKey.local_id.in_(list(local_ids))
+    ))
+    return {local_id: keys.get(local_id, f'{own}:{local_id}') for local_id in local_ids}
+
+
+# --- Exportar ---
+
+def export_changes(since, peer=None, entities=None, limit=SYNC_BATCH_SIZE):
+    """
+    Lote con los cambios posteriores a `since` (a lo más `limit` registros revisados).
+    Omite los que salieron de `peer` o llegaron de él (no se le regresan sus cambios) y,
+    con `entities`, los de otras entidades. more=True si quedan registros por revisar.
+    """
+    own = store_id()
+    rows = ChangeLog.query.filter(ChangeLog.seq > since).order_by(ChangeLog.seq).limit(limit).all()
+    selected = []
+    wanted = defaultdict(set)  # entidad -> IDs locales a traducir a gid
+    for row in rows:
+        if entities is not None and row.entity not in entities:
+            continue
+        if peer is not None and peer in (row.origin, row.via):
+            continue
+        data = json.loads(row.data) if row.data else None
+        wanted[row.entity].add(row.row_id)
+        for column, target in REFERENCES.get(row.entity, {}).items():
+            if data and data.get(column) is not None:
+                wanted[target].add(data[column])
+        selected.append((row, data))
+
+    gids = {entity: _gids(entity, ids, own) for entity, ids in wanted.items()}
+    changes = []
+    for row, data in selected:
+        if data:
+            data.pop('id', None)
+            for column, target in REFERENCES.get(row.entity, {}).items():
+                if data.get(column) is not None:
+                    data[column] = gids[target][data[column]]
+        changes.append({
+            'seq': row.seq, 'entity': row.entity, 'op': row.op, 'gid': gids[row.entity][row.row_id],
+            'data': data, 'origin': row.origin or own, 'changed_at': row.changed_at,
+        })
+    return {
+        'format': FORMAT, 'store_id': own, 'since': since,
+        'to_seq': rows[-1].seq if rows else since, 'more': len(rows) == limit, 'changes': changes,
+    }
+
+
+def pack(batch):
+    return gzip.compress(json.dumps(batch, separators=(',', ':')).encode('utf-8'), compresslevel=6)
+
+
+def unpack(data):
+    """Lote comprimido -> dict; ValueError si no es un lote válido."""
+    try:
+        batch = json.loads(gzip.decompress(data))
+    except (OSError, EOFError, ValueError):
+        raise ValueError('El lote no es JSON comprimido con gzip.')
+    if not isinstance(batch, dict) or batch.get('format') != FORMAT:
+        raise ValueError('Formato de lote no soportado.')
+    return batch
+
+
+# --- Aplicar ---
+
+def _add(totals, contribution):
+    for key, values in contribution.items():
+        current = totals.get(key)
+        totals[key] = values if current is None else tuple(a + b for a, b in zip(current, values))
+
+
+class BatchApplier:
+    """Aplica los cambios de un lote en la transacción en curso y junta los conflictos."""
+
+    def __init__(self, sender, own):
+        self.sender = sender
+        self.own = own
+        self.applied = 0
+        self.skipped = 0
+        self.conflicts = []
+        self.orders = {}  # ID de pedido -> (contribución al acumulado, al saldo) antes del lote
+        self.keys = {}  # (entidad, gid) -> SyncKey, los del lote cargados de una vez
+
+    def load_keys(self, changes):
+        """Carga en una consulta por entidad los sync_key de los gid del lote (y sus referencias)."""
+        wanted = defaultdict(set)
+        for change in changes:
+            wanted[change['entity']].add(change['gid'])
+            for column, target in REFERENCES.get(change['entity'], {}).items():
+                if change['data'] and change['data'].get(column) is not None:
+                    wanted[target].add(change['data'][column])
+        for entity, gids in wanted.items():
+            for key in SyncKey.query.filter(SyncKey.entity == entity, SyncKey.gid.in_(list(gids))):
+                self.keys[(entity, key.gid)] = key
+
+    def conflict(self, change, kind, message):
+        self.conflicts.append({'seq': change['seq'], 'entity': change['entity'], 'gid': change['gid'],
+                               'type': kind, 'message': message})
+
+    def local_id(self, entity, gid):
+        """(conocida, ID local): ID None si la fila se borró aquí."""
+        prefix, _, raw = gid.rpartition(':')
+        if prefix == self.own:
+            return True, int(raw)
+        key = self.keys.get((entity, gid))
+        if key is None:
+            return False, None
+        return True, key.local_id
+
+    def set_key(self, entity, gid, local_id):
+        if gid.rpartition(':')[0] == self.own:
+            return
+        key = self.keys.get((entity, gid))
+        if key is None:
+            key = self.keys[(entity, gid)] = SyncKey(entity=entity, gid=gid)
+            db.session.add(key)
+        key.local_id = local_id
+
+    def track_order(self, order_id):
+        """Guarda lo que el pedido aportaba a los acumulados antes de su primer cambio del lote."""
+        if order_id is None or order_id in self.orders:
+            return
+        order = db.session.get(Order, order_id)
+        self.orders[order_id] = (rollup.order_contribution(order), rollup.balance_contribution(order))
+
+    def values(self, change, model):
+        """Columnas del cambio con tipos y referencias locales; None si falta una referencia."""
+        columns = model.__table__.columns
+        values = {}
+        for name, value in change['data'].items():
+            column = columns.get(name)
+            if column is None or column.primary_key:
+                continue
+            if value is not None and isinstance(column.type, db.DateTime):
+                value = datetime.fromisoformat(value)
+            values[name] = value
+        for column, target in REFERENCES.get(change['entity'], {}).items():
+            ref = values.get(column)
+            if ref is None:
+                continue
+            _, local = self.local_id(target, ref)
+            if local is None:
+                if column == 'order_id' and change['entity'] == 'stock_movement':
+                    values[column] = None  # El libro no tiene FK: el pedido puede no existir
+                    continue
+                self.conflict(change, 'missing_reference', f'{column} {ref} no existe en esta base.')
+                return None
+            values[column] = local
+        return values
+
+    def is_newer(self, entity, local_id, changed_at):
+        latest = db.session.query(func.max(ChangeLog.changed_at)).filter(
+            ChangeLog.entity == entity, ChangeLog.row_id == local_id
+        ).scalar()
+        return latest is None or changed_at > latest
+
+    def apply(self, change):
+        entity, gid, op = change['entity'], change['gid'], change['op']
+        model = CAPTURED.get(entity)
+        if model is None:
+            self.conflict(change, 'unknown_entity', f'Entidad desconocida: {entity}.')
+            return
+        table = model.__table__
+        known, local = self.local_id(entity, gid)
+
+        if op == 'delete':
+            if local is not None:
+                self.delete(change, model, local)
+            self.set_key(entity, gid, None)  # Lápida: los cambios que lleguen después se ignoran
+            self.applied += 1
+            return
+        if known and local is None:
+            self.skipped += 1  # Borrada aquí: el borrado gana
+            return
+        values = self.values(change, model)
+        if values is None:
+            return
+
+        if entity == 'stock_movement':
+            # El libro es de solo inserción: solo se aplican los movimientos nuevos
+            if op == 'insert' and not known:
+                self.insert_movement(change, values)
+                self.applied += 1
+            else:
+                self.skipped += 1
+            return
+
+        if not known and entity in NATURAL_KEYS:
+            natural = NATURAL_KEYS[entity]
+            if values.get(natural):
+                # No una fila que ya vino de la misma tienda: allá son dos filas distintas
+                db.session.flush()
+                same_store = select(SyncKey.local_id).where(
+                    SyncKey.entity == entity, SyncKey.gid.startswith(gid.rpartition(':')[0] + ':'),
+                    SyncKey.local_id.is_not(None),
+                )
+                local = db.session.execute(select(table.c.id).where(
+                    table.c[natural] == values[natural], table.c.id.not_in(same_store)
+                ).order_by(table.c.id).limit(1)).scalar()
+                known = local is not None
+        if entity in LWW_ENTITIES:
+            values['updated_at'] = datetime.utcnow()  # Para las copias del POS de esta base
+        if entity == 'product':
+            values.pop('stock', None)  # Solo cambia con los movimientos
+
+        if known:
+            if entity in LWW_ENTITIES and not self.is_newer(entity, local, change['changed_at']):
+                self.set_key(entity, gid, local)
+                self.skipped += 1
+                return
+            self.track_order(local if entity == 'order' else values.get('order_id'))
+            if entity == 'order_item':
+                self.track_order(db.session.execute(select(table.c.order_id).where(table.c.id == local)).scalar())
+            db.session.execute(update(table).where(table.c.id == local).values(**values))
+        else:
+            if entity == 'product':
+                values['stock'] = 0
+            if entity == 'order_item':
+                self.track_order(values.get('order_id'))
+            local = db.session.execute(insert(table).values(**values)).inserted_primary_key[0]
+            if entity == 'order':
+                self.orders.setdefault(local, ({}, {}))
+        self.set_key(entity, gid, local)
+        self.applied += 1
+
+    def delete(self, change, model, local_id):
+        table = model.__table__
+        if model is Order:
+            self.track_order(local_id)
+            db.session.execute(OrderItem.__table__.delete().where(OrderItem.order_id == local_id))
+        elif model is OrderItem:
+            self.track_order(db.session.execute(select(table.c.order_id).where(table.c.id == local_id)).scalar())
+        elif model in (Client, Product):
+            db.session.add(DeletedRecord(entity=change['entity'], record_id=local_id))
+        elif model is StockMovement:
+            return  # El libro es de solo inserción
+        db.session.execute(table.delete().where(table.c.id == local_id))
+
+    def insert_movement(self, change, values):
+        result = db.session.execute(insert(StockMovement.__table__).values(**values))
+        self.set_key('stock_movement', change['gid'], result.inserted_primary_key[0])
+        products = Product.__table__
+        stock = db.session.execute(
+            update(products).where(products.c.id == values['product_id'])
+            .values(stock=func.coalesce(products.c.stock, 0) + values['change'])
+            .returning(products.c.stock)
+        ).scalar()
+        if stock is not None and stock < 0:
+            self.conflict(change, 'negative_stock', f'El stock del producto {values["product_id"]} quedó en {stock}.')
+
+    def finish(self):
+        """Refleja en daily_sales y client_balance los pedidos que cambiaron."""
+        before_sales, before_balance, after_sales, after_balance = {}, {}, {}, {}
+        for sales, balance in self.orders.values():
+            _add(before_sales, sales)
+            _add(before_balance, balance)
+        db.session.expire_all()  # Los cambios se hicieron con sentencias, no con el ORM
+        for order_id in self.orders:
+            order = db.session.get(Order, order_id)
+            _add(after_sales, rollup.order_contribution(order))
+            _add(after_balance, rollup.balance_contribution(order))
+        rollup.apply_delta(before_sales, after_sales)
+        rollup.apply_balance_delta(before_balance, after_balance)
+
+
+def apply_batch(batch):
+    """
+    Aplica un lote de otra base en una sola transacción y hace commit.
+    Regresa {store_id, applied, skipped, conflicts, watermark}; ValueError si el lote
+    no corresponde (de esta misma base, o empieza después de la marca de agua).
+    """
+    own = store_id()
+    sender = batch.get('store_id')
+    if not sender or sender == own:
+        raise ValueError('El lote no tiene base de origen o viene de esta misma base.')
+    # Bloqueo de escritura desde el inicio (como sync_sales): dos envíos de la misma tienda
+    # no pueden aplicar el mismo lote a la vez
+    db.session.execute(text('BEGIN IMMEDIATE'))
+    watermark = received_watermark(sender)
+    if batch['since'] > watermark:
+        db.session.rollback()
+        raise ValueError(f"Faltan cambios: el lote empieza en {batch['since']} y lo último aplicado es {watermark}.")
+
+    applier = BatchApplier(sender, own)
+    applier.load_keys(batch['changes'])
+    db.session.execute(text('INSERT INTO change_context (via) VALUES (:via)'), {'via': sender})
+    for change in batch['changes']:
+        if change['seq'] <= watermark or change['origin'] == own:
+            applier.skipped += 1
+            continue
+        db.session.execute(text('UPDATE change_context SET origin = :origin, changed_at = :changed_at'),
+                           {'origin': change['origin'], 'changed_at': change['changed_at']})
+        applier.apply(change)
+    db.session.execute(text('DELETE FROM change_context'))
+    applier.finish()
+
+    watermark = max(watermark, batch['to_seq'])
+    _set_state(f'received:{sender}', watermark)
+    db.session.commit()
+    for conflict in applier.conflicts:
+        logger.warning('Sync conflict from %s: %s', sender, conflict)
+    return {'store_id': own, 'applied': applier.applied, 'skipped': applier.skipped,
+            'conflicts': applier.conflicts, 'watermark': watermark}
+
+
+# --- Sincronizar con la central ---
+
+class HttpPeer:
+    """Base central detrás de /api/sync/* (otra instancia de la aplicación)."""
+
+    def __init__(self, url, timeout=60):
+        self.url = url.rstrip('/')
+        self.timeout = timeout
+
+    def _open(self, path, params, data=None):
+        url = f'{self.url}{path}?{urllib.parse.urlencode(params)}'
+        headers = {'Content-Type': 'application/json', 'Content-Encoding': 'gzip'} if data is not None else {}
+        request = urllib.request.Request(url, data=data, headers=headers, method='POST' if data else 'GET')
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            return response.read()
+
+    def _json(self, body):
+        result = json.loads(body)
+        if not result.get('success'):
+            raise RuntimeError(result.get('message') or 'Error de la base central.')
+        return result
+
+    def status(self, store):
+        return self._json(self._open('/api/sync/status', {'store_id': store}))
+
+    def push(self, packed):
+        return self._json(self._open('/api/sync/push', {}, packed))
+
+    def pull(self, store, since):
+        # urllib no descomprime: el lote llega tal como se envió
+        return self._open('/api/sync/pull', {'store_id': store, 'since': since})
+
+
+class LocalPeer:
+    """Base central en otro archivo, abierta con su propia aplicación de Flask (pruebas, USB)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    def status(self, store):
+        with self.app.app_context():
+            return {'store_id': store_id(), 'received': received_watermark(store)}
+
+    def push(self, packed):
+        with self.app.app_context():
+            return apply_batch(unpack(packed))
+
+    def pull(self, store, since):
+        with self.app.app_context():
+            return pack(export_changes(since, peer=store, entities=PULL_ENTITIES))
+
+
+def sync(peer, batch_size=SYNC_BATCH_SIZE, on_batch=None):
+    """
+    Envía a la central los cambios pendientes de esta base y aplica los de la central.
+    on_batch(etapa, resultado) se llama después de cada lote. Regresa los totales.
+    """
+    own = store_id()
+    status = peer.status(own)
+    central = status['store_id']
+    totals = {'store_id': own, 'central': central, 'pushed': 0, 'pulled': 0, 'conflicts': []}
+
+    since = status['received']
+    while True:
+        batch = export_changes(since, peer=central, limit=batch_size)
+        result = peer.push(pack(batch))
+        totals['pushed'] += result['applied']
+        totals['conflicts'] += result['conflicts']
+        since = result['watermark']
+        if on_batch:
+            on_batch('push', result)
+        if not batch['more']:
+            break
+
+    since = received_watermark(central)
+    while True:
+        batch = unpack(peer.pull(own, since))
+        result = apply_batch(batch)
+        totals['pulled'] += result['applied']
+        totals['conflicts'] += result['conflicts']
+        since = result['watermark']
+        if on_batch:
+            on_batch('pull', result)
+        if not batch['more']:
+            break
+    return totals
@@ -0,0 +1,111 @@
+"""
+Capa de consultas para reportes.
+Las agregaciones se leen del acumulado diario (daily_sales, ver rollup.py) con GROUP BY,
+así que el costo depende del número de días del rango y no del número de pedidos.
+"""
+from datetime import datetime, date
+from sqlalchemy import func, case
+from models import db, Product, DailySales
+from rollup import ORDER_TOTALS
+
+
+def parse_report_range(args):
+    """
+    Interpreta start_date / end_date (YYYY-MM-DD) de la query string.
+    Regresa (start_date, end_date, start_date_str, end_date_str).
+    Por defecto: desde el inicio del mes actual hasta el final del día de hoy.
+    """
+    start_date_str = args.get('start_date')
+    end_date_str = args.get('end_date')
+
+    today = date.today()
+    if not start_date_str:
+        start_date = datetime(today.year, today.month, 1)
+        start_date_str = start_date.strftime('%Y-%m-%d')
+    else:
+        try:
+            start_date = datetime.strptime(start_date_str, '%Y-%m-%d')
+        except ValueError:
+            start_date = datetime(today.year, today.month, 1) # Fallback
+
+    if not end_date_str:
+        end_date = datetime.combine(today, datetime.max.time())
+        end_date_str = today.strftime('%Y-%m-%d')
+    else:
+        try:
+            # Aseguramos que cubra todo el día final
+            end_date_dt = datetime.strptime(end_date_str, '%Y-%m-%d')
+            end_date = datetime.combine(end_date_dt.date(), datetime.max.time())
+        except ValueError:
+            end_date = datetime.combine(today, datetime.max.time())
+
+    return start_date, end_date, start_date_str, end_date_str
+
+
+def get_sales_summary(start_date, end_date):
+    """
+    Totales del rango leídos del acumulado diario (una consulta, O(días)):
+    {'total_sales', 'total_orders_count', 'completed_orders', 'pending_orders'}
+    """
+    row = db.session.query(
+        func.coalesce(func.sum(DailySales.revenue), 0.0),
+        func.coalesce(func.sum(DailySales.order_count), 0),
+        func.coalesce(func.sum(case((DailySales.status == 'Completed', DailySales.order_count), else_=0)), 0),
+        func.coalesce(func.sum(case((DailySales.status == 'Pending', DailySales.order_count), else_=0)), 0),
+    ).filter(
+        DailySales.product_id == ORDER_TOTALS,
+        DailySales.day >= start_date.date(),
+        DailySales.day <= end_date.date(),
+    ).one()
+
+    return {
+        'total_sales': row[0],
+        'total_orders_count': row[1],
+        'completed_orders': row[2],
+        'pending_orders': row[3],
+    }
+
+
+def get_completed_sales_since(start_date):
+    """Suma de ventas de pedidos 'Completed' desde start_date (ventas del mes en el dashboard)."""
+    return db.session.query(func.coalesce(func.sum(DailySales.revenue), 0.0)).filter(
+        DailySales.product_id == ORDER_TOTALS,
+        DailySales.status == 'Completed',
+        DailySales.day >= start_date.date(),
+    ).scalar()
+
+
+def rotation_query(start_date, end_date, *entities):
+    """
+    Consulta de rotación: `entities` (p. ej. Product o columnas de Product) más las unidades
+    vendidas e ingresos del rango, excluyendo pedidos 'Cancelled'. Incluye los productos
+    sin ventas (sold = 0) y ordena por unidades vendidas.
+    """
+    # Subconsulta agregada: GROUP BY product_id sobre el acumulado diario del rango
+    sales = db.session.query(
+        DailySales.product_id.label('product_id'),
+        func.sum(DailySales.units).label('sold'),
+        func.sum(DailySales.revenue).label('revenue'),
+    ).filter(
+        DailySales.product_id != ORDER_TOTALS,
+        DailySales.day >= start_date.date(),
+        DailySales.day <= end_date.date(),
+        DailySales.status != 'Cancelled',
+    ).group_by(DailySales.product_id).subquery()
+
+    sold = func.coalesce(sales.c.sold, 0)
+    revenue = func.coalesce(sales.c.revenue, 0.0)
+
+    return db.session.query(*entities, sold, revenue).outerjoin(
+        sales, sales.c.product_id == Product.id
+    ).order_by(sold.desc(), Product.id)
+
+
+def get_inventory_rotation(start_date, end_date):
+    """
+    Unidades vendidas e ingresos por producto en el rango (ver rotation_query).
+    Regresa la misma estructura que consume reports.html:
+    [{'product': Product, 'sold': int, 'revenue': float}, ...]
+    """
+    rows = rotation_query(start_date, end_date, Product).all()
+    return [{'product': p, 'sold': s, 'revenue': r} for p, s, r in rows]
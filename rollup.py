@@ -0,0 +1,191 @@
+"""
+Acumulados mantenidos en cada escritura: ventas diarias (tabla daily_sales) y saldo
+por cobrar de cada cliente (tabla client_balance).
+Cada ruta que modifica un pedido envuelve el cambio en `tracking(order)`: se calcula la
+contribución del pedido antes y después, y la diferencia se aplica con un UPSERT
+dentro de la misma transacción. `rebuild()` recalcula todo desde Order/OrderItem
+(incluidos los pedidos archivados, ver archive.py).
+"""
+from contextlib import contextmanager
+from sqlalchemy import func, inspect, select, literal, insert, case
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from models import db, Order, DailySales, ClientBalance
+from archive import order_sources
+
+# Fila de totales a nivel pedido
+ORDER_TOTALS = 0
+# Margen para errores de punto flotante (igual que la lógica de pagos)
+PAID_TOLERANCE = 0.01
+
+
+def order_contribution(order, items=None):
+    """
+    Lo que un pedido aporta al acumulado:
+    {(day, status, product_id): (order_count, units, revenue, paid_amount)}
+    `items` es opcional: lista de (product_id, quantity, price_at_time); por defecto order.items.
+    """
+    if order is None or order.id is None or order.date is None:
+        return {}
+    if items is None:
+        items = [(i.product_id, i.quantity, i.price_at_time) for i in order.items]
+
+    day = order.date.date()
+    status = order.status or ''
+
+    per_product = {}
+    for product_id, quantity, price in items:
+        units, revenue = per_product.get(product_id, (0, 0.0))
+        per_product[product_id] = (units + quantity, revenue + quantity * price)
+
+    contribution = {
+        (day, status, ORDER_TOTALS): (1, sum(u for u, _ in per_product.values()),
+                                      order.total or 0.0, order.paid_amount or 0.0)
+    }
+    for product_id, (units, revenue) in per_product.items():
+        contribution[(day, status, product_id)] = (1, units, revenue, 0.0)
+    return contribution
+
+
+def apply_delta(before, after):
+    """Aplica (after - before) a daily_sales con un solo UPSERT por lotes."""
+    rows = []
+    for key in set(before) | set(after):
+        b = before.get(key, (0, 0, 0.0, 0.0))
+        a = after.get(key, (0, 0, 0.0, 0.0))
+        delta = [a[i] - b[i] for i in range(4)]
+        if any(delta):
+            rows.append({
+                'day': key[0], 'status': key[1], 'product_id': key[2],
+                'order_count': delta[0], 'units': delta[1],
+                'revenue': delta[2], 'paid_amount': delta[3],
+            })
+    if not rows:
+        return
+
+    stmt = sqlite_insert(DailySales)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['day', 'status', 'product_id'],
+        set_={
+            'order_count': DailySales.order_count + stmt.excluded.order_count,
+            'units': DailySales.units + stmt.excluded.units,
+            'revenue': DailySales.revenue + stmt.excluded.revenue,
+            'paid_amount': DailySales.paid_amount + stmt.excluded.paid_amount,
+        },
+    )
+    db.session.execute(stmt, rows)
+
+
+def balance_contribution(order):
+    """Lo que un pedido aporta al saldo de su cliente: {client_id: (outstanding, open_orders)}."""
+    if order is None or order.id is None or order.client_id is None or order.status == 'Cancelled':
+        return {}
+    outstanding = (order.total or 0.0) - (order.paid_amount or 0.0)
+    if outstanding <= PAID_TOLERANCE:
+        return {}
+    return {order.client_id: (outstanding, 1)}
+
+
+def apply_balance_delta(before, after):
+    """Aplica (after - before) a client_balance con un solo UPSERT por lotes."""
+    rows = []
+    for client_id in set(before) | set(after):
+        b = before.get(client_id, (0.0, 0))
+        a = after.get(client_id, (0.0, 0))
+        if a != b:
+            rows.append({'client_id': client_id, 'outstanding': a[0] - b[0], 'open_orders': a[1] - b[1]})
+    if not rows:
+        return
+
+    stmt = sqlite_insert(ClientBalance)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['client_id'],
+        set_={
+            'outstanding': ClientBalance.outstanding + stmt.excluded.outstanding,
+            'open_orders': ClientBalance.open_orders + stmt.excluded.open_orders,
+        },
+    )
+    db.session.execute(stmt, rows)
+
+
+@contextmanager
+def tracking(order):
+    """
+    Envuelve una modificación del pedido (ítems, estado, pagos o borrado) y refleja
+    el cambio en daily_sales y client_balance antes del commit de la ruta.
+    """
+    before = order_contribution(order)
+    before_balance = balance_contribution(order)
+    yield
+    db.session.flush()
+    if inspect(order).was_deleted:
+        after, after_balance = {}, {}
+    else:
+        # Los ítems pudieron agregarse/eliminarse por fuera de la relación
+        db.session.expire(order, ['items'])
+        after = order_contribution(order)
+        after_balance = balance_contribution(order)
+    apply_delta(before, after)
+    apply_balance_delta(before_balance, after_balance)
+
+
+def rebuild():
+    """Recalcula daily_sales completo desde Order/OrderItem, archivo incluido (no hace commit)."""
+    db.session.execute(DailySales.__table__.delete())
+    # Los pedidos archivados siguen contando en el acumulado
+    order, order_item = order_sources()
+
+    day = func.date(order.date)
+    status = func.coalesce(order.status, '')
+    columns = ['day', 'status', 'product_id', 'order_count', 'units', 'revenue', 'paid_amount']
+
+    # 1. Totales a nivel pedido
+    order_units = select(func.coalesce(func.sum(order_item.quantity), 0)).where(
+        order_item.order_id == order.id
+    ).scalar_subquery()
+    order_rows = select(
+        day, status, literal(ORDER_TOTALS),
+        func.count(order.id),
+        func.coalesce(func.sum(order_units), 0),
+        func.coalesce(func.sum(order.total), 0.0),
+        func.coalesce(func.sum(func.coalesce(order.paid_amount, 0.0)), 0.0),
+    ).where(order.date.isnot(None)).group_by(day, status)
+    db.session.execute(insert(DailySales).from_select(columns, order_rows))
+
+    # 2. Unidades e ingresos por producto
+    product_rows = select(
+        day, status, order_item.product_id,
+        func.count(func.distinct(order.id)),
+        func.sum(order_item.quantity),
+        func.sum(order_item.quantity * order_item.price_at_time),
+        literal(0.0),
+    ).join(order, order.id == order_item.order_id).where(
+        order.date.isnot(None)
+    ).group_by(day, status, order_item.product_id)
+    db.session.execute(insert(DailySales).from_select(columns, product_rows))
+
+    rebuild_balances()
+
+
+def rebuild_balances():
+    """Recalcula client_balance desde Order (no hace commit). Deja una fila por cliente con pedidos."""
+    db.session.execute(ClientBalance.__table__.delete())
+    outstanding = func.coalesce(Order.total, 0.0) - func.coalesce(Order.paid_amount, 0.0)
+    is_open = (func.coalesce(Order.status, '') != 'Cancelled') & (outstanding > PAID_TOLERANCE)
+    rows = select(
+        Order.client_id,
+        func.coalesce(func.sum(case((is_open, outstanding), else_=0.0)), 0.0),
+        func.count(case((is_open, 1))),
+    ).group_by(Order.client_id)
+    db.session.execute(insert(ClientBalance).from_select(['client_id', 'outstanding', 'open_orders'], rows))
+
+
+def ensure_built():
+    """Construye los acumulados si sus tablas están vacías pero ya existen pedidos (bases previas)."""
+    if db.session.query(Order.id).first() is None:
+        return
+    if db.session.query(DailySales.day).first() is None:
+        rebuild()
+        db.session.commit()
+    elif db.session.query(ClientBalance.client_id).first() is None:
+        rebuild_balances()
+        db.session.commit()
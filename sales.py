@@ -0,0 +1,211 @@
+"""
+Ventas del POS.
+create_sale registra un pedido a partir del JSON del POS (cliente, ítems y pago); lo usan
+/pos/create_order (una venta) y /pos/sync (la cola de ventas guardada en el navegador).
+Cada venta de la cola trae una clave generada en el POS (order.client_key, índice único):
+si se reenvía, porque la respuesta anterior no llegó, se regresa el pedido ya creado en
+lugar de crear otro. sync_sales aplica un lote en una sola transacción, cada venta en su
+propio SAVEPOINT: una venta sin stock se descarta sola y se reporta como conflicto.
+"""
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import insert, text
+from sqlalchemy.exc import IntegrityError
+from models import db, Client, Order, OrderItem, Product
+from stock import reserve_stock, find_insufficient
+from payments import payment_status, add_opening_payment
+import rollup
+
+MAX_KEY_LENGTH = 64
+MAX_SYNC_SALES = 200  # Ventas por petición de /pos/sync (el POS envía la cola en lotes)
+# Fecha de la venta según el POS: se acepta si no está en el futuro (con margen para relojes
+# desfasados) ni es más vieja que esto; si no, se usa la hora del servidor
+MAX_CLOCK_SKEW = timedelta(minutes=5)
+MAX_SALE_AGE = timedelta(days=30)
+
+
+class StockConflict(ValueError):
+    """No alcanza el stock: shortages = [{'id', 'name', 'stock', 'requested'}]."""
+
+    def __init__(self, message, shortages):
+        super().__init__(message)
+        self.shortages = shortages
+
+
+def parse_client_key(value):
+    if value is None or value == '':
+        return None
+    if not isinstance(value, str) or len(value) > MAX_KEY_LENGTH:
+        raise ValueError('Clave de venta inválida.')
+    return value
+
+
+def parse_sale_time(value):
+    """Fecha ISO 8601 de la venta en el POS -> datetime UTC sin zona; None si no es aceptable."""
+    try:
+        when = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is not None:
+        when = when.astimezone(timezone.utc).replace(tzinfo=None)
+    now = datetime.utcnow()
+    if when > now + MAX_CLOCK_SKEW or when < now - MAX_SALE_AGE:
+        return None
+    return when
+
+
+def find_by_key(client_key):
+    # Sin clave no hay venta que buscar (filter_by con None compararía IS NULL)
+    if not client_key:
+        return None
+    return Order.query.filter_by(client_key=client_key).first()
+
+
+def _stock_conflict(quantities):
+    shortages = [{'id': pid, 'name': name, 'stock': stock or 0, 'requested': quantities[pid]}
+                 for pid, name, stock in find_insufficient(quantities)]
+    first = shortages[0]
+    return StockConflict(f"Stock insuficiente para {first['name']}. Solo quedan {first['stock']}", shortages)
+
+
+def create_sale(data, check_key=True):
+    """
+    Registra la venta en la transacción del llamador (no hace commit).
+    Regresa (order, created): created es False si la clave ya tenía un pedido
+    (check_key=False cuando el llamador ya lo buscó).
+    Lanza StockConflict si no alcanza el stock y ValueError si los datos no son válidos;
+    en ambos casos el llamador debe hacer rollback.
+    """
+    client_key = parse_client_key(data.get('client_key'))
+    if client_key and check_key:
+        existing = find_by_key(client_key)
+        if existing is not None:
+            return existing, False
+
+    client_id = data.get('client_id')
+    items = data.get('items')
+    if not client_id or not items:
+        raise ValueError('Faltan datos (cliente o ítems)')
+    try:
+        client_id = int(client_id)
+        items = [(int(item['id']), int(item['quantity'])) for item in items]
+        payment_type = data.get('payment_type', 'full')  # 'full' o 'partial'
+        payment_amount = float(data.get('payment_amount') or 0)
+    except (KeyError, TypeError, ValueError):
+        raise ValueError('Datos inválidos (ítems o monto de pago).')
+
+    client = db.session.get(Client, client_id)
+    if not client:
+        raise ValueError('Cliente no encontrado.')
+
+    # Cantidades por producto (el carrito puede repetir un producto)
+    quantities = {}
+    for product_id, quantity in items:
+        if quantity <= 0:
+            raise ValueError('La cantidad debe ser mayor a 0.')
+        quantities[product_id] = quantities.get(product_id, 0) + quantity
+
+    # Todos los productos del carrito en una sola consulta (IN)
+    products = {p.id: p for p in Product.query.filter(Product.id.in_(list(quantities))).all()}
+    for product_id, quantity in quantities.items():
+        product = products.get(product_id)
+        if not product:
+            raise ValueError(f'Producto ID {product_id} no existe.')
+        # Verificación rápida; la garantía real es el UPDATE condicional de reserve_stock
+        if (product.stock or 0) < quantity:
+            raise _stock_conflict(quantities)
+
+    lines = [(product_id, quantity, products[product_id].price)
+             for product_id, quantity in items]  # (product_id, quantity, price_at_time)
+    total_order = sum(quantity * price for _, quantity, price in lines)
+
+    # El pedido con su total final (la escritura empieza aquí y termina en el commit
+    # del llamador; si no alcanza el stock se descarta con el rollback)
+    new_order = Order(client_id=client.id, status='Pending', shipping_address=client.address,
+                      total=total_order, client_key=client_key)
+    sale_time = parse_sale_time(data.get('created_at'))
+    if sale_time is not None:
+        new_order.date = sale_time
+    db.session.add(new_order)
+    db.session.flush()
+
+    # Stock en lote: UPDATE ... SET stock = stock - :q WHERE id = :id AND stock >= :q
+    # y las salidas en el libro de movimientos con el ID del pedido
+    if not reserve_stock(quantities, 'sale', new_order.id):
+        raise _stock_conflict(quantities)
+
+    if payment_type == 'full':
+        new_order.paid_amount = total_order
+    else:
+        new_order.paid_amount = max(payment_amount, 0.0)
+    new_order.payment_status = payment_status(total_order, new_order.paid_amount)
+
+    # Ítems en lote y el pago inicial
+    db.session.flush()
+    db.session.execute(insert(OrderItem), [
+        {'order_id': new_order.id, 'product_id': product_id, 'quantity': quantity, 'price_at_time': price}
+        for product_id, quantity, price in lines
+    ])
+    add_opening_payment(new_order, data.get('payment_method', 'cash'))
+
+    # La venta en los acumulados (diario y saldo del cliente)
+    rollup.apply_delta({}, rollup.order_contribution(new_order, lines))
+    rollup.apply_balance_delta({}, rollup.balance_contribution(new_order))
+    return new_order, True
+
+
+def _result(client_key, status, order=None, message=None, shortages=None):
+    result = {'client_key': client_key, 'status': status}
+    if order is not None:
+        result['order_id'] = order.id
+        result['total'] = round(order.total or 0.0, 2)
+    if message:
+        result['message'] = message
+    if shortages:
+        result['shortages'] = shortages
+    return result
+
+
+def sync_sales(sales):
+    """
+    Aplica en orden las ventas de la cola del POS y hace commit una sola vez.
+    Regresa un resultado por venta con status:
+      created    pedido creado,
+      duplicate  la clave ya tenía pedido (reenvío): se regresa ese pedido,
+      conflict   sin stock suficiente (con shortages); la venta no se registró,
+      invalid    datos inválidos; la venta no se registró.
+    """
+    # Bloqueo de escritura desde el inicio: las lecturas de cada venta (stock, clave)
+    # no pueden quedar viejas por otra terminal que escriba a la mitad del lote
+    db.session.execute(text('BEGIN IMMEDIATE'))
+    keys = [sale.get('client_key') for sale in sales if isinstance(sale, dict)]
+    # Pedidos ya registrados con las claves del lote (reenvíos), en una sola consulta
+    orders_by_key = {order.client_key: order for order in Order.query.filter(
+        Order.client_key.in_([key for key in keys if isinstance(key, str)])
+    )}
+    results = []
+    for sale in sales:
+        client_key = sale.get('client_key') if isinstance(sale, dict) else None
+        if not client_key:
+            results.append(_result(client_key, 'invalid', message='Falta la clave de la venta.'))
+            continue
+        if client_key in orders_by_key:
+            results.append(_result(client_key, 'duplicate', orders_by_key[client_key]))
+            continue
+        savepoint = db.session.begin_nested()
+        try:
+            order, _ = create_sale(sale, check_key=False)
+            savepoint.commit()
+            orders_by_key[client_key] = order
+            results.append(_result(client_key, 'created', order))
+        except StockConflict as e:
+            savepoint.rollback()
+            results.append(_result(client_key, 'conflict', message=str(e), shortages=e.shortages))
+        except IntegrityError:
+            # Otra petición registró la misma clave entre la búsqueda y el INSERT
+            savepoint.rollback()
+            results.append(_result(client_key, 'duplicate', find_by_key(client_key)))
+        except ValueError as e:
+            savepoint.rollback()
+            results.append(_result(client_key, 'invalid', message=str(e)))
+    db.session.commit()
+    return results
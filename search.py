@@ -0,0 +1,128 @@
+"""
+Búsquedas de texto para los selectores (typeahead) y el inventario.
+Usan los índices FTS5 creados por migrations.py; si la tabla FTS no existe
+(SQLite sin FTS5) se cae a un LIKE sobre las mismas columnas.
+"""
+import re
+from sqlalchemy import text, or_, func, Integer, Float
+from models import db, Client, Product
+
+CLIENT_SEARCH_LIMIT = 10
+PRODUCTS_PER_PAGE = 25
+MAX_SEARCH_LIMIT = 50
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+_fts_tables = {}
+
+
+def has_fts_table(name):
+    """Si existe la tabla FTS (se consulta una vez por proceso)."""
+    if name not in _fts_tables:
+        _fts_tables[name] = db.session.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {'name': name}
+        ).first() is not None
+    return _fts_tables[name]
+
+
+def fts_query(q):
+    """'juan per' -> '"juan"* "per"*' (cada palabra como prefijo, todas requeridas)."""
+    return ' '.join(f'"{token}"*' for token in _TOKEN_RE.findall(q or ''))
+
+
+def search_clients(q, limit=CLIENT_SEARCH_LIMIT):
+    """Los `limit` clientes que mejor coinciden con `q` en nombre, teléfono o email."""
+    match = fts_query(q)
+    if not match:
+        return []
+    limit = max(1, min(limit or CLIENT_SEARCH_LIMIT, MAX_SEARCH_LIMIT))
+
+    if has_fts_table('client_fts'):
+        rows = db.session.execute(text(
+            'SELECT c.id, c.name, c.phone, c.email FROM client_fts '
+            'JOIN client c ON c.id = client_fts.rowid '
+            'WHERE client_fts MATCH :match ORDER BY client_fts.rank LIMIT :limit'
+        ), {'match': match, 'limit': limit}).all()
+    else:
+        pattern = f"%{q.strip()}%"
+        rows = db.session.query(Client.id, Client.name, Client.phone, Client.email).filter(
+            or_(Client.name.ilike(pattern), Client.phone.ilike(pattern), Client.email.ilike(pattern))
+        ).order_by(Client.name).limit(limit).all()
+
+    return [{'id': r.id, 'name': r.name, 'phone': r.phone, 'email': r.email} for r in rows]
+
+
+def product_to_dict(product):
+    return {
+        'id': product.id,
+        'name': product.name,
+        'sku': product.sku,
+        'category': product.category,
+        'price': product.price,
+        'stock': product.stock,
+        'description': product.description,
+    }
+
+
+def parse_product_filters(args):
+    """Filtros de búsqueda de productos desde la query string."""
+    return {
+        'q': (args.get('q') or '').strip(),
+        'category': args.get('category') or None,
+        'in_stock': args.get('in_stock') in ('1', 'true', 'on'),
+        'min_price': args.get('min_price', type=float),
+        'max_price': args.get('max_price', type=float),
+        'page': max(1, args.get('page', 1, type=int)),
+        'per_page': max(1, min(args.get('per_page', PRODUCTS_PER_PAGE, type=int), MAX_SEARCH_LIMIT)),
+    }
+
+
+def search_products(q='', category=None, in_stock=False, min_price=None, max_price=None,
+                    page=1, per_page=PRODUCTS_PER_PAGE):
+    """
+    Búsqueda paginada de productos (texto en nombre, descripción y categoría) con filtros
+    de existencia y precio. Tres consultas: página, total y facetas por categoría.
+    Regresa {'products': [Product], 'total', 'page', 'per_page', 'pages', 'facets': {'category': [...]}}
+    """
+    query = db.session.query(Product)
+    rank = None
+
+    match = fts_query(q)
+    if match:
+        if has_fts_table('product_fts'):
+            fts = text('SELECT rowid AS id, rank FROM product_fts WHERE product_fts MATCH :match').bindparams(
+                match=match
+            ).columns(id=Integer, rank=Float).subquery('fts')
+            query = query.join(fts, fts.c.id == Product.id)
+            rank = fts.c.rank
+        else:
+            pattern = f"%{q.strip()}%"
+            query = query.filter(or_(Product.name.ilike(pattern), Product.description.ilike(pattern),
+                                     Product.category.ilike(pattern)))
+
+    if in_stock:
+        query = query.filter(Product.stock > 0)
+    if min_price is not None:
+        query = query.filter(Product.price >= min_price)
+    if max_price is not None:
+        query = query.filter(Product.price <= max_price)
+
+    # Las facetas se cuentan sin el filtro de categoría, para poder cambiar de categoría
+    facets = query.with_entities(Product.category, func.count(Product.id)).group_by(
+        Product.category
+    ).order_by(Product.category).all()
+
+    if category:
+        query = query.filter(Product.category == category)
+
+    total = query.with_entities(func.count(Product.id)).scalar()
+    order = [rank, Product.id] if rank is not None else [Product.name, Product.id]
+    products = query.order_by(*order).limit(per_page).offset((page - 1) * per_page).all()
+
+    return {
+        'products': products,
+        'total': total,
+        'page': page,
+        'per_page': per_page,
+        'pages': max(1, -(-total // per_page)),
+        'facets': {'category': [{'value': value, 'count': count} for value, count in facets]},
+    }
@@ -1,6 +1,8 @@
 from app import app, db
 from models import Client, Product, Order, OrderItem
 from datetime import datetime, timedelta
+import rollup
+from stock import take_snapshot
 
 def seed_data():
     with app.app_context():
@@ -49,6 +51,11 @@ def seed_data():
         order2.items.append(item3)
         order2.total = (item2.quantity * item2.price_at_time) + (item3.quantity * item3.price_at_time)
 
+        # Acumulado diario de ventas a partir de los pedidos de prueba
+        db.session.flush()
+        rollup.rebuild()
+        # Foto de stock de los datos de prueba (base del stock a una fecha)
+        take_snapshot()
         db.session.commit()
         
         print("Database seeded successfully!")
@@ -0,0 +1,42 @@
+"""
+Arranque rápido del ejecutable.
+  - Caché persistente del bytecode de las plantillas Jinja junto a la base de datos: la
+    primera visita a cada página después de abrir el programa ya no compila la plantilla.
+  - El navegador se abre cuando el servidor ya escucha en el puerto (no tras un tiempo fijo).
+  - El tiempo desde que arranca el proceso hasta estar listo se imprime al iniciar;
+    build_exe.py lo mide desde fuera al terminar cada build.
+"""
+import os
+import threading
+import time
+from jinja2 import FileSystemBytecodeCache
+
+# Referencia del tiempo de arranque (se importa al inicio de app.py)
+STARTED = time.perf_counter()
+
+
+class TemplateBytecodeCache(FileSystemBytecodeCache):
+    """
+    La clave es solo el nombre de la plantilla: en el ejecutable de un solo archivo la
+    carpeta temporal cambia en cada arranque. Jinja descarta el bytecode si la fuente
+    de la plantilla cambió (compara su checksum), así que no hay riesgo de usar uno viejo.
+    """
+
+    def get_cache_key(self, name, filename=None):
+        return super().get_cache_key(name)
+
+
+def enable_template_cache(app, directory):
+    path = os.path.join(directory, 'jinja_cache')
+    os.makedirs(path, exist_ok=True)
+    app.jinja_env.bytecode_cache = TemplateBytecodeCache(path)
+
+
+def elapsed():
+    return time.perf_counter() - STARTED
+
+
+def open_browser(url):
+    """Abre el navegador en un hilo aparte (en algunos sistemas webbrowser bloquea un momento)."""
+    import webbrowser
+    threading.Thread(target=webbrowser.open_new, args=(url,), daemon=True).start()
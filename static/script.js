@@ -119,3 +119,69 @@ window.submitOrder = async function () {
         alert('Ocurrió un error al procesar el pedido');
     }
 }
+
+
+// Typeahead genérico: consulta `options.url(term)` mientras se escribe (con debounce)
+// options: { url, items(data), label(item), onSelect(item), itemClass }
+// o, en lugar de url/items, search(term) que regresa (o promete) los resultados
+window.attachTypeahead = function (input, resultsList, options) {
+    let timer = null;
+    let lastTerm = '';
+
+    const hideResults = () => resultsList.classList.add('hidden');
+
+    input.addEventListener('input', () => {
+        clearTimeout(timer);
+        const term = input.value.trim();
+        if (!term) {
+            resultsList.innerHTML = '';
+            hideResults();
+            return;
+        }
+
+        timer = setTimeout(async () => {
+            lastTerm = term;
+            try {
+                const items = options.search
+                    ? await options.search(term)
+                    : options.items(await (await fetch(options.url(term))).json());
+                if (term !== lastTerm) return; // Respuesta de una búsqueda anterior
+
+                resultsList.innerHTML = '';
+                items.forEach(item => {
+                    const li = document.createElement('li');
+                    li.className = options.itemClass || 'p-2.5 hover:bg-blue-600 cursor-pointer transition-colors';
+                    li.textContent = options.label(item);
+                    li.onclick = () => {
+                        options.onSelect(item);
+                        hideResults();
+                    };
+                    resultsList.appendChild(li);
+                });
+                resultsList.classList.toggle('hidden', items.length === 0);
+            } catch (error) {
+                console.error('Error en la búsqueda:', error);
+            }
+        }, 150);
+    });
+
+    // Hide results on blur (delayed to allow click)
+    input.addEventListener('blur', () => setTimeout(hideResults, 200));
+
+    // Focus shows results if text exists
+    input.addEventListener('focus', () => {
+        if (input.value.length > 0 && resultsList.children.length > 0) resultsList.classList.remove('hidden');
+    });
+}
+
+// Typeahead de clientes sobre /api/clients/search (search: búsqueda propia, p. ej. local)
+window.attachClientTypeahead = function (input, resultsList, onSelect, itemClass, search) {
+    attachTypeahead(input, resultsList, {
+        url: term => `/api/clients/search?q=${encodeURIComponent(term)}`,
+        items: data => data.clients,
+        search,
+        label: c => c.phone ? `${c.name} · ${c.phone}` : c.name,
+        onSelect,
+        itemClass
+    });
+}
@@ -0,0 +1,166 @@
+"""
+Operaciones de stock en lote y libro de movimientos.
+La reserva usa UPDATE condicionales (stock >= cantidad) ejecutados como executemany,
+así dos terminales vendiendo las últimas unidades al mismo tiempo no pueden sobrevender:
+la base solo descuenta si todavía hay existencia al momento de escribir.
+Cada cambio de stock agrega filas a stock_movement en la misma transacción (venta,
+devolución, borrado de pedido, ajuste manual, alta e importación). Con las fotos
+periódicas de stock_snapshot, el stock a una fecha se obtiene de la foto más cercana
+anterior más los movimientos posteriores a ella, sin recorrer todo el historial.
+"""
+from datetime import datetime, timedelta
+from sqlalchemy import update, insert, select, bindparam, func, literal
+from models import db, Product, StockMovement, StockSnapshot, StockSnapshotItem
+
+SNAPSHOT_INTERVAL = timedelta(days=1)
+SNAPSHOT_MAX_MOVEMENTS = 20000  # También se toma una foto si se acumulan más movimientos
+
+product_table = Product.__table__
+movement_table = StockMovement.__table__
+snapshot_item_table = StockSnapshotItem.__table__
+
+
+def record_movements(changes, reason, order_id=None):
+    """Agrega al libro {product_id: cambio con signo} en un solo executemany (omite los ceros)."""
+    now = datetime.utcnow()
+    rows = [{'product_id': pid, 'change': change, 'reason': reason, 'order_id': order_id, 'created_at': now}
+            for pid, change in changes.items() if change]
+    if rows:
+        db.session.execute(insert(movement_table), rows)
+
+
+def reserve_stock(quantities, reason='sale', order_id=None):
+    """
+    Descuenta {product_id: cantidad} del stock solo si alcanza para cada producto.
+    Regresa True si se reservaron todas las líneas; si no, el llamador debe hacer rollback.
+    """
+    if not quantities:
+        return True
+    stmt = update(product_table).where(
+        product_table.c.id == bindparam('pid'),
+        product_table.c.stock >= bindparam('qty'),
+    ).values(stock=product_table.c.stock - bindparam('qty'))
+    result = db.session.execute(stmt, [{'pid': pid, 'qty': qty} for pid, qty in quantities.items()])
+    if result.rowcount != len(quantities):
+        return False
+    record_movements({pid: -qty for pid, qty in quantities.items()}, reason, order_id)
+    return True
+
+
+def find_insufficient(quantities):
+    """Productos que no alcanzan la cantidad pedida: [(id, name, stock)] con el stock actual de la base."""
+    rows = db.session.query(Product.id, Product.name, Product.stock).filter(
+        Product.id.in_(list(quantities))
+    ).all()
+    return [row for row in rows if (row.stock or 0) < quantities[row.id]]
+
+
+def restore_stock(quantities, reason='return', order_id=None):
+    """Devuelve {product_id: cantidad} al stock en un solo executemany (ítems eliminados o reducidos)."""
+    if not quantities:
+        return
+    stmt = update(product_table).where(
+        product_table.c.id == bindparam('pid'),
+    ).values(stock=product_table.c.stock + bindparam('qty'))
+    db.session.execute(stmt, [{'pid': pid, 'qty': qty} for pid, qty in quantities.items()])
+    record_movements(quantities, reason, order_id)
+
+
+def record_stock_set(new_stock, reason):
+    """
+    Registra el movimiento de fijar {product_id: stock nuevo}; debe ejecutarse justo antes
+    del UPDATE. La diferencia se calcula en SQL contra el stock vigente de la base.
+    """
+    if not new_stock:
+        return
+    current = func.coalesce(product_table.c.stock, 0)
+    stmt = insert(movement_table).from_select(
+        ['product_id', 'change', 'reason', 'created_at'],
+        select(product_table.c.id, bindparam('new_stock') - current, literal(reason), literal(datetime.utcnow()))
+        .where(product_table.c.id == bindparam('pid'), current != bindparam('new_stock')),
+    )
+    db.session.execute(stmt, [{'pid': pid, 'new_stock': stock} for pid, stock in new_stock.items()])
+
+
+def set_stock(new_stock, reason='adjustment'):
+    """Fija {product_id: stock} (edición manual del inventario) registrando la diferencia."""
+    if not new_stock:
+        return
+    record_stock_set(new_stock, reason)
+    stmt = update(product_table).where(
+        product_table.c.id == bindparam('pid'),
+    ).values(stock=bindparam('new_stock'))
+    db.session.execute(stmt, [{'pid': pid, 'new_stock': stock} for pid, stock in new_stock.items()])
+
+
+# --- Fotos y stock a una fecha ---
+
+def take_snapshot():
+    """Foto del stock actual de todos los productos (no hace commit). Regresa el StockSnapshot."""
+    snapshot = StockSnapshot(taken_at=datetime.utcnow(), last_movement_id=0)
+    db.session.add(snapshot)
+    # El INSERT toma el bloqueo de escritura: desde aquí no entran movimientos nuevos,
+    # así la foto, el último movimiento y la hora corresponden al mismo instante
+    db.session.flush()
+    snapshot.taken_at = datetime.utcnow()
+    snapshot.last_movement_id = db.session.query(func.max(StockMovement.id)).scalar() or 0
+    db.session.execute(insert(snapshot_item_table).from_select(
+        ['snapshot_id', 'product_id', 'stock'],
+        select(literal(snapshot.id), product_table.c.id, func.coalesce(product_table.c.stock, 0)),
+    ))
+    return snapshot
+
+
+def maybe_snapshot():
+    """Toma y confirma una foto si la última es vieja o tiene demasiados movimientos después."""
+    latest = StockSnapshot.query.order_by(StockSnapshot.taken_at.desc()).first()
+    if latest is not None and latest.taken_at > datetime.utcnow() - SNAPSHOT_INTERVAL:
+        last_movement = db.session.query(func.max(StockMovement.id)).scalar() or 0
+        if last_movement - latest.last_movement_id < SNAPSHOT_MAX_MOVEMENTS:
+            return False
+    take_snapshot()
+    db.session.commit()
+    return True
+
+
+def stock_as_of_subquery(when):
+    """
+    Subconsulta (product_id, stock) con el stock de cada producto en el instante `when`:
+    la foto más reciente tomada hasta `when` más los movimientos posteriores a ella.
+    Sin foto anterior (fechas previas al libro) se parte del stock actual hacia atrás.
+    """
+    snapshot = StockSnapshot.query.filter(StockSnapshot.taken_at <= when).order_by(
+        StockSnapshot.taken_at.desc()
+    ).first()
+
+    if snapshot is None:
+        later = db.session.query(
+            StockMovement.product_id.label('product_id'), func.sum(StockMovement.change).label('change')
+        ).filter(StockMovement.created_at > when).group_by(StockMovement.product_id).subquery()
+        stock = func.coalesce(Product.stock, 0) - func.coalesce(later.c.change, 0)
+        return db.session.query(Product.id.label('product_id'), stock.label('stock')).outerjoin(
+            later, later.c.product_id == Product.id
+        ).subquery()
+
+    # Movimientos después de la foto (rango del id: acotado por la frecuencia de las fotos)
+    since = db.session.query(
+        StockMovement.product_id.label('product_id'), func.sum(StockMovement.change).label('change')
+    ).filter(
+        StockMovement.id > snapshot.last_movement_id, StockMovement.created_at <= when
+    ).group_by(StockMovement.product_id).subquery()
+    base = db.session.query(StockSnapshotItem.product_id, StockSnapshotItem.stock).filter(
+        StockSnapshotItem.snapshot_id == snapshot.id
+    ).subquery()
+    stock = func.coalesce(base.c.stock, 0) + func.coalesce(since.c.change, 0)
+    return db.session.query(Product.id.label('product_id'), stock.label('stock')).outerjoin(
+        base, base.c.product_id == Product.id
+    ).outerjoin(since, since.c.product_id == Product.id).subquery()
+
+
+def stock_as_of(when, product_ids=None):
+    """{product_id: stock} en el instante `when` (ver stock_as_of_subquery)."""
+    subquery = stock_as_of_subquery(when)
+    query = db.session.query(subquery.c.product_id, subquery.c.stock)
+    if product_ids is not None:
+        query = query.filter(subquery.c.product_id.in_(list(product_ids)))
+    return dict(query.all())